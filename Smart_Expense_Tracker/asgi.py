@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+ASGI deployment (async analytics views, see tracker/analytics_views.py):
+
+    gunicorn Smart_Expense_Tracker.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Smart_Expense_Tracker.settings')
+os.environ.setdefault('ASYNC_ANALYTICS', 'true')
 
 application = get_asgi_application()
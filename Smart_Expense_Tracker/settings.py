@@ -56,6 +56,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Next, so its timings cover the rest of the stack but HTTPS redirects
+    # are neither timed nor decorated
+    'tracker.middleware.PerformanceMiddleware',
+    'tracker.middleware.ReplicaReadMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +71,7 @@ MIDDLEWARE = [
 ]
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "tracker.authentication.CachedJWTAuthentication",
     ),
 }
 
@@ -95,6 +99,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Smart_Expense_Tracker.wsgi.application'
+ASGI_APPLICATION = 'Smart_Expense_Tracker.asgi.application'
+
+# Serve the analytics endpoints from their async views
+# (tracker/analytics_views.py). asgi.py turns this on by default; under
+# WSGI the sync DRF views are used.
+ASYNC_ANALYTICS = os.environ.get("ASYNC_ANALYTICS", "false").lower() == "true"
 
 
 # Database
@@ -113,6 +123,113 @@ database_url = os.environ.get("DATABASE_URL")
 if database_url:
     DATABASES["default"] = dj_database_url.parse(database_url)
 
+# Persistent connections, re-checked before reuse after an error
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+DATABASES["default"]["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Read replicas (tracker.db_routers): space- or comma-separated URLs in
+# DATABASE_REPLICA_URLS. Analytics and transaction-list GETs read from a
+# healthy replica until the request writes; everything else uses the
+# primary. In tests each replica mirrors the default test database.
+#
+# Locally, two SQLite files work: migrate the primary, copy it to the
+# replica path, then set
+#   DATABASE_URL=sqlite:////tmp/primary.db
+#   DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db
+DATABASE_REPLICAS = []
+for n, url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").replace(",", " ").split(), start=1):
+    alias = f"replica{n}"
+    DATABASES[alias] = dj_database_url.parse(
+        url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True
+    )
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["tracker.db_routers.ReplicaRouter"]
+
+# Seconds a replica's health check result is trusted
+DATABASE_REPLICA_HEALTH_INTERVAL = int(os.getenv("DATABASE_REPLICA_HEALTH_INTERVAL", "10"))
+
+# Caches
+# Analytics responses are cached per user and data version (tracker.caching).
+# Set ANALYTICS_CACHE_URL (e.g. redis://localhost:6379/1) to share the cache
+# between workers; otherwise each process keeps a bounded in-memory LRU.
+ANALYTICS_CACHE_ALIAS = "analytics"
+analytics_cache_url = os.environ.get("ANALYTICS_CACHE_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    ANALYTICS_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "analytics",
+        "TIMEOUT": int(os.getenv("ANALYTICS_CACHE_TIMEOUT", "3600")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "5000")),
+            # Evict the least recently used tenth when full
+            "CULL_FREQUENCY": 10,
+        },
+    },
+}
+if analytics_cache_url:
+    CACHES[ANALYTICS_CACHE_ALIAS] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": analytics_cache_url,
+        "TIMEOUT": int(os.getenv("ANALYTICS_CACHE_TIMEOUT", "3600")),
+    }
+
+# Per-process columnar ledger cache for analytics (tracker.ledger), bounded
+# by the bytes of array data it holds. 0 disables it.
+LEDGER_CACHE_MAX_BYTES = int(os.getenv("LEDGER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Per-process cache of users resolved from JWTs (tracker.authentication),
+# so authenticated requests skip the user query. 0 disables it.
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_MAX_USERS = int(os.getenv("AUTH_USER_CACHE_MAX_USERS", "10000"))
+
+# Days delete tombstones are kept for delta sync (api/sync/); clients that
+# last synced before that get a full resync.
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+
+# Percentages of a budget's amount at which spending records a BudgetAlert
+# (tracker.budgets), e.g. BUDGET_ALERT_THRESHOLDS="50 80 100".
+BUDGET_ALERT_THRESHOLDS = [
+    int(p) for p in os.getenv("BUDGET_ALERT_THRESHOLDS", "50 80 100").replace(",", " ").split()
+]
+
+# Threads per process rendering receipt thumbnails (tracker.receipts).
+# 0 leaves uploads pending for the process_receipts command.
+RECEIPT_WORKERS = int(os.getenv("RECEIPT_WORKERS", "2"))
+
+# Performance instrumentation (tracker.middleware.PerformanceMiddleware)
+# Queries slower than SLOW_QUERY_MS are logged with their SQL; per-route
+# latency percentiles are kept over the last PERF_STATS_WINDOW requests.
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "200"))
+PERF_STATS_WINDOW = int(os.getenv("PERF_STATS_WINDOW", "1000"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Replica health, receipt processing failures
+        "tracker": {
+            "handlers": ["console"],
+            "level": "WARNING",
+        },
+        # INFO logs one line per request; WARNING only slow queries
+        "tracker.perf": {
+            "handlers": ["console"],
+            "level": os.getenv("PERF_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
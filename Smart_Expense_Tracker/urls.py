@@ -12,18 +12,42 @@ from tracker.views import (
     TransactionViewSet,
     CategoryViewSet,
     BudgetViewSet,
+    BudgetAlertViewSet,
+    RecurringRuleViewSet,
+    TransactionFlagViewSet,
     RegisterView,
     MonthlySummaryView,
     MonthlyTotalsView,
     CategoryAnalyticsView,
     MonthlyCategoryAnalyticsView,
+    DashboardView,
+    ForecastView,
+    budget_vs_expense,
+    SyncView,
+    CacheStatsView,
+    PerfStatsView,
 )
 
+if settings.ASYNC_ANALYTICS:
+    # Async variants of the analytics endpoints, for ASGI deployments
+    from tracker import analytics_views
+
+    MonthlySummaryView = analytics_views.MonthlySummaryView
+    MonthlyTotalsView = analytics_views.MonthlyTotalsView
+    CategoryAnalyticsView = analytics_views.CategoryAnalyticsView
+    MonthlyCategoryAnalyticsView = analytics_views.MonthlyCategoryAnalyticsView
+    DashboardView = analytics_views.DashboardView
+    ForecastView = analytics_views.ForecastView
+    budget_vs_expense = analytics_views.BudgetVsExpenseView.as_view()
+
 # Router for ViewSets
 router = DefaultRouter()
 router.register("transactions", TransactionViewSet, basename="transaction")
 router.register("categories", CategoryViewSet, basename="category")
 router.register("budgets", BudgetViewSet, basename="budget")
+router.register("budget-alerts", BudgetAlertViewSet, basename="budget-alert")
+router.register("recurring-rules", RecurringRuleViewSet, basename="recurring-rule")
+router.register("transaction-flags", TransactionFlagViewSet, basename="transaction-flag")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -46,6 +70,25 @@ urlpatterns = [
     path("api/analytics/monthly-summary/", MonthlySummaryView.as_view(), name="monthly-summary"),
     path("api/analytics/category-totals/", CategoryAnalyticsView.as_view(), name="category-totals"),
     path("api/analytics/monthly-category/", MonthlyCategoryAnalyticsView.as_view(), name="monthly-category"),
+    path("api/analytics/dashboard/", DashboardView.as_view(), name="dashboard"),
+    path("api/analytics/forecast/", ForecastView.as_view(), name="forecast"),
+    path("api/analytics/budget-vs-expense/", budget_vs_expense, name="budget-vs-expense"),
+    path(
+        "api/analytics/budget-vs-expense/<int:year>/<int:month>/",
+        budget_vs_expense,
+        name="budget-vs-expense-month"
+    ),
+    path("api/analytics/cache-stats/", CacheStatsView.as_view(), name="cache-stats"),
+
+    # ---------------------------
+    # Delta sync
+    # ---------------------------
+    path("api/sync/", SyncView.as_view(), name="sync"),
+
+    # ---------------------------
+    # Instrumentation
+    # ---------------------------
+    path("api/perf/", PerfStatsView.as_view(), name="perf-stats"),
 
     # ---------------------------
     # CRUD Routes (ViewSets)
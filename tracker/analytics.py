@@ -0,0 +1,336 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from dateutil.relativedelta import relativedelta
+from django.db import close_old_connections, connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Budget, Category, MonthlyRollup, Transaction
+from .rollups import month_start
+
+ROW_FIELDS = ("month", "type", "category_id", "category__name", "total", "count")
+
+
+def parse_month(value, name):
+    """
+    Parse a YYYY-MM query parameter into the first day of that month.
+    """
+    try:
+        year, month = value.split("-")
+        return date(int(year), int(month), 1)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid {name}")
+
+
+def month_range(first, last):
+    months = []
+    while first <= last:
+        months.append(first)
+        first += relativedelta(months=1)
+    return months
+
+
+def parse_date(value, name):
+    """
+    Parse an optional YYYY-MM-DD query parameter. Raises ValueError with
+    a client-facing message on bad input.
+    """
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}")
+
+
+def monthly_querysets(user, ttype=None, date_from=None, date_to=None):
+    """
+    The (rollup, raw edge) querysets behind monthly_rows(). The edge
+    queryset is None when the range has no partial months, and the pair
+    is None when the range is empty.
+    """
+    if date_from and date_to and date_from > date_to:
+        return None
+
+    rollups = MonthlyRollup.objects.filter(user=user)
+    if ttype:
+        rollups = rollups.filter(type=ttype)
+
+    edges = []
+    if date_from:
+        first_full = month_start(date_from)
+        if date_from.day != 1:
+            first_full += relativedelta(months=1)
+            edges.append((date_from, first_full - timedelta(days=1)))
+        rollups = rollups.filter(month__gte=first_full)
+    if date_to:
+        end_full = month_start(date_to)
+        if (date_to + timedelta(days=1)).day != 1:
+            edges.append((end_full, date_to))
+        else:
+            end_full += relativedelta(months=1)
+        rollups = rollups.filter(month__lt=end_full)
+
+    if len(edges) == 2 and month_start(date_from) == month_start(date_to):
+        # Both edges cut through the same month, so only their overlap counts.
+        edges = [(date_from, date_to)]
+
+    rollups = rollups.values(*ROW_FIELDS).order_by("month")
+    if not edges:
+        return rollups, None
+
+    span = Q()
+    for lo, hi in edges:
+        span |= Q(date__gte=lo, date__lte=hi)
+    raw = Transaction.objects.filter(span, user=user)
+    if ttype:
+        raw = raw.filter(type=ttype)
+    raw = (
+        raw.annotate(month=TruncMonth("date"))
+        .values("month", "type", "category_id", "category__name")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by("month")
+    )
+    return rollups, raw
+
+
+def monthly_rows(user, ttype=None, date_from=None, date_to=None):
+    """
+    Totals per (month, type, category) for `user`, as dicts keyed by
+    ROW_FIELDS.
+
+    Whole months inside [date_from, date_to] come from MonthlyRollup.
+    A range edge that cuts through a month is aggregated from the raw
+    Transaction rows of just that part of the month.
+    """
+    querysets = monthly_querysets(user, ttype, date_from, date_to)
+    if querysets is None:
+        return []
+
+    rollups, raw = querysets
+    rows = list(rollups)
+    if raw is not None:
+        rows += list(raw)
+        rows.sort(key=lambda r: r["month"])
+    return rows
+
+
+async def amonthly_rows(user, ttype=None, date_from=None, date_to=None):
+    """
+    monthly_rows() on the async ORM, reading the rollups and the raw
+    edges concurrently (see alists()).
+    """
+    querysets = monthly_querysets(user, ttype, date_from, date_to)
+    if querysets is None:
+        return []
+
+    rollups, raw = querysets
+    if raw is None:
+        return await alist(rollups)
+
+    whole, edges = await alists(rollups, raw)
+    rows = whole + edges
+    rows.sort(key=lambda r: r["month"])
+    return rows
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def alists(*querysets):
+    """
+    Evaluate independent querysets concurrently, each on a worker thread
+    and so on its own database connection. (Django's async ORM would run
+    them one after another on its single thread-sensitive executor.)
+
+    Inside a transaction (ATOMIC_REQUESTS, tests) other connections do not
+    see its writes, so the querysets are then read in turn on the
+    request's own connection.
+    """
+    if await sync_to_async(in_transaction)():
+        return [await alist(queryset) for queryset in querysets]
+    fetch_elsewhere = sync_to_async(fetch, thread_sensitive=False)
+    return list(await asyncio.gather(*(fetch_elsewhere(queryset) for queryset in querysets)))
+
+
+def in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def fetch(queryset):
+    # Worker threads keep their own connections, like request threads
+    close_old_connections()
+    try:
+        return list(queryset)
+    finally:
+        close_old_connections()
+
+
+# ---------------------------
+# Payload builders
+# ---------------------------
+def type_totals(rows):
+    income = sum((r["total"] for r in rows if r["type"] == "income"), Decimal(0))
+    expense = sum((r["total"] for r in rows if r["type"] == "expense"), Decimal(0))
+    return income, expense
+
+
+def totals_by_category_name(rows):
+    """
+    [(category name or None, total)] ordered by total, highest first.
+    Categories are grouped by name, matching a values("category__name")
+    aggregation.
+    """
+    totals = defaultdict(Decimal)
+    for r in rows:
+        totals[r["category__name"]] += r["total"]
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def monthly_series(rows):
+    series = {}
+    for r in rows:
+        mon = r["month"].strftime("%Y-%m")
+        series.setdefault(mon, {"income": Decimal(0), "expense": Decimal(0)})
+        series[mon][r["type"]] += r["total"]
+    return {
+        mon: {typ: float(total) for typ, total in values.items()}
+        for mon, values in series.items()
+    }
+
+
+def summary(rows, with_series=True):
+    """
+    The monthly-summary payload: income/expense totals, expenses by
+    category and, unless a single month was asked for, the series.
+    """
+    income_total, expense_total = type_totals(rows)
+    expense_by_category = totals_by_category_name([r for r in rows if r["type"] == "expense"])
+
+    return {
+        "income_total": float(income_total),
+        "expense_total": float(expense_total),
+        "net": float(income_total - expense_total),
+        "expense_by_category": [
+            {"category": name, "total": float(total)}
+            for name, total in expense_by_category
+        ],
+        "monthly_series": monthly_series(rows) if with_series else {},
+    }
+
+
+def net_totals(rows):
+    """
+    The monthly payload: income, expense and net over `rows`.
+    """
+    income_total, expense_total = type_totals(rows)
+    return {
+        "income_total": float(income_total),
+        "expense_total": float(expense_total),
+        "net": float(income_total - expense_total),
+    }
+
+
+def category_totals(rows):
+    """
+    The category-totals payload.
+    """
+    return {
+        "results": [
+            {"category": name or "Uncategorized", "total": float(total)}
+            for name, total in totals_by_category_name(rows)
+        ]
+    }
+
+
+def monthly_by_category(rows):
+    grouped = defaultdict(lambda: defaultdict(Decimal))
+    categories = set()
+
+    for r in rows:
+        month = r["month"].strftime("%Y-%m")
+        category = r["category__name"] or "Uncategorized"
+        grouped[month][category] += r["total"]
+        categories.add(category)
+
+    results = []
+    for month in sorted(grouped.keys()):
+        entry = {"month": month}
+        for cat in sorted(categories):
+            entry[cat] = float(grouped[month].get(cat, 0))
+        results.append(entry)
+
+    return {
+        "categories": sorted(categories),
+        "results": results,
+    }
+
+
+def budget_querysets(user, months, rows=None):
+    """
+    Categories, budgets and (unless `rows` is given) expense rollups
+    behind budget_vs_spent().
+    """
+    categories = Category.objects.filter(user=user).values("id", "name")
+    budgets = Budget.objects.filter(user=user, month__in=months).values("category_id", "month", "amount")
+    if rows is None:
+        rows = MonthlyRollup.objects.filter(
+            user=user,
+            type="expense",
+            category__isnull=False,
+            month__gte=months[0],
+            month__lte=months[-1],
+        ).values("type", "category_id", "month", "total")
+    return categories, budgets, rows
+
+
+def budget_vs_spent(user, months, rows=None):
+    """
+    {month: [{"category", "budget", "spent"}, ...]} for each month start
+    in `months`, covering every category of the user.
+
+    Three queries regardless of how many categories or months: the
+    categories, their budgets, and expense rollups for the whole span.
+    Callers that already hold monthly_rows() covering `months` pass them
+    as `rows` to skip the rollup query.
+    """
+    categories, budgets, rows = budget_querysets(user, months, rows)
+    return fold_budgets(months, list(categories), budgets, rows)
+
+
+async def abudget_vs_spent(user, months, rows=None):
+    """
+    budget_vs_spent() on the async ORM, with its queries run concurrently.
+    """
+    categories, budgets, spent = budget_querysets(user, months, rows)
+    if rows is None:
+        categories, budgets, rows = await alists(categories, budgets, spent)
+    else:
+        categories, budgets = await alists(categories, budgets)
+    return fold_budgets(months, categories, budgets, rows)
+
+
+def fold_budgets(months, categories, budgets, rows):
+    budgets = {(b["category_id"], b["month"]): b["amount"] for b in budgets}
+
+    spent = defaultdict(Decimal)
+    for r in rows:
+        if r["type"] == "expense":
+            spent[(r["category_id"], r["month"])] += r["total"]
+
+    return {
+        month: [
+            {
+                "category": cat["name"],
+                "budget": budgets.get((cat["id"], month), 0),
+                "spent": spent.get((cat["id"], month), 0),
+            }
+            for cat in categories
+        ]
+        for month in months
+    }
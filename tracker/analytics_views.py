@@ -1,56 +1,262 @@
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count
-from .models import Transaction, Category
-from datetime import date
+"""
+Async variants of the analytics endpoints, served instead of the DRF
+views in tracker/views.py when ASYNC_ANALYTICS is on (the default under
+Smart_Expense_Tracker.asgi).
 
+DRF views are sync-only, so these are plain Django async views that
+authenticate the JWT, honour If-None-Match and share the analytics cache
+themselves. Payloads come from the same builders in tracker/analytics.py
+and are rendered by DRF's JSONRenderer, so responses match the sync views
+byte for byte. The independent queries behind a payload run concurrently,
+each on its own connection (analytics.alists()).
+"""
+import asyncio
+from datetime import date, timedelta
 
-class MonthlySummaryView(APIView):
-    permission_classes = [IsAuthenticated]
+from dateutil.relativedelta import relativedelta
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
 
-    def get(self, request):
-        user = request.user
-        today = date.today()
+from . import analytics, caching, forecast, ledger
+from .authentication import CachedJWTAuthentication
+from .views import MAX_BUDGET_MONTHS
+
+_MISSING = object()
+
+
+class AsyncAnalyticsView(View):
+    """
+    Base class: subclasses implement `payload()`, returning the response
+    data or raising ValueError with a client-facing message (400).
+
+    `endpoint` names the analytics cache namespace and enables ETags;
+    leave it None for uncached endpoints. `varies_on_date` is the same
+    flag as cache_analytics/etag_varies_on_date on the sync views.
+    """
+    http_method_names = ["get", "head", "options"]
+    replica_reads = True
+    endpoint = None
+    varies_on_date = False
+    media_type = "application/json"
+    authenticator = CachedJWTAuthentication()
+    renderer = JSONRenderer()
 
-        # Filter current month
-        qs = Transaction.objects.filter(
-            user=user,
-            date__year=today.year,
-            date__month=today.month
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await self.authenticate(request)
+        except APIException as exc:
+            return self.error(exc)
+
+        version = await caching.acurrent_version(user.pk)
+        if self.endpoint is None:
+            return await self.respond(request, user, version, kwargs)
+
+        etag = caching.etag_for(
+            user.pk, version, request.build_absolute_uri(), self.media_type, self.varies_on_date
         )
+        if caching.etag_matches(etag, request.headers.get("If-None-Match")):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = await self.cached(request, user, version, kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Cache-Control"] = "private, no-cache"
+        return response
+
+    async def authenticate(self, request):
+        forced = getattr(request, "_force_auth_user", None)
+        if forced is not None:
+            # APIClient.force_authenticate(), as DRF's Request honours it
+            request.user = forced
+            return forced
+
+        result = await self.authenticator.aauthenticate(request)
+        if result is None:
+            raise NotAuthenticated()
+        request.user, request.auth = result
+        return request.user
+
+    async def cached(self, request, user, version, kwargs):
+        params = request.GET.copy()
+        if self.varies_on_date:
+            params["_today"] = date.today().isoformat()
+        key = caching.cache_key(user.pk, version, self.endpoint, params)
+
+        cache = caching.get_cache()
+        data = await cache.aget(key, _MISSING)
+        if data is not _MISSING:
+            caching.stats.record(hit=True)
+            response = self.render(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        caching.stats.record(hit=False)
+        response = await self.respond(request, user, version, kwargs, cache_as=key)
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def respond(self, request, user, version, kwargs, cache_as=None):
+        try:
+            data = await self.payload(request, user, version, **kwargs)
+        except ValueError as exc:
+            return self.render({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if cache_as is not None:
+            await caching.get_cache().aset(cache_as, data)
+        return self.render(data)
+
+    async def payload(self, request, user, version, **kwargs):
+        raise NotImplementedError
+
+    def render(self, data, status=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status, content_type=self.media_type)
+
+    def error(self, exc):
+        # Same body and headers DRF's exception handler produces
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response["WWW-Authenticate"] = self.authenticator.authenticate_header(None)
+        return response
+
+
+def analytics_filters(request):
+    ttype = request.GET.get("type")
+    date_from = analytics.parse_date(request.GET.get("date_from"), "date_from")
+    date_to = analytics.parse_date(request.GET.get("date_to"), "date_to")
+    return ttype, date_from, date_to
+
 
-        income_total = qs.filter(type="income").aggregate(total=Sum("amount"))["total"] or 0
-        expense_total = qs.filter(type="expense").aggregate(total=Sum("amount"))["total"] or 0
-        transaction_count = qs.count()
+# ---------------------------
+# Analytics: Monthly Summary
+# ---------------------------
+class MonthlySummaryView(AsyncAnalyticsView):
+    endpoint = "monthly-summary"
 
-        return Response({
-            "income_total": income_total,
-            "expense_total": expense_total,
-            "net": income_total - expense_total,
-            "transaction_count": transaction_count,
-        })
+    async def payload(self, request, user, version):
+        year = request.GET.get("year")
+        month = request.GET.get("month")
 
+        date_from = date_to = None
+        if year and month:
+            try:
+                date_from = date(int(year), int(month), 1)
+            except ValueError:
+                raise ValueError("Invalid year/month")
+            date_to = date_from + relativedelta(months=1) - timedelta(days=1)
 
-class MonthlyAnalyticsView(APIView):
-    permission_classes = [IsAuthenticated]
+        rows = await analytics.amonthly_rows(user, date_from=date_from, date_to=date_to)
+        return analytics.summary(rows, with_series=not (year and month))
 
-    def get(self, request):
-        user = request.user
+
+# ---------------------------
+# Analytics: Category Totals
+# ---------------------------
+class CategoryAnalyticsView(AsyncAnalyticsView):
+    endpoint = "category-totals"
+
+    async def payload(self, request, user, version):
+        ttype, date_from, date_to = analytics_filters(request)
+        rows = await ledger.amonthly_rows(user, version, ttype, date_from, date_to)
+        return analytics.category_totals(rows)
+
+
+# ---------------------------
+# Analytics: Monthly by Category
+# ---------------------------
+class MonthlyCategoryAnalyticsView(AsyncAnalyticsView):
+    endpoint = "monthly-category"
+
+    async def payload(self, request, user, version):
+        ttype, date_from, date_to = analytics_filters(request)
+        rows = await ledger.amonthly_rows(user, version, ttype, date_from, date_to)
+        return analytics.monthly_by_category(rows)
+
+
+# ---------------------------
+# Analytics: Spend Forecast
+# ---------------------------
+class ForecastView(AsyncAnalyticsView):
+    endpoint = "forecast"
+    varies_on_date = True
+
+    async def payload(self, request, user, version):
+        horizon = forecast.parse_horizon(request.GET.get("months"))
         today = date.today()
+        rows = await analytics.amonthly_rows(user, "expense", forecast.history_start(today))
+        return forecast.forecast(rows, today, horizon)
+
+
+# ---------------------------
+# Analytics: Monthly Totals (Simple)
+# ---------------------------
+class MonthlyTotalsView(AsyncAnalyticsView):
+    endpoint = "monthly"
+    varies_on_date = True
 
-        # For consistency, return the same fields (your React merges them)
-        qs = Transaction.objects.filter(
-            user=user,
-            date__year=today.year,
-            date__month=today.month
+    async def payload(self, request, user, version):
+        month_start = date.today().replace(day=1)
+        month_end = month_start + relativedelta(months=1) - timedelta(days=1)
+
+        rows = await analytics.amonthly_rows(user, date_from=month_start, date_to=month_end)
+        return analytics.net_totals(rows)
+
+
+# ---------------------------
+# Analytics: Dashboard
+# ---------------------------
+class DashboardView(AsyncAnalyticsView):
+    endpoint = "dashboard"
+    varies_on_date = True
+
+    async def payload(self, request, user, version):
+        this_month = date.today().replace(day=1)
+
+        categories, budgets, _ = analytics.budget_querysets(user, [this_month], rows=[])
+        rows, (categories, budgets) = await asyncio.gather(
+            analytics.amonthly_rows(user), analytics.alists(categories, budgets)
         )
+        current = [r for r in rows if r["month"] == this_month]
+        budgets = analytics.fold_budgets([this_month], categories, budgets, current)
+
+        return {
+            "monthly": analytics.net_totals(current),
+            "monthly_summary": analytics.summary(rows),
+            "category_totals": analytics.category_totals(rows),
+            "monthly_category": analytics.monthly_by_category(rows),
+            "budget_vs_expense": budgets[this_month],
+        }
+
+
+# ---------------------------
+# Budget vs Expense Analytics
+# ---------------------------
+class BudgetVsExpenseView(AsyncAnalyticsView):
+    async def payload(self, request, user, version, year=None, month=None):
+        if year is not None and month is not None:
+            try:
+                month_start = date(int(year), int(month), 1)
+            except ValueError:
+                raise ValueError("Invalid year/month")
+            by_month = await analytics.abudget_vs_spent(user, [month_start])
+            return by_month[month_start]
+
+        first = analytics.parse_month(request.GET.get("start"), "start")
+        last = analytics.parse_month(request.GET.get("end"), "end")
 
-        income_total = qs.filter(type="income").aggregate(total=Sum("amount"))["total"] or 0
-        expense_total = qs.filter(type="expense").aggregate(total=Sum("amount"))["total"] or 0
+        months = analytics.month_range(first, last)
+        if not months or len(months) > MAX_BUDGET_MONTHS:
+            raise ValueError(
+                f"start must not be after end and the range at most {MAX_BUDGET_MONTHS} months"
+            )
 
-        return Response({
-            "income_total": income_total,
-            "expense_total": expense_total,
-            "net": income_total - expense_total
-        })
+        by_month = await analytics.abudget_vs_spent(user, months)
+        return {
+            "results": [
+                {"month": m.strftime("%Y-%m"), "categories": by_month[m]}
+                for m in months
+            ]
+        }
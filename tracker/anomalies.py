@@ -0,0 +1,203 @@
+"""
+Anomaly detection over transaction histories.
+
+The scan_anomalies command scores the expenses added since its last run
+against their users' recent history and stores what stands out as
+TransactionFlags, which the API lists without recomputing anything:
+
+- outlier: far above what the user usually spends in the category. The
+  median and median absolute deviation (MAD) of every (user, category)
+  over LOOKBACK_DAYS are computed at once on sorted numpy arrays; an
+  amount is flagged when it is at least OUTLIER_RATIO times the median and
+  its robust z-score, 0.6745 * (amount - median) / MAD, exceeds OUTLIER_Z.
+- duplicate: the same category, amount and date as an earlier expense of
+  the user. Occurrences of one recurring rule never share a date.
+
+Users are scored in shards of SHARD_SIZE, a fixed number of queries each,
+on a pool of worker threads. Each run is recorded as an AnomalyScan; the
+next starts after the highest transaction id it covered. Transactions
+younger than SETTLE are left for the next run, so rows whose id was
+allocated before the run but committed after it are not skipped. Flags
+are unique per transaction and reason, so a failed or repeated run only
+redoes work, and a flag the user dismissed (kept with dismissed_at) is
+never raised again, not even by a full rescan. Users who get new flags
+have their data version bumped, which changes the flags endpoint's ETag.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import close_old_connections
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .caching import bump_versions
+from .ledger import to_cents
+from .models import AnomalyScan, Transaction, TransactionFlag
+
+logger = logging.getLogger("tracker.anomalies")
+
+LOOKBACK_DAYS = 365
+MIN_HISTORY = 5
+OUTLIER_RATIO = 3
+OUTLIER_Z = 3.5
+SHARD_SIZE = 500
+WORKERS = 4
+INSERT_BATCH_SIZE = 5000
+SETTLE = timedelta(minutes=1)
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+def group_medians(groups, values):
+    """
+    (median of `values` per group, group sizes) for dense group labels
+    0..n-1, with one sort for all groups.
+    """
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups)
+    starts = np.cumsum(counts) - counts
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2, counts
+
+
+def outliers(users, categories, cents, new):
+    """
+    Boolean mask of new rows far above their (user, category) median,
+    and each row's ratio to that median.
+    """
+    _, groups = np.unique(np.stack([users, categories]), axis=1, return_inverse=True)
+    groups = groups.ravel()
+    median, counts = group_medians(groups, cents.astype(np.float64))
+    typical = median[groups]
+    mad, _ = group_medians(groups, np.abs(cents - typical))
+    spread = mad[groups]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(typical > 0, cents / typical, 0)
+        z = np.where(spread > 0, 0.6745 * (cents - typical) / spread, np.inf)
+    flagged = (
+        new
+        & (categories != 0)
+        & (counts[groups] >= MIN_HISTORY)
+        & (typical > 0)
+        & (ratio >= OUTLIER_RATIO)
+        & (z > OUTLIER_Z)
+    )
+    return flagged, ratio, typical
+
+
+def duplicates(ids, users, categories, days, cents, new):
+    """
+    (index of each new row repeating an earlier row's user, category,
+    amount and date, index of that earlier row).
+    """
+    order = np.lexsort((ids, days, cents, categories, users))
+    same = np.ones(len(order) - 1, dtype=bool)
+    for column in (users, categories, cents, days):
+        ordered = column[order]
+        same &= ordered[1:] == ordered[:-1]
+    later, earlier = order[1:][same], order[:-1][same]
+    keep = new[later]
+    return later[keep], earlier[keep]
+
+
+def score_shard(user_ids, low, high, today):
+    """
+    Flag the expenses of `user_ids` with ids in (low, high]. Returns
+    (transactions scored, flags found).
+    """
+    rows = list(
+        Transaction.objects.filter(user_id__in=user_ids, type="expense")
+        .filter(Q(date__gte=today - timedelta(days=LOOKBACK_DAYS)) | Q(id__gt=low, id__lte=high))
+        .values_list("id", "user_id", "category_id", "date", "amount")
+    )
+    n = len(rows)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+    new = (ids > low) & (ids <= high)
+    if not new.any():
+        return 0, 0
+    users = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+    categories = np.fromiter((r[2] or 0 for r in rows), dtype=np.int64, count=n)
+    days = np.fromiter((r[3].toordinal() for r in rows), dtype=np.int64, count=n)
+    cents = np.fromiter((to_cents(r[4]) for r in rows), dtype=np.int64, count=n)
+
+    flags = []
+    flagged, ratio, typical = outliers(users, categories, cents, new)
+    for i in np.flatnonzero(flagged).tolist():
+        flags.append(TransactionFlag(
+            user_id=int(users[i]),
+            transaction_id=int(ids[i]),
+            reason="outlier",
+            score=round(float(ratio[i]), 2),
+            typical=Decimal(int(round(typical[i]))).scaleb(-2),
+        ))
+    later, earlier = duplicates(ids, users, categories, days, cents, new)
+    for i, j in zip(later.tolist(), earlier.tolist()):
+        flags.append(TransactionFlag(
+            user_id=int(users[i]),
+            transaction_id=int(ids[i]),
+            reason="duplicate",
+            duplicate_of_id=int(ids[j]),
+        ))
+
+    TransactionFlag.objects.bulk_create(flags, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+    bump_versions({flag.user_id for flag in flags})
+    return int(new.sum()), len(flags)
+
+
+def run_shard(user_ids, low, high, today):
+    # Worker threads keep their own connections, like request threads
+    close_old_connections()
+    try:
+        return score_shard(user_ids, low, high, today)
+    finally:
+        close_old_connections()
+
+
+# ---------------------------
+# Runs
+# ---------------------------
+def watermark():
+    finished = AnomalyScan.objects.filter(finished_at__isnull=False)
+    return finished.aggregate(last=Max("last_transaction_id"))["last"] or 0
+
+
+def scan(workers=WORKERS, shard_size=SHARD_SIZE, full=False, until=None):
+    """
+    Score the transactions created since the last finished scan (every
+    transaction with `full`) up to `until` (default: SETTLE ago). Returns
+    the finished AnomalyScan.
+    """
+    run = AnomalyScan.objects.create()
+    low = 0 if full else watermark()
+    until = until or run.started_at - SETTLE
+    high = Transaction.objects.filter(id__gt=low, created_at__lte=until).aggregate(high=Max("id"))["high"] or low
+
+    user_ids = sorted(set(
+        Transaction.objects.filter(id__gt=low, id__lte=high).values_list("user_id", flat=True).distinct()
+    ))
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+    today = timezone.localdate()
+
+    if workers > 1 and len(shards) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="anomalies") as pool:
+            results = list(pool.map(lambda shard: run_shard(shard, low, high, today), shards))
+    else:
+        results = [score_shard(shard, low, high, today) for shard in shards]
+
+    # Flags of transactions deleted since (nothing cascades to them)
+    TransactionFlag.objects.filter(
+        ~Exists(Transaction.objects.filter(pk=OuterRef("transaction_id")))
+    ).delete()
+
+    run.last_transaction_id = high
+    run.scored = sum(scored for scored, _ in results)
+    run.flagged = sum(flagged for _, flagged in results)
+    run.finished_at = timezone.now()
+    run.save()
+    logger.info("anomaly scan %s: %s scored, %s flagged", run.pk, run.scored, run.flagged)
+    return run
@@ -0,0 +1,201 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .instrumentation import span
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt's authentication, timed as the request's `auth` span.
+
+    aauthenticate() is the same check for async views, which run outside
+    DRF: token parsing and validation need no database, and the user is
+    fetched with the async ORM.
+    """
+    def authenticate(self, request):
+        with span("auth"):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        with span("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.user_id_of(validated_token)
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.check_user(user, validated_token)
+
+    def user_id_of(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        """
+        simplejwt's checks on the loaded user: active, and the token not
+        revoked by a password change.
+        """
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+# ---------------------------
+# Short-lived user cache (per process)
+# ---------------------------
+class UserCache:
+    """
+    Users resolved from tokens in the last AUTH_USER_CACHE_TTL seconds,
+    at most AUTH_USER_CACHE_MAX_USERS of them, evicted least recently
+    used first.
+
+    Saving or deleting a user drops its entry (see tracker.signals), so
+    password changes and deactivations through the ORM take effect on the
+    next request in this process; other processes see them within the
+    TTL. QuerySet.update() on users bypasses the signals and is only
+    picked up when the entry expires.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        return settings.AUTH_USER_CACHE_TTL
+
+    @property
+    def max_users(self):
+        return settings.AUTH_USER_CACHE_MAX_USERS
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    @staticmethod
+    def key(user_id):
+        # Tokens carry the id as a string, signals as the pk
+        return str(user_id)
+
+    def get(self, user_id):
+        """
+        A private copy of the cached user, or None.
+        """
+        key = self.key(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.copy(entry[1])
+            self.misses += 1
+            return None
+
+    def store(self, user_id, user, epoch):
+        """
+        Cache `user`, loaded after reading `epoch`. Skipped if any user was
+        invalidated meanwhile, since the row read may predate that write.
+        """
+        key = self.key(user_id)
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(self.key(user_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "max_users": self.max_users,
+                "ttl": self.ttl,
+                "queries_saved": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from `user_cache`
+    instead of querying it on every request. Cached users are still
+    checked for being active and for token revocation each time.
+    """
+    def get_user(self, validated_token):
+        if not settings.AUTH_USER_CACHE_TTL:
+            return super().get_user(validated_token)
+
+        user_id = self.user_id_of(validated_token)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return self.check_user(user, validated_token)
+
+        epoch = user_cache.epoch
+        user = super().get_user(validated_token)
+        user_cache.store(user_id, user, epoch)
+        return user
+
+    async def aget_user(self, validated_token):
+        if not settings.AUTH_USER_CACHE_TTL:
+            return await super().aget_user(validated_token)
+
+        user_id = self.user_id_of(validated_token)
+        user = user_cache.get(user_id)
+        if user is not None:
+            return self.check_user(user, validated_token)
+
+        epoch = user_cache.epoch
+        user = await super().aget_user(validated_token)
+        user_cache.store(user_id, user, epoch)
+        return user
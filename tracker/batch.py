@@ -0,0 +1,227 @@
+import copy
+from collections import defaultdict
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+
+from .models import Category, Transaction
+from .signals import transactions_bulk_changed
+
+MAX_BATCH_OPERATIONS = 500
+BATCH_SIZE = 500
+
+UPDATABLE_FIELDS = ("type", "category", "amount", "date", "note")
+TYPES = {choice for choice, _ in Transaction.TYPE_CHOICES}
+
+NOT_FOUND = {"detail": "Not found."}
+
+
+def clean_changes(changes, categories):
+    """
+    Validate an update's field values. Returns (values, errors); values
+    are keyed by model attribute (category becomes category_id).
+    """
+    values, errors = {}, {}
+    for name, value in changes.items():
+        if name not in UPDATABLE_FIELDS:
+            errors[name] = ["This field cannot be updated."]
+            continue
+
+        if name == "type":
+            if value not in TYPES:
+                errors["type"] = [f'"{value}" is not a valid choice.']
+            else:
+                values["type"] = value
+
+        elif name == "category":
+            if value is None:
+                values["category_id"] = None
+            elif not isinstance(value, int) or isinstance(value, bool) or value not in categories:
+                errors["category"] = [f'Invalid pk "{value}" - object does not exist.']
+            else:
+                values["category_id"] = value
+
+        elif name == "amount":
+            field = Transaction._meta.get_field("amount")
+            try:
+                amount = field.to_python(value)
+                field.run_validators(amount)
+            except ValidationError:
+                errors["amount"] = ["A valid amount is required."]
+                continue
+            if amount is None or amount <= 0:
+                errors["amount"] = ["Amount must be positive."]
+            else:
+                values["amount"] = amount
+
+        elif name == "date":
+            try:
+                values["date"] = date.fromisoformat(str(value))
+            except ValueError:
+                errors["date"] = ["Date has wrong format. Use YYYY-MM-DD."]
+
+        elif name == "note":
+            if value is not None and not isinstance(value, str):
+                errors["note"] = ["Not a valid string."]
+            else:
+                values["note"] = value or None
+
+    return values, errors
+
+
+def apply_operations(user, operations, atomic=False):
+    """
+    Apply `operations` to `user`'s transactions in one database
+    transaction and return one result per operation, in order.
+
+    Each operation is {"op": "update", "id": ..., "fields": {...}} or
+    {"op": "delete", "id": ...}. Ownership is checked with one query for
+    all ids; ids the user does not own are reported as not found.
+    Updates are written with one UPDATE per distinct set of assignments
+    (bulk_update per field set when values differ), deletes with one
+    DELETE ... WHERE id IN. With `atomic`, any failed operation rejects
+    the whole batch.
+    """
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations can be applied at once.")
+
+    ids = {op.get("id") for op in operations if isinstance(op, dict)}
+    ids = [pk for pk in ids if isinstance(pk, int) and not isinstance(pk, bool)]
+    categories = {
+        pk: ttype
+        for pk, ttype in Category.objects.filter(user=user).values_list("pk", "type")
+    }
+
+    with transaction.atomic():
+        owned = {
+            txn.pk: txn
+            for txn in Transaction.objects.select_for_update().filter(user=user, pk__in=ids)
+        }
+
+        results, updates, deletes, seen = [], [], [], set()
+        for index, op in enumerate(operations):
+            if not isinstance(op, dict):
+                op = {}
+            result = {"index": index, "op": op.get("op"), "id": op.get("id"), "status": 400}
+            results.append(result)
+
+            pk = op.get("id")
+            if op.get("op") not in ("update", "delete"):
+                result["errors"] = {"op": ['Expected "update" or "delete".']}
+                continue
+            if pk not in owned:
+                result["status"] = 404
+                result["errors"] = NOT_FOUND
+                continue
+            if pk in seen:
+                result["errors"] = {"id": ["Only one operation per transaction is allowed in a batch."]}
+                continue
+            seen.add(pk)
+
+            if op["op"] == "delete":
+                deletes.append(owned[pk])
+                result["status"] = 204
+                continue
+
+            changes = op.get("fields")
+            if not isinstance(changes, dict) or not changes:
+                result["errors"] = {"fields": ["Expected an object of fields."]}
+                continue
+
+            values, errors = clean_changes(changes, categories)
+            if not errors:
+                after = copy.copy(owned[pk])
+                for attr, value in values.items():
+                    setattr(after, attr, value)
+                if after.category_id is not None and categories[after.category_id] != after.type:
+                    errors["non_field_errors"] = ["Transaction type must match category type."]
+            if errors:
+                result["errors"] = errors
+                continue
+
+            updates.append((owned[pk], after, values))
+            result["status"] = 200
+
+        failed = any(r["status"] >= 400 for r in results)
+        if atomic and failed:
+            for r in results:
+                if r["status"] < 400:
+                    r["status"] = 424
+                    r["errors"] = {"detail": "Not applied: another operation in the batch failed."}
+            return results
+
+        write_updates(updates)
+        if deletes and not delete_rows(deletes):
+            # The per-row post_delete signals already accounted for them
+            deletes = []
+
+        if updates or deletes:
+            transactions_bulk_changed.send(
+                sender=Transaction,
+                user_id=user.pk,
+                updated=[(before, after) for before, after, _ in updates],
+                deleted=deletes,
+            )
+
+    return results
+
+
+def raw_delete_is_safe():
+    """
+    True while every relation pointing at Transaction is a DO_NOTHING key
+    without a database constraint (today TransactionFlag.transaction and
+    TransactionFlag.duplicate_of), so deleting rows needs no collector:
+    there is nothing to cascade, null out or protect.
+    """
+    return all(
+        rel.on_delete is models.DO_NOTHING and not rel.field.db_constraint
+        for rel in Transaction._meta.related_objects
+    )
+
+
+def delete_rows(deletes):
+    """
+    Delete the given transactions. Returns True when the deletion skipped
+    the per-row signals, so the caller must report the rows through
+    transactions_bulk_changed; False when a relation needed the collector
+    and the post_delete signals have run for each row.
+    """
+    ids = [txn.pk for txn in deletes]
+    if not raw_delete_is_safe():
+        Transaction.objects.filter(pk__in=ids).delete()
+        return False
+
+    # QuerySet.delete() would send post_delete for every row on top of the
+    # bulk signal, so issue the DELETE directly
+    connection = connections[router.db_for_write(Transaction)]
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    column = connection.ops.quote_name(Transaction._meta.pk.column)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", chunk)
+    return True
+
+
+def write_updates(updates):
+    """
+    One UPDATE per distinct set of assignments, so recategorizing many
+    rows to the same category is a single statement; field sets whose
+    values differ row to row go through bulk_update.
+    """
+    by_fields = defaultdict(list)
+    for _, after, values in updates:
+        by_fields[tuple(sorted(values))].append((after, values))
+
+    for fields, rows in by_fields.items():
+        assignments = {tuple(values[f] for f in fields) for _, values in rows}
+        if len(assignments) == 1:
+            Transaction.objects.filter(pk__in=[after.pk for after, _ in rows]).update(**rows[0][1])
+        else:
+            Transaction.objects.bulk_update(
+                [after for after, _ in rows],
+                [f.removesuffix("_id") for f in fields],
+                batch_size=BATCH_SIZE,
+            )
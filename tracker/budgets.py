@@ -0,0 +1,208 @@
+"""
+Budget utilization.
+
+Every Budget carries `spent`, the running total of the user's expenses in
+its category and month, and `alert_level`, the highest of the
+BUDGET_ALERT_THRESHOLDS (percentages of the amount) that spending has
+reached. tracker.signals keeps both in step with Transaction writes from
+the same per-bucket deltas as the monthly rollups, so a budget's status is
+read from its own row.
+
+Reaching a threshold records a BudgetAlert. Spending that drops back below
+it (an edit or a delete) lowers the level again, so crossing it once more
+records another alert. The reconcile_budgets command repairs budgets whose
+counters drifted from the transactions.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from . import rollups
+from .models import Budget, BudgetAlert, MonthlyRollup
+
+APPLY_BATCH_SIZE = 1000
+CENTS = Decimal("0.01")
+
+
+def thresholds():
+    return sorted(settings.BUDGET_ALERT_THRESHOLDS)
+
+
+def level(spent, amount):
+    """
+    The highest threshold `spent` reaches against `amount`, 0 for none.
+    Any spending reaches every threshold of a zero budget.
+    """
+    if spent <= 0:
+        return 0
+    reached = [t for t in thresholds() if amount <= 0 or spent * 100 >= amount * t]
+    return reached[-1] if reached else 0
+
+
+def utilization(spent, amount):
+    """
+    Percentage of the amount spent, or None for a zero budget.
+    """
+    if amount <= 0:
+        return None
+    return round(float(spent * 100 / amount), 1)
+
+
+def crossed(previous, current):
+    return [t for t in thresholds() if previous < t <= current]
+
+
+def alerts_for(budget, reached):
+    return [
+        BudgetAlert(
+            user_id=budget.user_id,
+            budget_id=budget.pk,
+            threshold=threshold,
+            spent=budget.spent,
+            amount=budget.amount,
+        )
+        for threshold in reached
+    ]
+
+
+# ---------------------------
+# Incremental maintenance (called from signals)
+# ---------------------------
+def apply(changes):
+    """
+    Add expense deltas, as returned by rollups.deltas(), to the budgets of
+    their category and month, recording alerts for thresholds reached.
+
+    Budgets are read and locked together and written back with one upsert
+    per APPLY_BATCH_SIZE of them; changes that touch no budget cost the
+    one read.
+    """
+    spent = {
+        (user_id, category_id, month): amount
+        for (user_id, month, ttype, category_id), (amount, _) in changes.items()
+        if ttype == "expense" and category_id is not None and amount
+    }
+    keys = list(spent)
+    for start in range(0, len(keys), APPLY_BATCH_SIZE):
+        chunk = keys[start:start + APPLY_BATCH_SIZE]
+        with transaction.atomic():
+            # A superset (every pairing of those categories and months),
+            # narrowed down here
+            budgets = Budget.objects.select_for_update().filter(
+                category_id__in={key[1] for key in chunk}, month__in={key[2] for key in chunk}
+            )
+            changed, alerts = [], []
+            for budget in budgets:
+                amount = spent.get((budget.user_id, budget.category_id, budget.month))
+                if amount is None:
+                    continue
+                previous = budget.alert_level
+                budget.spent += amount
+                budget.alert_level = level(budget.spent, budget.amount)
+                changed.append(budget)
+                alerts += alerts_for(budget, crossed(previous, budget.alert_level))
+
+            rollups.write_rows(changed, ("spent", "alert_level"))
+            BudgetAlert.objects.bulk_create(alerts)
+
+
+def transaction_saved(old_bucket, txn):
+    """
+    Re-file a saved transaction. `old_bucket` is the rollups.bucket_of()
+    result captured before the save, None for a new transaction.
+    """
+    changes = defaultdict(Decimal)
+    if old_bucket is not None:
+        changes[old_bucket[:4]] -= old_bucket[4]
+    *key, amount = rollups.bucket_of(txn)
+    changes[tuple(key)] += amount
+    apply({key: (amount, 0) for key, amount in changes.items()})
+
+
+def transaction_deleted(txn):
+    *key, amount = rollups.bucket_of(txn)
+    apply({tuple(key): (-amount, -1)})
+
+
+def refresh(budget):
+    """
+    Set spent and the alert level of a budget about to be saved, which
+    may be new or have a new category, month or amount. Returns the
+    thresholds it newly reaches, for record() once it is saved.
+    """
+    previous = 0
+    if not budget._state.adding:
+        # The stored level: the instance may be stale
+        previous = Budget.objects.filter(pk=budget.pk).values_list(
+            "alert_level", flat=True
+        ).first() or 0
+
+    budget.spent = MonthlyRollup.objects.filter(
+        user_id=budget.user_id,
+        category_id=budget.category_id,
+        month=budget.month,
+        type="expense",
+    ).values_list("total", flat=True).first() or Decimal(0)
+
+    budget.alert_level = level(budget.spent, Budget._meta.get_field("amount").to_python(budget.amount))
+    return crossed(previous, budget.alert_level)
+
+
+def record(budget, reached):
+    if reached:
+        BudgetAlert.objects.bulk_create(alerts_for(budget, reached))
+
+
+# ---------------------------
+# Reconciliation
+# ---------------------------
+def reconcile(user_ids=None, repair=True, alerts=True):
+    """
+    Compare the budgets of `user_ids` (or every user) with their expense
+    transactions. Returns a list of (budget id, expected, stored) where
+    each side is (spent, alert level).
+
+    With `repair`, drifted budgets are corrected, recording alerts for
+    the thresholds they newly reach unless `alerts` is false. Levels are
+    recomputed too, so changed BUDGET_ALERT_THRESHOLDS take effect.
+    """
+    budgets = Budget.objects.order_by("pk")
+    if user_ids is not None:
+        budgets = budgets.filter(user_id__in=user_ids)
+
+    mismatches = []
+    with transaction.atomic():
+        if repair:
+            budgets = budgets.select_for_update()
+        budgets = list(budgets)
+
+        expected = {
+            (row["user_id"], row["category_id"], row["month"]): row["total"]
+            for row in rollups.aggregate_transactions(user_ids).filter(
+                type="expense", category__isnull=False
+            )
+        }
+
+        changed, new_alerts = [], []
+        for budget in budgets:
+            # SQLite sums decimals as floats
+            spent = Decimal(expected.get((budget.user_id, budget.category_id, budget.month), 0)).quantize(CENTS)
+            want = (spent, level(spent, budget.amount))
+            have = (budget.spent, budget.alert_level)
+            if want == have:
+                continue
+            mismatches.append((budget.pk, want, have))
+
+            previous = budget.alert_level
+            budget.spent, budget.alert_level = want
+            changed.append(budget)
+            if alerts:
+                new_alerts += alerts_for(budget, crossed(previous, budget.alert_level))
+
+        if repair:
+            rollups.write_rows(changed, ("spent", "alert_level"))
+            BudgetAlert.objects.bulk_create(new_alerts, batch_size=APPLY_BATCH_SIZE)
+
+    return mismatches
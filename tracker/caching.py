@@ -0,0 +1,233 @@
+import hashlib
+import threading
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import UserDataVersion
+
+_MISSING = object()
+
+
+# ---------------------------
+# Per-user data version
+# ---------------------------
+def current_version(user_id):
+    version = (
+        UserDataVersion.objects.filter(user_id=user_id)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+async def acurrent_version(user_id):
+    version = await (
+        UserDataVersion.objects.filter(user_id=user_id)
+        .values_list("version", flat=True)
+        .afirst()
+    )
+    return version or 0
+
+
+def request_version(request):
+    """
+    The requesting user's data version, read at most once per request.
+    """
+    if not hasattr(request, "_data_version"):
+        request._data_version = current_version(request.user.pk)
+    return request._data_version
+
+
+def bump_version(user_id, create=True):
+    """
+    Invalidate everything cached for `user_id` and return the new version,
+    which the write stamps on its rows as their change_seq.
+
+    Delete paths pass create=False: during a cascading user delete the
+    version row is already gone and must not be recreated. None is
+    returned then.
+    """
+    updated = UserDataVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    if not updated:
+        if not create:
+            return None
+        try:
+            with transaction.atomic():
+                UserDataVersion.objects.create(user_id=user_id, version=1)
+            return 1
+        except IntegrityError:
+            UserDataVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    # Callers write inside the same transaction (VersionedModel.save, the
+    # bulk paths' atomic blocks), so the update holds the row lock until the
+    # data commits: versions commit in order, and never ahead of their data.
+    return current_version(user_id)
+
+
+def bump_versions(user_ids):
+    user_ids = list(user_ids)
+    UserDataVersion.objects.bulk_create(
+        [UserDataVersion(user_id=pk) for pk in user_ids], ignore_conflicts=True
+    )
+    UserDataVersion.objects.filter(user_id__in=user_ids).update(version=F("version") + 1)
+
+
+# ---------------------------
+# Hit/miss counters (per process)
+# ---------------------------
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None,
+        }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[settings.ANALYTICS_CACHE_ALIAS]
+
+
+def cache_key(user_id, version, endpoint, params):
+    """
+    Key for one cached payload. `params` is a QueryDict; it is normalised
+    (sorted keys and values, blanks dropped) so equivalent requests share
+    an entry.
+    """
+    normalized = "&".join(
+        f"{key}={value}"
+        for key, values in sorted(params.lists())
+        for value in sorted(values)
+        if value != ""
+    )
+    digest = hashlib.sha1(normalized.encode()).hexdigest()
+    return f"analytics:{user_id}:{version}:{endpoint}:{digest}"
+
+
+def cache_analytics(endpoint, varies_on_date=False):
+    """
+    Decorator for an analytics APIView's `get` that serves it from the
+    analytics cache.
+
+    Entries are keyed by user, `endpoint`, the normalised query params and
+    the user's data version, so any write makes them unreachable without
+    scanning the cache. Only 200 responses are stored. Views whose answer
+    depends on the current date pass `varies_on_date`.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            params = request.query_params.copy()
+            if varies_on_date:
+                params["_today"] = date.today().isoformat()
+            key = cache_key(request.user.pk, request_version(request), endpoint, params)
+
+            cache = get_cache()
+            data = cache.get(key, _MISSING)
+            if data is not _MISSING:
+                stats.record(hit=True)
+                response = Response(data)
+                response["X-Cache"] = "HIT"
+                return response
+
+            stats.record(hit=False)
+            response = get(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data)
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+    return decorator
+
+
+# ---------------------------
+# Conditional GET
+# ---------------------------
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def etag_for(user_id, version, url, media_type, varies_on_date=False):
+    parts = [str(user_id), str(version), url, media_type or ""]
+    if varies_on_date:
+        parts.append(date.today().isoformat())
+    return '"%s"' % hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def etag_matches(etag, if_none_match):
+    if not if_none_match:
+        return False
+    candidates = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+    return "*" in candidates or etag in candidates
+
+
+class ETagMixin:
+    """
+    Strong ETags for per-user GET endpoints.
+
+    The tag hashes the user's data version with the full request URL and
+    the negotiated media type. It is checked right after authentication,
+    so a matching If-None-Match returns 304 before any queryset or
+    serializer runs. Views whose output depends on the current date set
+    `etag_varies_on_date`.
+    """
+    etag_varies_on_date = False
+
+    def get_etag(self, request):
+        return etag_for(
+            request.user.pk,
+            request_version(request),
+            request.build_absolute_uri(),
+            request.accepted_media_type,
+            self.etag_varies_on_date,
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        self.etag = None
+        if request.method not in ("GET", "HEAD") or not request.user.is_authenticated:
+            return
+
+        self.etag = self.get_etag(request)
+        if etag_matches(self.etag, request.headers.get("If-None-Match")):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) and response.status_code in (200, 304):
+            response["ETag"] = self.etag
+            response["Cache-Control"] = "private, no-cache"
+        return response
@@ -0,0 +1,166 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger("tracker.db")
+
+PRIMARY = "default"
+
+# Apps whose reads always go to the primary: authentication must see new
+# accounts and password changes immediately.
+PRIMARY_ONLY_APPS = {"auth"}
+
+
+class RoutingState:
+    """
+    Routing flags for one request. Kept in a mutable object so changes
+    made in a copied context (async views run the ORM through
+    sync_to_async) are seen by the whole request.
+
+    `replica` is the replica chosen for the request's first replica read;
+    later reads reuse it so the request sees one consistent snapshot.
+    """
+    __slots__ = ("replica_reads", "pinned", "replica")
+
+    def __init__(self):
+        self.replica_reads = False
+        self.pinned = False
+        self.replica = None
+
+
+_state = contextvars.ContextVar("tracker_db_routing", default=None)
+
+
+# ---------------------------
+# Request scope (see ReplicaReadMiddleware)
+# ---------------------------
+def begin_request():
+    return _state.set(RoutingState())
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def allow_replica_reads():
+    """
+    Let the current request read from a replica until it writes.
+    """
+    state = _state.get()
+    if state is not None:
+        state.replica_reads = True
+
+
+def replica_reads(view):
+    """
+    Mark a function view as safe to serve from a replica. Class-based
+    views set `replica_reads = True` or, for viewsets, list the actions
+    in `replica_read_actions`.
+    """
+    view.replica_reads = True
+    return view
+
+
+def view_reads_from_replica(request, view_func):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if getattr(view_func, "replica_reads", False):
+        return True
+
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return actions.get(request.method.lower()) in getattr(view_class, "replica_read_actions", ())
+    return getattr(view_class, "replica_reads", False)
+
+
+# ---------------------------
+# Replica health (per process)
+# ---------------------------
+class ReplicaHealth:
+    """
+    Remembers for DATABASE_REPLICA_HEALTH_INTERVAL seconds whether each
+    replica answered a trivial query, so a replica that is down costs one
+    failed connection attempt per interval instead of one per request.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked is not None and now - checked[0] < settings.DATABASE_REPLICA_HEALTH_INTERVAL:
+            return checked[1]
+
+        healthy = self.check(alias)
+        with self._lock:
+            self._checked[alias] = (now, healthy)
+        return healthy
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except DatabaseError:
+            logger.warning("replica %s failed its health check; reading from the primary", alias)
+            connections[alias].close()
+            return False
+
+    def snapshot(self):
+        with self._lock:
+            return {alias: healthy for alias, (_, healthy) in self._checked.items()}
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+# ---------------------------
+# Router
+# ---------------------------
+class ReplicaRouter:
+    """
+    Sends reads to a healthy replica from DATABASE_REPLICAS when the
+    current request allows it, and everything else to the primary. A
+    request keeps reading from the same replica while it stays healthy.
+
+    Any write pins the rest of the request to the primary, so it reads its
+    own writes. Outside requests that opted in (management commands,
+    writes, signals) every query goes to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.pinned:
+            return PRIMARY
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+
+        if state.replica in settings.DATABASE_REPLICAS and health.is_healthy(state.replica):
+            return state.replica
+
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if health.is_healthy(alias)]
+        if not replicas:
+            return PRIMARY
+        state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
@@ -0,0 +1,58 @@
+from django.db import transaction
+
+from .models import Category
+from . import caching, sync
+
+DEFAULT_EXPENSE_CATEGORIES = [
+    "Utilities",
+    "Rent",
+    "Insurance",
+    "Housing",
+    "Debt",
+    "Clothing",
+    "Savings",
+    "Gifting",
+    "Medical",
+    "Miscellaneous",
+]
+
+DEFAULT_INCOME_CATEGORIES = [
+    "Salary",
+    "Investments",
+    "Bonus",
+    "Business",
+    "Other Income",
+]
+
+DEFAULT_CATEGORIES = (
+    [(name, "expense") for name in DEFAULT_EXPENSE_CATEGORIES]
+    + [(name, "income") for name in DEFAULT_INCOME_CATEGORIES]
+)
+
+
+def seed_default_categories(user_ids, batch_size=5000):
+    """
+    Give every user in `user_ids` the default categories they are missing.
+
+    One multi-row INSERT that skips rows hitting the (user, name, type)
+    unique constraint, so it is safe to re-run and needs no lookups.
+    """
+    user_ids = list(user_ids)
+    # One transaction, so the bumped versions never commit ahead of the rows
+    with transaction.atomic():
+        Category.objects.bulk_create(
+            [
+                Category(user_id=user_id, name=name, type=ttype)
+                for user_id in user_ids
+                for name, ttype in DEFAULT_CATEGORIES
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # bulk_create sends no post_save, so invalidate cached reads here and
+        # stamp the inserted rows (the only ones never stamped) for delta sync
+        caching.bump_versions(user_ids)
+        sync.stamp_with_versions(
+            Category,
+            Category.objects.filter(user_id__in=user_ids, change_seq=0).values_list("pk", flat=True),
+        )
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+
+EXPORT_FIELDS = (
+    "id",
+    "date",
+    "type",
+    "category",
+    "category_name",
+    "amount",
+    "note",
+    "receipt",
+    "created_at",
+)
+
+# Rows are buffered into one chunk of output before being handed to the
+# response, which keeps the number of writes to the socket reasonable.
+ROWS_PER_CHUNK = 500
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Flat dicts for every transaction in `queryset`, read through a
+    server-side cursor `chunk_size` rows at a time.
+    """
+    rows = queryset.values(
+        "id", "date", "type", "category_id", "category__name",
+        "amount", "note", "receipt", "created_at",
+    ).order_by("-date", "-created_at", "id")
+
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            "id": row["id"],
+            "date": row["date"].isoformat(),
+            "type": row["type"],
+            "category": row["category_id"],
+            "category_name": row["category__name"],
+            "amount": f"{row['amount']:f}",
+            "note": row["note"],
+            "receipt": row["receipt"] or None,
+            "created_at": row["created_at"].isoformat(),
+        }
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if n % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, separators=(",", ":")))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,167 @@
+"""
+Spend forecasts per expense category.
+
+Built from the monthly expense series the monthly-category analytics read,
+arranged as a categories x months matrix so every category is projected
+at once with array operations:
+
+- seasonal indices: each calendar month's average spend relative to the
+  category's monthly average, once a category has SEASONAL_MIN_MONTHS of
+  history (1 otherwise);
+- a level: the exponentially weighted average (smoothing factor ALPHA) of
+  the deseasonalized history since the category's first expense, which is
+  simple exponential smoothing;
+- the forecast for a month: level x that month's seasonal index.
+
+The current month ends at its forecast, or at what was already spent if
+that is more: spending is often lumpy (rent on the 1st), so what is left
+of a typical month is expected rather than a pro-rata share of it.
+Categories with no earlier history are projected at this month's pace.
+"""
+import calendar
+from datetime import date
+
+import numpy as np
+
+ALPHA = 0.3
+SEASONAL_MIN_MONTHS = 24
+HISTORY_MONTHS = 120
+DEFAULT_HORIZON = 3
+MAX_HORIZON = 12
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def month_of(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def history_start(today):
+    return month_of(month_index(today) - HISTORY_MONTHS)
+
+
+def parse_horizon(value):
+    if value in (None, ""):
+        return DEFAULT_HORIZON
+    try:
+        horizon = int(value)
+    except ValueError:
+        horizon = 0
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"months must be between 1 and {MAX_HORIZON}")
+    return horizon
+
+
+def series(rows, first, last):
+    """
+    Expense totals from monthly rows as (category ids, names, matrix)
+    with one row per category and one column per month from month index
+    `first` to `last`. Uncategorized spend has category id None.
+    """
+    rows = [
+        r for r in rows
+        if r["type"] == "expense" and first <= month_index(r["month"]) <= last
+    ]
+    names = {r["category_id"]: r["category__name"] for r in rows}
+    ids = sorted(names, key=lambda pk: (names[pk] or "Uncategorized", pk or 0))
+    position = {pk: n for n, pk in enumerate(ids)}
+
+    matrix = np.zeros((len(ids), last - first + 1))
+    np.add.at(
+        matrix,
+        (
+            np.fromiter((position[r["category_id"]] for r in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((month_index(r["month"]) - first for r in rows), dtype=np.int64, count=len(rows)),
+        ),
+        np.fromiter((r["total"] for r in rows), dtype=np.float64, count=len(rows)),
+    )
+    return ids, names, matrix
+
+
+def seasonal_indices(history, valid, calendar_months):
+    """
+    (categories x 12) ratio of each calendar month's average to the
+    category's monthly average, 1 where there is too little history.
+    """
+    onehot = (calendar_months[:, None] == np.arange(12)).astype(np.float64)
+    sums = (history * valid) @ onehot
+    counts = valid.astype(np.float64) @ onehot
+
+    months = counts.sum(axis=1, keepdims=True)
+    average = np.divide(sums.sum(axis=1, keepdims=True), months, out=np.zeros_like(months), where=months > 0)
+    seasonal = (counts > 0) & (months >= SEASONAL_MIN_MONTHS) & (average > 0)
+    return np.divide(sums / np.maximum(counts, 1), average, out=np.ones_like(sums), where=seasonal)
+
+
+def project(matrix, first, today, horizon):
+    """
+    (month-end projection of the current month, forecasts for the next
+    `horizon` months) per row of `matrix`, whose last column is the
+    current month.
+    """
+    current = month_index(today)
+    history, spent = matrix[:, :-1], matrix[:, -1]
+    months = history.shape[1]
+    calendar_months = (first + np.arange(months)) % 12
+
+    # Months before a category's first expense are not zero spend
+    started = np.maximum.accumulate(history > 0, axis=1)
+    seasonal = seasonal_indices(history, started, calendar_months)
+
+    factors = seasonal[:, calendar_months]
+    valid = started & (factors > 0)
+    deseasonalized = np.divide(history, factors, out=np.zeros_like(history), where=valid)
+    weights = (1 - ALPHA) ** np.arange(months - 1, -1, -1)
+    total_weight = valid @ weights
+
+    # Without history, this month's pace (which is also its month end)
+    elapsed = today.day / calendar.monthrange(today.year, today.month)[1]
+    level = np.divide(
+        (deseasonalized * valid) @ weights, total_weight,
+        out=spent / elapsed, where=total_weight > 0,
+    )
+
+    month_end = np.maximum(spent, level * seasonal[:, current % 12])
+    ahead = (current + np.arange(1, horizon + 1)) % 12
+    return month_end, level[:, None] * seasonal[:, ahead]
+
+
+def forecast(rows, today, horizon=DEFAULT_HORIZON):
+    """
+    Month-end and next-`horizon`-month expense projections per category
+    from monthly rows covering history_start(today) to today.
+    """
+    current = month_index(today)
+    first = current - HISTORY_MONTHS
+    ids, names, matrix = series(rows, first, current)
+
+    months = [month_of(current + h).strftime("%Y-%m") for h in range(1, horizon + 1)]
+    if not ids:
+        month_end, ahead = np.zeros(0), np.zeros((0, horizon))
+    else:
+        month_end, ahead = project(matrix, first, today, horizon)
+
+    def amounts(values):
+        return [round(value, 2) for value in values.tolist()]
+
+    return {
+        "month": today.strftime("%Y-%m"),
+        "months": months,
+        "categories": [
+            {
+                "category_id": pk,
+                "category": names[pk] or "Uncategorized",
+                "spent": round(spent, 2),
+                "month_end": round(end, 2),
+                "forecast": amounts(row),
+            }
+            for pk, spent, end, row in zip(ids, matrix[:, -1].tolist(), month_end.tolist(), ahead)
+        ],
+        "total": {
+            "spent": round(float(matrix[:, -1].sum()), 2),
+            "month_end": round(float(month_end.sum()), 2),
+            "forecast": amounts(ahead.sum(axis=0)),
+        },
+    }
@@ -0,0 +1,122 @@
+import codecs
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Category, Transaction
+from .parsers import read_csv
+from .signals import transactions_bulk_changed
+
+MAX_IMPORT_ROWS = 10000
+IMPORT_BATCH_SIZE = 1000
+
+TYPES = {choice for choice, _ in Transaction.TYPE_CHOICES}
+
+
+def rows_from_upload(upload):
+    """
+    Rows of an uploaded CSV file as dicts keyed by lower-cased header.
+    """
+    try:
+        return read_csv(codecs.iterdecode(upload, "utf-8-sig"))
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ValueError(f"CSV parse error - {exc}")
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def validate_rows(user, rows):
+    """
+    Turn raw import rows into unsaved Transactions.
+
+    Applies the same rules as TransactionSerializer.validate, resolving
+    category names with a single query. Returns (transactions, errors)
+    where errors is a list of {"row": index, "errors": {...}}.
+    """
+    categories = {
+        (name.lower(), ttype): pk
+        for pk, name, ttype in Category.objects.filter(user=user).values_list("pk", "name", "type")
+    }
+    amount_field = Transaction._meta.get_field("amount")
+
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+
+        row_errors = {}
+
+        ttype = _text(row, "type").lower()
+        if ttype not in TYPES:
+            row_errors["type"] = [f'"{ttype}" is not a valid choice.']
+
+        try:
+            txn_date = date.fromisoformat(_text(row, "date"))
+        except ValueError:
+            txn_date = None
+            row_errors["date"] = ["Date has wrong format. Use YYYY-MM-DD."]
+
+        try:
+            amount = Decimal(_text(row, "amount"))
+            amount_field.run_validators(amount)
+            if amount <= 0:
+                row_errors["non_field_errors"] = ["Amount must be positive."]
+        except (InvalidOperation, ValidationError):
+            amount = None
+            row_errors["amount"] = ["A valid amount is required."]
+
+        category_id = None
+        category_name = _text(row, "category")
+        if category_name and ttype in TYPES:
+            category_id = categories.get((category_name.lower(), ttype))
+            if category_id is None:
+                row_errors["category"] = [f'No {ttype} category named "{category_name}".']
+
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+            continue
+
+        valid.append(Transaction(
+            user=user,
+            type=ttype,
+            category_id=category_id,
+            amount=amount,
+            date=txn_date,
+            note=_text(row, "note") or None,
+        ))
+
+    return valid, errors
+
+
+def import_rows(user, rows, atomic=False):
+    """
+    Validate and insert `rows` for `user` in batches of IMPORT_BATCH_SIZE
+    inside one database transaction.
+
+    With `atomic`, any invalid row rejects the whole import; otherwise the
+    valid rows are inserted and the invalid ones reported.
+    """
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"At most {MAX_IMPORT_ROWS} rows can be imported at once.")
+
+    valid, errors = validate_rows(user, rows)
+    if errors and atomic:
+        valid = []
+
+    created = []
+    if valid:
+        with transaction.atomic():
+            for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+                created += Transaction.objects.bulk_create(valid[start:start + IMPORT_BATCH_SIZE])
+            transactions_bulk_changed.send(sender=Transaction, user_id=user.pk, created=created)
+
+    return {"created": len(created), "errors": errors}
@@ -0,0 +1,208 @@
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger("tracker.perf")
+
+_current = contextvars.ContextVar("tracker_request_metrics", default=None)
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+# ---------------------------
+# Per-request metrics
+# ---------------------------
+class RequestMetrics:
+    """
+    Timings collected while one request is handled. Durations are kept
+    in seconds and reported in milliseconds.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.view_started = None
+        self.queries = 0
+        self.db = 0.0
+        self.spans = {}
+        self._open = set()
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self, total):
+        record = {
+            "view": self.view_name,
+            "total_ms": round(total * 1000, 2),
+            "db_ms": round(self.db * 1000, 2),
+            "queries": self.queries,
+        }
+        for name, seconds in sorted(self.spans.items()):
+            record[f"{name}_ms"] = round(seconds * 1000, 2)
+        return record
+
+    def server_timing(self, total):
+        """
+        Value for the Server-Timing response header.
+        """
+        entries = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(self.spans.items())]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def current():
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent inside the block to the current request's `name`
+    timing. Nested spans of the same name are only counted once, and the
+    block runs untimed outside a request.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics._open:
+        yield
+        return
+
+    metrics._open.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+        metrics._open.discard(name)
+
+
+class QueryTimer:
+    """
+    Permanent execute_wrapper on every database connection, adding each
+    statement to the current request's metrics (if any) and logging the
+    ones slower than SLOW_QUERY_MS.
+
+    It reads the request from a context variable rather than being
+    installed per request, because under ASGI the ORM runs on a worker
+    thread whose connection the middleware cannot reach.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        metrics = _current.get()
+        if metrics is None:
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.queries += 1
+            metrics.db += elapsed
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                logger.warning(
+                    "slow query view=%s db=%s duration_ms=%.1f sql=%s",
+                    metrics.view_name, self.alias, elapsed * 1000, sql,
+                    extra={"perf": {
+                        "view": metrics.view_name,
+                        "database": self.alias,
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "sql": sql,
+                    }},
+                )
+
+
+def install_query_timer(connection):
+    if not any(isinstance(wrapper, QueryTimer) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(QueryTimer(connection.alias))
+
+
+@receiver(connection_created)
+def time_new_connection(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+
+# ---------------------------
+# Per-route aggregates (per process)
+# ---------------------------
+class RouteStats:
+    """
+    Sliding window of the last PERF_STATS_WINDOW requests for every URL
+    name, so memory stays bounded however long the process runs.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, name, record):
+        window = settings.PERF_STATS_WINDOW
+        with self._lock:
+            route = self._routes.get(name)
+            if route is None:
+                route = self._routes[name] = {
+                    "count": 0,
+                    "total": deque(maxlen=window),
+                    "db": deque(maxlen=window),
+                    "queries": deque(maxlen=window),
+                }
+            route["count"] += 1
+            route["total"].append(record["total_ms"])
+            route["db"].append(record["db_ms"])
+            route["queries"].append(record["queries"])
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            routes = {
+                name: (route["count"], sorted(route["total"]), sorted(route["db"]), list(route["queries"]))
+                for name, route in self._routes.items()
+            }
+
+        result = {}
+        for name, (count, total, db, queries) in sorted(routes.items()):
+            result[name] = {
+                "count": count,
+                "window": len(total),
+                "p50_ms": percentile(total, 50),
+                "p95_ms": percentile(total, 95),
+                "p99_ms": percentile(total, 99),
+                "db_p50_ms": percentile(db, 50),
+                "db_p95_ms": percentile(db, 95),
+                "mean_queries": round(sum(queries) / len(queries), 2),
+                "max_queries": max(queries),
+            }
+        return result
+
+
+stats = RouteStats()
@@ -0,0 +1,379 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import analytics
+from .caching import current_version
+from .models import Category, Transaction
+
+TYPE_FLAGS = {"expense": 0, "income": 1}
+TYPE_NAMES = {flag: name for name, flag in TYPE_FLAGS.items()}
+
+# Category id stored for uncategorized rows (real ids start at 1)
+NO_CATEGORY = 0
+
+
+# ---------------------------
+# Per-user columnar ledger
+# ---------------------------
+class Ledger:
+    """
+    One user's transactions as parallel numpy arrays sorted by id.
+
+    Amounts are integer cents so sums are exact. Instances are never
+    mutated once published; patches build a new Ledger.
+    """
+    __slots__ = ("version", "ids", "days", "months", "cents", "kinds", "categories", "names")
+
+    def __init__(self, version, ids, days, months, cents, kinds, categories, names):
+        self.version = version
+        self.ids = ids
+        self.days = days
+        self.months = months
+        self.cents = cents
+        self.kinds = kinds
+        self.categories = categories
+        self.names = names
+
+    @classmethod
+    def from_rows(cls, version, rows, names):
+        """
+        Build from (id, date, amount, type, category_id) tuples.
+        """
+        rows = sorted(rows)
+        n = len(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        days = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int32, count=n)
+        months = np.fromiter((r[1].year * 12 + r[1].month - 1 for r in rows), dtype=np.int32, count=n)
+        cents = np.fromiter((to_cents(r[2]) for r in rows), dtype=np.int64, count=n)
+        kinds = np.fromiter((TYPE_FLAGS[r[3]] for r in rows), dtype=np.int8, count=n)
+        categories = np.fromiter((r[4] or NO_CATEGORY for r in rows), dtype=np.int64, count=n)
+        return cls(version, ids, days, months, cents, kinds, categories, dict(names))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in (
+            "ids", "days", "months", "cents", "kinds", "categories"
+        ))
+
+    def replace(self, version, keep=None, rows=(), names=None):
+        """
+        A copy at `version` holding the rows selected by the boolean mask
+        `keep` plus `rows` (merged by id).
+        """
+        columns = [self.ids, self.days, self.months, self.cents, self.kinds, self.categories]
+        if keep is not None:
+            columns = [column[keep] for column in columns]
+
+        if rows:
+            extra = Ledger.from_rows(version, rows, {})
+            extra_columns = [extra.ids, extra.days, extra.months, extra.cents, extra.kinds, extra.categories]
+            columns = [np.concatenate([a, b]) for a, b in zip(columns, extra_columns)]
+            order = np.argsort(columns[0], kind="stable")
+            columns = [column[order] for column in columns]
+
+        return Ledger(version, *columns, self.names if names is None else names)
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def monthly_rows(self, ttype=None, date_from=None, date_to=None):
+        """
+        Same rows as analytics.monthly_rows(): totals per (month, type,
+        category) with Decimal totals, ordered by month.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        if ttype:
+            if ttype not in TYPE_FLAGS:
+                return []
+            mask &= self.kinds == TYPE_FLAGS[ttype]
+        if date_from:
+            mask &= self.days >= date_from.toordinal()
+        if date_to:
+            mask &= self.days <= date_to.toordinal()
+        if not mask.any():
+            return []
+
+        months = self.months[mask].astype(np.int64)
+        kinds = self.kinds[mask].astype(np.int64)
+        categories = self.categories[mask]
+
+        # One int64 key per (month, type, category) bucket
+        width = int(categories.max()) + 1
+        keys = (months * 2 + kinds) * width + categories
+        buckets, totals, counts = group_sum(keys, self.cents[mask])
+
+        rows = []
+        for key, total, count in zip(buckets.tolist(), totals.tolist(), counts.tolist()):
+            month_kind, category_id = divmod(key, width)
+            month_index, kind = divmod(month_kind, 2)
+            category_id = category_id or None
+            rows.append({
+                "month": date(month_index // 12, month_index % 12 + 1, 1),
+                "type": TYPE_NAMES[kind],
+                "category_id": category_id,
+                "category__name": self.names.get(category_id),
+                "total": from_cents(total),
+                "count": count,
+            })
+        return rows
+
+
+def to_cents(amount):
+    return int(Decimal(amount).scaleb(2).to_integral_value())
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def group_sum(keys, values):
+    """
+    (unique keys, int64 sum of values per key, row count per key), with
+    keys in ascending order. Integer arithmetic throughout.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    sums = np.add.reduceat(values[order], starts)
+    counts = np.diff(np.append(starts, len(keys)))
+    return keys[starts], sums, counts
+
+
+# ---------------------------
+# LRU across users (per process)
+# ---------------------------
+class LedgerCache:
+    """
+    Ledgers of recently active users, bounded by LEDGER_CACHE_MAX_BYTES
+    of array data and evicted least recently used first.
+
+    Every entry is stamped with the user's data version it reflects. A
+    lookup with a newer version reloads the ledger, so writes made by
+    other processes are never missed; writes made by this process are
+    patched in place (see `changed`).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        return settings.LEDGER_CACHE_MAX_BYTES
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def get(self, user_id, version):
+        """
+        The user's ledger at `version`, loading it on a miss.
+
+        `version` must have been read before this call: loading reads the
+        rows afterwards, so they are never older than the stamp.
+        """
+        entry = self.lookup(user_id, version)
+        if entry is None:
+            entry = load(user_id, version)
+            self.store(user_id, entry)
+        return entry
+
+    async def aget(self, user_id, version):
+        entry = self.lookup(user_id, version)
+        if entry is None:
+            entry = await aload(user_id, version)
+            self.store(user_id, entry)
+        return entry
+
+    def lookup(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def store(self, user_id, entry):
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None and current.version > entry.version:
+                # Patched past this load while it was running
+                return
+            self._put(user_id, entry)
+
+    def advance(self, user_id, version, patch):
+        """
+        Move a cached ledger from `version - 1` to `version` by applying
+        `patch(ledger, version)`. Any other state means a write was missed,
+        so the entry is dropped and reloaded on next use.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry.version != version - 1:
+                self._discard(user_id)
+                return
+            self._put(user_id, patch(entry, version))
+            self.patches += 1
+
+    def forget(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _put(self, user_id, entry):
+        self._discard(user_id)
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[user_id] = entry
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= entry.nbytes
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "patches": self.patches,
+                "evictions": self.evictions,
+            }
+
+
+cache = LedgerCache()
+
+
+def ledger_querysets(user_id):
+    rows = Transaction.objects.filter(user_id=user_id).values_list(
+        "id", "date", "amount", "type", "category_id"
+    )
+    names = Category.objects.filter(user_id=user_id).values_list("id", "name")
+    return rows, names
+
+
+def load(user_id, version):
+    rows, names = ledger_querysets(user_id)
+    return Ledger.from_rows(version, list(rows), names)
+
+
+async def aload(user_id, version):
+    rows, names = ledger_querysets(user_id)
+    rows, names = await analytics.alists(rows, names)
+    return Ledger.from_rows(version, rows, names)
+
+
+def monthly_rows(user, version, ttype=None, date_from=None, date_to=None):
+    """
+    analytics.monthly_rows() answered from the in-process ledger, or
+    from the database when the cache is disabled.
+    """
+    if not settings.LEDGER_CACHE_MAX_BYTES:
+        return analytics.monthly_rows(user, ttype, date_from, date_to)
+    return cache.get(user.pk, version).monthly_rows(ttype, date_from, date_to)
+
+
+async def amonthly_rows(user, version, ttype=None, date_from=None, date_to=None):
+    if not settings.LEDGER_CACHE_MAX_BYTES:
+        return await analytics.amonthly_rows(user, ttype, date_from, date_to)
+    entry = await cache.aget(user.pk, version)
+    return entry.monthly_rows(ttype, date_from, date_to)
+
+
+# ---------------------------
+# Incremental patches (called from signals)
+# ---------------------------
+def changed(user_id, patch=None):
+    """
+    Record a write that just bumped `user_id`'s data version. The cached
+    ledger (if this process has one) is patched once the surrounding
+    transaction commits; a rollback discards the patch with the write.
+    """
+    if user_id not in cache:
+        return
+    version = current_version(user_id)
+    transaction.on_commit(
+        lambda: cache.advance(user_id, version, patch or (lambda entry, v: entry.replace(v)))
+    )
+
+
+def row_of(txn):
+    meta = Transaction._meta
+    return (
+        txn.pk,
+        meta.get_field("date").to_python(txn.date),
+        meta.get_field("amount").to_python(txn.amount),
+        txn.type,
+        txn.category_id,
+    )
+
+
+def upsert_patch(rows):
+    """
+    Patch replacing or adding the transactions in `rows` (row_of tuples).
+    """
+    def patch(entry, version):
+        keep = ~np.isin(entry.ids, [r[0] for r in rows])
+        return entry.replace(version, keep, rows)
+    return patch
+
+
+def delete_patch(ids):
+    def patch(entry, version):
+        return entry.replace(version, ~np.isin(entry.ids, list(ids)))
+    return patch
+
+
+def bulk_patch(created=(), updated=(), deleted=()):
+    rows = [row_of(txn) for txn in created] + [row_of(after) for _, after in updated]
+    deleted_ids = [txn.pk for txn in deleted]
+
+    def patch(entry, version):
+        keep = ~np.isin(entry.ids, [r[0] for r in rows] + deleted_ids)
+        return entry.replace(version, keep, rows)
+    return patch
+
+
+def rename_patch(category_id, name):
+    def patch(entry, version):
+        return entry.replace(version, names={**entry.names, category_id: name})
+    return patch
+
+
+def uncategorize_patch(category_id):
+    """
+    A deleted category: its transactions were SET_NULL.
+    """
+    def patch(entry, version):
+        updated = entry.replace(version, names={
+            pk: name for pk, name in entry.names.items() if pk != category_id
+        })
+        updated.categories = np.where(updated.categories == category_id, NO_CATEGORY, updated.categories)
+        return updated
+    return patch
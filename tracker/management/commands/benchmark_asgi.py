@@ -0,0 +1,166 @@
+import asyncio
+import importlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tracker import synthetic
+from tracker.benchmarking import scratch_database
+from tracker.instrumentation import percentile
+
+TODAY = date.today()
+
+# Mix of analytics requests a dashboard load produces
+ENDPOINTS = [
+    "/api/analytics/monthly/",
+    "/api/analytics/monthly-summary/",
+    "/api/analytics/category-totals/?type=expense",
+    "/api/analytics/monthly-category/",
+    "/api/analytics/dashboard/",
+    f"/api/analytics/budget-vs-expense/{TODAY.year}/{TODAY.month}/",
+]
+
+
+@contextmanager
+def analytics_mode(use_async):
+    """
+    Serve the analytics routes from the async or the sync views.
+    """
+    def reload_urls():
+        clear_url_caches()
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+
+    try:
+        with override_settings(ASYNC_ANALYTICS=use_async):
+            reload_urls()
+            yield
+    finally:
+        reload_urls()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare analytics throughput under concurrent load: async views "
+        "behind the ASGI handler vs sync views on threaded WSGI workers "
+        "(one thread per concurrent client, like gunicorn gthread)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--transactions", type=int, default=2000, help="Per user")
+        parser.add_argument("--requests", type=int, default=300, help="Requests per run")
+        parser.add_argument("--concurrency", default="1,8,32",
+                            help="Comma-separated numbers of concurrent clients")
+        parser.add_argument("--warm-cache", action="store_true",
+                            help="Allow analytics cache hits (default: every request misses)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        levels = [int(n) for n in options["concurrency"].split(",") if n.strip()]
+        rng = random.Random(options["seed"])
+
+        with scratch_database():
+            user_ids = synthetic.generate(
+                users=options["users"], transactions=options["transactions"],
+                seed=options["seed"], prefix="bench-asgi",
+            )
+            tokens = {
+                user.pk: str(RefreshToken.for_user(user).access_token)
+                for user in User.objects.filter(pk__in=user_ids)
+            }
+
+            plan = []
+            for i in range(options["requests"]):
+                url = rng.choice(ENDPOINTS)
+                if not options["warm_cache"]:
+                    # Unknown params are ignored by the views but change the cache key
+                    url += ("&" if "?" in url else "?") + f"_bench={i}"
+                plan.append((url, tokens[rng.choice(user_ids)]))
+
+            results = []
+            for concurrency in levels:
+                for mode in ("wsgi", "asgi"):
+                    with analytics_mode(use_async=mode == "asgi"):
+                        run = self.run_asgi if mode == "asgi" else self.run_wsgi
+                        elapsed, latencies, errors = run(plan, concurrency)
+                    results.append(self.summarize(mode, concurrency, elapsed, latencies, errors))
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump({"options": {k: options[k] for k in (
+                    "users", "transactions", "requests", "concurrency", "warm_cache", "seed"
+                )}, "results": results}, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def summarize(self, mode, concurrency, elapsed, latencies, errors):
+        latencies.sort()
+        row = {
+            "mode": mode,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "req_per_s": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+        self.stdout.write(
+            f"{mode:<5} concurrency={concurrency:<4} {row['req_per_s']:>8.1f} req/s  "
+            f"p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  "
+            f"p99 {row['p99_ms']:>8.2f}ms  errors {errors}"
+        )
+        return row
+
+    def run_wsgi(self, plan, concurrency):
+        local = threading.local()
+        errors = []
+
+        def call(item):
+            url, token = item
+            if not hasattr(local, "client"):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.get(url, headers={"Authorization": f"Bearer {token}"})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, plan))
+        return time.perf_counter() - started, latencies, len(errors)
+
+    def run_asgi(self, plan, concurrency):
+        async def main():
+            client = AsyncClient()
+            gate = asyncio.Semaphore(concurrency)
+            errors = 0
+
+            async def call(item):
+                nonlocal errors
+                url, token = item
+                async with gate:
+                    started = time.perf_counter()
+                    response = await client.get(url, headers={"Authorization": f"Bearer {token}"})
+                    if response.status_code != 200:
+                        errors += 1
+                    return (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(call(item) for item in plan))
+            return time.perf_counter() - started, list(latencies), errors
+
+        return asyncio.run(main())
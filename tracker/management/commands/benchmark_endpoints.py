@@ -0,0 +1,284 @@
+import json
+import platform
+import subprocess
+import time
+import uuid
+from datetime import date
+
+import django
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tracker import caching, synthetic
+from tracker.benchmarking import QueryCounter, scratch_database, url_names
+from tracker.instrumentation import percentile
+from tracker.models import Budget, BudgetAlert, Category, RecurringRule, Transaction, TransactionFlag
+
+# Namespaces that are not part of the API
+SKIPPED_NAMESPACES = ("admin",)
+
+
+# ---------------------------
+# Route catalogue
+# ---------------------------
+# Each entry turns a benchmark context into (method, url, payload).
+# A route added to the URLconf without an entry here is reported as
+# not covered.
+def _get(name, query="", **kwargs):
+    return lambda ctx: ("get", reverse(name, kwargs={k: v(ctx) for k, v in kwargs.items()}) + query, None)
+
+
+def _import_rows(ctx):
+    rows = [
+        {"date": ctx.today.isoformat(), "type": "expense", "amount": "9.99", "category": "Rent"}
+        for _ in range(100)
+    ]
+    return "post", reverse("transaction-import-rows"), rows
+
+
+def _apply_batch(ctx):
+    operations = [
+        {"op": "update", "id": pk, "fields": {"note": f"batch {i % 3}"}}
+        for i, pk in enumerate(ctx.transaction_ids)
+    ]
+    return "post", reverse("transaction-apply-batch"), {"operations": operations}
+
+
+ROUTES = {
+    "register": lambda ctx: ("post", reverse("register"), {
+        "username": f"bench-{uuid.uuid4().hex[:12]}",
+        "email": "bench@example.com",
+        "password": "Bench-password-1",
+        "password2": "Bench-password-1",
+    }),
+    "token_obtain_pair": lambda ctx: ("post", reverse("token_obtain_pair"), {
+        "username": ctx.user.username, "password": ctx.password,
+    }),
+    "token_refresh": lambda ctx: ("post", reverse("token_refresh"), {"refresh": ctx.refresh}),
+    "api-root": _get("api-root"),
+    "monthly": _get("monthly"),
+    "monthly-summary": _get("monthly-summary"),
+    "category-totals": _get("category-totals", "?type=expense"),
+    "monthly-category": _get("monthly-category"),
+    "dashboard": _get("dashboard"),
+    "forecast": _get("forecast"),
+    "budget-vs-expense": lambda ctx: ("get", reverse("budget-vs-expense") + (
+        f"?start={ctx.year_ago:%Y-%m}&end={ctx.today:%Y-%m}"
+    ), None),
+    "budget-vs-expense-month": _get(
+        "budget-vs-expense-month",
+        year=lambda ctx: ctx.today.year,
+        month=lambda ctx: ctx.today.month,
+    ),
+    "sync": lambda ctx: ("get", reverse("sync") + f"?since={ctx.sync_token}", None),
+    "cache-stats": _get("cache-stats"),
+    "perf-stats": _get("perf-stats"),
+    "transaction-list": _get("transaction-list"),
+    "transaction-detail": _get("transaction-detail", pk=lambda ctx: ctx.transaction_id),
+    "transaction-export": _get("transaction-export"),
+    "transaction-search": _get("transaction-search", "?q=rent"),
+    "transaction-import-rows": _import_rows,
+    "transaction-apply-batch": _apply_batch,
+    "category-list": _get("category-list"),
+    "category-detail": _get("category-detail", pk=lambda ctx: ctx.category_id),
+    "budget-list": _get("budget-list"),
+    "budget-detail": _get("budget-detail", pk=lambda ctx: ctx.budget_id),
+    "budget-status": _get("budget-status"),
+    "budget-alert-list": _get("budget-alert-list"),
+    "budget-alert-detail": _get("budget-alert-detail", pk=lambda ctx: ctx.budget_alert_id),
+    "recurring-rule-list": _get("recurring-rule-list"),
+    "recurring-rule-detail": _get("recurring-rule-detail", pk=lambda ctx: ctx.recurring_rule_id),
+    "transaction-flag-list": _get("transaction-flag-list"),
+    "transaction-flag-detail": _get("transaction-flag-detail", pk=lambda ctx: ctx.transaction_flag_id),
+}
+
+
+class Context:
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.refresh = str(RefreshToken.for_user(user))
+        self.access = str(RefreshToken.for_user(user).access_token)
+        self.today = date.today()
+        self.year_ago = self.today - relativedelta(months=11)
+        self.transaction_ids = list(Transaction.objects.filter(user=user).values_list("pk", flat=True)[:50])
+        self.transaction_id = self.transaction_ids[0] if self.transaction_ids else None
+        self.category_id = Category.objects.filter(user=user).values_list("pk", flat=True).first()
+        self.budget_id = Budget.objects.filter(user=user).values_list("pk", flat=True).first()
+        self.budget_alert_id = BudgetAlert.objects.filter(user=user).values_list("pk", flat=True).first()
+        self.recurring_rule_id = RecurringRule.objects.filter(user=user).values_list("pk", flat=True).first()
+        self.transaction_flag_id = TransactionFlag.objects.filter(user=user).values_list("pk", flat=True).first()
+        # A client a few writes behind
+        self.sync_token = max(caching.current_version(user.pk) - 5, 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency percentiles and query counts for every API route at "
+        "several data sizes on a scratch database, saving the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="100,1000,10000",
+            help="Comma-separated transactions-per-user sizes",
+        )
+        parser.add_argument("--requests", type=int, default=30, help="Timed requests per route")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--background-users", type=int, default=5,
+                            help="Other users sharing the tables, each with the same history size")
+        parser.add_argument("--routes", default="", help="Only these comma-separated route names")
+        parser.add_argument("--warm-cache", action="store_true",
+                            help="Keep the analytics cache between requests (default: clear it)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="bench_results.json")
+        parser.add_argument("--compare", help="Earlier results file to diff p50 latencies against")
+        parser.add_argument("--threshold", type=float, default=20.0,
+                            help="Percent p50 slowdown reported as a regression")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        only = {r.strip() for r in options["routes"].split(",") if r.strip()}
+
+        with scratch_database():
+            names = [
+                n for n in url_names()
+                if n.split(":")[0] not in SKIPPED_NAMESPACES and (not only or n in only)
+            ]
+            missing = [n for n in names if n not in ROUTES]
+            for name in missing:
+                self.stderr.write(self.style.WARNING(f"route {name!r} has no benchmark entry"))
+            names = [n for n in names if n in ROUTES]
+
+            results = []
+            for size in sizes:
+                results += self.run_size(size, names, options)
+
+        report = {
+            "meta": self.metadata(options, sizes),
+            "results": results,
+        }
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} measurements to {options['output']}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options["threshold"])
+
+    def run_size(self, size, names, options):
+        password = "bench-password"
+        synthetic.generate(
+            users=options["background_users"], transactions=size,
+            seed=options["seed"] + 1, prefix=f"bench-bg-{size}", password=password,
+        )
+        (user_id,) = synthetic.generate(
+            users=1, transactions=size, seed=options["seed"],
+            prefix=f"bench-{size}", password=password,
+        )
+
+        ctx = Context(User.objects.get(pk=user_id), password)
+        ctx.user.is_staff = True
+        ctx.user.save(update_fields=["is_staff"])
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {ctx.access}")
+        cache = caching.get_cache()
+
+        self.stdout.write(f"size={size}")
+        results = []
+        for name in names:
+            latencies, queries, status = [], [], None
+            for i in range(options["warmup"] + options["requests"]):
+                method, url, payload = ROUTES[name](ctx)
+                if not options["warm_cache"]:
+                    cache.clear()
+
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, payload, format="json")
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                    elapsed = time.perf_counter() - started
+
+                status = response.status_code
+                if i >= options["warmup"]:
+                    latencies.append(elapsed * 1000)
+                    queries.append(counter.count)
+
+            latencies.sort()
+            queries.sort()
+            row = {
+                "size": size,
+                "route": name,
+                "method": method.upper(),
+                "status": status,
+                "requests": len(latencies),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "mean_ms": round(sum(latencies) / len(latencies), 3),
+                "queries": queries[len(queries) // 2],
+            }
+            results.append(row)
+            self.stdout.write(
+                f"  {name:<28} {row['method']:<5} {status}  p50 {row['p50_ms']:>9.2f}ms  "
+                f"p95 {row['p95_ms']:>9.2f}ms  p99 {row['p99_ms']:>9.2f}ms  queries {row['queries']}"
+            )
+        return results
+
+    def metadata(self, options, sizes):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "sizes": sizes,
+            "requests": options["requests"],
+            "background_users": options["background_users"],
+            "warm_cache": options["warm_cache"],
+            "seed": options["seed"],
+        }
+
+    def compare(self, path, results, threshold):
+        try:
+            with open(path) as fh:
+                previous = json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        before = {(r["size"], r["route"]): r for r in previous.get("results", [])}
+        regressions = 0
+        self.stdout.write(f"Compared with {path} ({previous.get('meta', {}).get('commit')})")
+        for row in results:
+            old = before.get((row["size"], row["route"]))
+            if not old or not old["p50_ms"]:
+                continue
+            change = (row["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            line = (
+                f"  size={row['size']:<7} {row['route']:<28} p50 {old['p50_ms']:>9.2f} -> "
+                f"{row['p50_ms']:>9.2f}ms ({change:+.1f}%)  queries {old['queries']} -> {row['queries']}"
+            )
+            if change > threshold or row["queries"] > old["queries"]:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} possible regressions"))
@@ -0,0 +1,84 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tracker.benchmarking import best_of, scratch_database
+from tracker.models import Category, Transaction
+from tracker.serializers import TransactionRowSerializer, TransactionSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second of TransactionSerializer against the read-optimised "
+        "list path on a scratch database, checking both render identical JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(options["rows"], options["repeat"], options["seed"])
+
+    def run(self, n_rows, repeat, seed):
+        rng = random.Random(seed)
+        user = User.objects.create_user("bench-serializer", password="x")
+        categories = list(Category.objects.filter(user=user)) + [None]
+        start = date(2015, 1, 1)
+
+        txns = []
+        for i in range(n_rows):
+            category = rng.choice(categories)
+            txns.append(Transaction(
+                user=user,
+                type=category.type if category else rng.choice(["income", "expense"]),
+                category=category,
+                amount=Decimal(rng.randint(1, 500000)) / 100,
+                date=start + timedelta(days=rng.randint(0, 3650)),
+                note=f"note {i}" if i % 3 else None,
+                receipt=f"receipts/{i}.jpg" if i % 10 == 0 else None,
+            ))
+        Transaction.objects.bulk_create(txns, batch_size=500)
+
+        request = APIRequestFactory().get("/api/transactions/")
+        force_authenticate(request, user)
+        request.user = user
+        renderer = JSONRenderer()
+        base = Transaction.objects.filter(user=user).order_by("-date", "-created_at", "id")
+
+        def drf(queryset):
+            return lambda: renderer.render(
+                TransactionSerializer(
+                    queryset.all(), many=True, detail=False, context={"request": request}
+                ).data
+            )
+
+        def fast():
+            rows = TransactionRowSerializer(request)
+            return renderer.render(rows.render(base.values(*rows.values())))
+
+        results = [
+            ("TransactionSerializer (lazy category)", *best_of(repeat, drf(base))),
+            ("TransactionSerializer + select_related", *best_of(repeat, drf(base.select_related("category")))),
+            ("TransactionRowSerializer", *best_of(repeat, fast)),
+        ]
+
+        reference = results[0][2]
+        for label, _, body in results[1:]:
+            if body != reference:
+                raise CommandError(f"{label} output differs from TransactionSerializer")
+
+        baseline = results[0][1]
+        self.stdout.write(f"{n_rows} rows, best of {repeat}")
+        for label, seconds, _ in results:
+            self.stdout.write(
+                f"  {label:<40} {n_rows / seconds:>12,.0f} rows/s  ({baseline / seconds:.1f}x)"
+            )
+        self.stdout.write(self.style.SUCCESS("Outputs identical"))
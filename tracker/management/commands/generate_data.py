@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from tracker import synthetic
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users with transaction histories, categories and budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--transactions", type=int, default=500,
+            help="Transactions per user",
+        )
+        parser.add_argument(
+            "--months", type=int, default=24,
+            help="Length of each user's history in months",
+        )
+        parser.add_argument(
+            "--categories", type=int, default=6,
+            help="Expense categories each user spends in",
+        )
+        parser.add_argument(
+            "--budget-months", type=int, default=12,
+            help="Trailing months with budgets for every active category",
+        )
+        parser.add_argument(
+            "--uncategorized", type=float, default=0.05,
+            help="Fraction of expenses without a category",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--prefix", default="synth", help="Username prefix")
+        parser.add_argument("--password", default="synthetic")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        user_ids = synthetic.generate(
+            users=options["users"],
+            transactions=options["transactions"],
+            months=options["months"],
+            categories=options["categories"],
+            budget_months=options["budget_months"],
+            uncategorized=options["uncategorized"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            password=options["password"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(user_ids)} users with ~{options['transactions']} transactions each "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tracker import receipts
+from tracker.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Render display versions and thumbnails for receipts still pending "
+        "(e.g. with RECEIPT_WORKERS=0, or uploaded before processing existed)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=max(settings.RECEIPT_WORKERS, 1))
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Also retry receipts that failed to process")
+        parser.add_argument("--gc", action="store_true",
+                            help="Afterwards, delete stored images no transaction references")
+
+    def handle(self, *args, **options):
+        ids = receipts.pending_ids(retry_failed=options["retry_failed"])
+        if options["retry_failed"]:
+            Transaction.objects.filter(pk__in=ids, receipt_status="failed").update(
+                receipt_status="pending"
+            )
+
+        def work(pk):
+            try:
+                return receipts.process(pk)
+            finally:
+                close_old_connections()
+
+        counts = {"ready": 0, "failed": 0, None: 0}
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for status in pool.map(work, ids):
+                counts[status] += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(ids)} receipts: {counts['ready']} ready, "
+            f"{counts['failed']} failed, {counts[None]} skipped"
+        ))
+
+        if options["gc"]:
+            deleted = receipts.collect_garbage()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced files"))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tracker import sync
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete delta-sync tombstones older than SYNC_TOMBSTONE_DAYS; "
+        "clients that last synced before them get a full resync"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.SYNC_TOMBSTONE_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = sync.prune(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from tracker import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly rollup table from raw transactions, or verify it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only process this user id (repeatable)",
+        )
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Only compare rollups with raw transactions; exit non-zero on drift",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Users per rebuild batch",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"]
+        if user_ids is None:
+            user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+
+        batch_size = options["batch_size"]
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+
+        if options["verify"]:
+            mismatches = []
+            for batch in batches:
+                mismatches += rollups.verify(batch)
+            for (user_id, month, ttype, category_id), expected, stored in mismatches:
+                self.stdout.write(
+                    f"user={user_id} month={month:%Y-%m} type={ttype} "
+                    f"category={category_id}: expected {expected}, stored {stored}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} rollup buckets out of date")
+            self.stdout.write(self.style.SUCCESS(f"Rollups match for {len(user_ids)} users"))
+            return
+
+        written = 0
+        for batch in batches:
+            written += rollups.rebuild(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup buckets for {len(user_ids)} users"
+        ))
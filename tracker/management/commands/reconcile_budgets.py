@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from tracker import budgets
+
+
+class Command(BaseCommand):
+    help = "Repair budget spent counters and alert levels that drifted from the transactions, or verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only process this user id (repeatable)",
+        )
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Only compare budgets with raw transactions; exit non-zero on drift",
+        )
+        parser.add_argument(
+            "--no-alerts", action="store_false", dest="alerts",
+            help="Repair without recording alerts for thresholds newly reached",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Users per batch",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"]
+        if user_ids is None:
+            user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+
+        batch_size = options["batch_size"]
+        repair = not options["verify"]
+        mismatches = []
+        for start in range(0, len(user_ids), batch_size):
+            mismatches += budgets.reconcile(
+                user_ids[start:start + batch_size], repair=repair, alerts=options["alerts"]
+            )
+
+        for budget_id, (spent, level), (stored_spent, stored_level) in mismatches:
+            self.stdout.write(
+                f"budget={budget_id}: expected spent {spent} level {level}, "
+                f"stored spent {stored_spent} level {stored_level}"
+            )
+        if not repair:
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} budgets out of date")
+            self.stdout.write(self.style.SUCCESS(f"Budgets match for {len(user_ids)} users"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {len(mismatches)} budgets for {len(user_ids)} users"
+        ))
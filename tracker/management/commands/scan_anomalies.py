@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import anomalies
+
+
+class Command(BaseCommand):
+    help = (
+        "Flag unusual expenses (outliers, duplicates) added since the last "
+        "scan, across all users"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=anomalies.WORKERS,
+                            help="Worker threads scoring user shards")
+        parser.add_argument("--shard-size", type=int, default=anomalies.SHARD_SIZE,
+                            help="Users per shard")
+        parser.add_argument("--full", action="store_true",
+                            help="Rescan every transaction, not only those since the last scan")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["shard_size"] < 1:
+            raise CommandError("--workers and --shard-size must be positive")
+
+        started = time.perf_counter()
+        run = anomalies.scan(
+            workers=options["workers"], shard_size=options["shard_size"], full=options["full"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {run.scored} transactions, flagged {run.flagged} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -1,35 +1,35 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from tracker.models import Category
+from tracker.defaults import seed_default_categories
 
-DEFAULT_EXPENSE_CATEGORIES = [
-    "Utilities",
-    "Rent",
-    "Insurance",
-    "Housing",
-    "Debt",
-    "Clothing",
-    "Savings",
-    "Gifting",
-    "Medical",
-    "Miscellaneous",
-]
-
-DEFAULT_INCOME_CATEGORIES = [
-    "Salary",
-    "Investments",
-    "Bonus",
-    "Business",
-    "Other Income",
-]
 
 class Command(BaseCommand):
     help = "Seed default categories for all existing users"
 
-    def handle(self, *args, **kwargs):
-        for user in User.objects.all():
-            for name in DEFAULT_EXPENSE_CATEGORIES:
-                Category.objects.get_or_create(user=user, name=name, type="expense")
-            for name in DEFAULT_INCOME_CATEGORIES:
-                Category.objects.get_or_create(user=user, name=name, type="income")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Users seeded per INSERT batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = User.objects.count()
+        done = 0
+        last_pk = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+
+            seed_default_categories(user_ids)
+            done += len(user_ids)
+            last_pk = user_ids[-1]
+            self.stdout.write(f"Seeded {done}/{total} users (up to id {last_pk})")
+
         self.stdout.write(self.style.SUCCESS("Default categories seeded for all users"))
@@ -0,0 +1,127 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from . import db_routers, instrumentation
+from .instrumentation import RequestMetrics, install_query_timer, logger
+
+
+class PerformanceMiddleware:
+    """
+    Times every request: database (query count and duration), JWT auth,
+    serialization, view and rendering. Reports them in a Server-Timing
+    header and a log line, and feeds the per-route aggregates.
+
+    Keep it right after SecurityMiddleware so the totals cover the rest of
+    the stack. Works under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        # Connections opened before this module was imported
+        for conn in connections.all():
+            install_query_timer(conn)
+
+        metrics, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        metrics = RequestMetrics()
+        request._perf_metrics = metrics
+        return metrics, instrumentation.activate(metrics)
+
+    def finish(self, request, response, metrics):
+        if metrics.view_started is not None and "view" not in metrics.spans:
+            # Plain (non-template) responses are complete once the view returns
+            metrics.add("view", time.perf_counter() - metrics.view_started)
+        total = metrics.elapsed()
+        response["Server-Timing"] = metrics.server_timing(total)
+
+        record = metrics.as_dict(total)
+        record.update(method=request.method, path=request.path, status=response.status_code)
+        instrumentation.stats.record(metrics.view_name or "<unresolved>", record)
+        logger.info(
+            " ".join(f"{key}={value}" for key, value in record.items()),
+            extra={"perf": record},
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request._perf_metrics
+        metrics.view_name = request.resolver_match.view_name
+        metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that
+        # separately from the view itself.
+        metrics = request._perf_metrics
+        finished = time.perf_counter()
+        if metrics.view_started is not None:
+            metrics.add("view", finished - metrics.view_started)
+
+        def rendered(response):
+            metrics.add("render", time.perf_counter() - finished)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaReadMiddleware:
+    """
+    Scopes database routing to the request: GET/HEAD requests to views
+    marked safe for replicas (see tracker.db_routers) read from a replica
+    until they write; everything else stays on the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = db_routers.begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            db_routers.end_request(token)
+
+    async def __acall__(self, request):
+        token = db_routers.begin_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            db_routers.end_request(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.DATABASE_REPLICAS and db_routers.view_reads_from_replica(request, view_func):
+            db_routers.allow_replica_reads()
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def queue_existing_receipts(apps, schema_editor):
+    # Picked up by the process_receipts command
+    Transaction = apps.get_model("tracker", "Transaction")
+    Transaction.objects.exclude(receipt="").exclude(receipt__isnull=True).update(receipt_status="pending")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_delta_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_display',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+        migrations.RunPython(queue_existing_receipts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('receipt_status', 'pending')), fields=['id'], name='txn_receipt_pending_idx'),
+        ),
+    ]
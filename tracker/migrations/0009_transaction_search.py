@@ -0,0 +1,173 @@
+from django.db import migrations
+
+# Full-text index over each transaction's note and category name
+# (tracker.search), kept in sync by triggers so bulk writes, raw updates
+# and category renames are covered without application code.
+#
+# The index is scoped per user, so a search reads only the searching
+# user's part of it. SQLite: rows are keyed user_id << 32 | transaction id,
+# so each user's documents are one rowid range that FTS5 seeks to in every
+# term's doclist; prefixes of up to 6 characters get their own indexes for
+# the same reason (longer ones are expanded across all users). Ids that
+# would not fit the key are refused rather than collide.
+# PostgreSQL: one GIN index over (user_id, document) through btree_gin.
+
+SQLITE_DOCUMENT = """coalesce(new.note, '') || ' ' || coalesce(
+            (SELECT name FROM tracker_category WHERE id = new.category_id), '')"""
+
+SQLITE_KEY_CHECK = """
+        SELECT RAISE(ABORT, 'transaction or user id too large for the search index')
+        WHERE new.id >= 4294967296 OR new.user_id >= 2147483648;"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE tracker_transaction_search
+    USING fts5(document, tokenize = 'porter unicode61', prefix = '2 3 4 5 6')
+    """,
+    f"""
+    CREATE TRIGGER tracker_transaction_search_insert AFTER INSERT ON tracker_transaction
+    BEGIN{SQLITE_KEY_CHECK}
+        INSERT INTO tracker_transaction_search (rowid, document)
+        VALUES ((new.user_id << 32) | new.id, {SQLITE_DOCUMENT});
+    END
+    """,
+    f"""
+    CREATE TRIGGER tracker_transaction_search_update
+    AFTER UPDATE OF user_id, note, category_id ON tracker_transaction
+    BEGIN{SQLITE_KEY_CHECK}
+        DELETE FROM tracker_transaction_search WHERE rowid = (old.user_id << 32) | old.id;
+        INSERT INTO tracker_transaction_search (rowid, document)
+        VALUES ((new.user_id << 32) | new.id, {SQLITE_DOCUMENT});
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_transaction_search_delete AFTER DELETE ON tracker_transaction
+    BEGIN
+        DELETE FROM tracker_transaction_search WHERE rowid = (old.user_id << 32) | old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_category_search_update AFTER UPDATE OF name ON tracker_category
+    BEGIN
+        DELETE FROM tracker_transaction_search
+        WHERE rowid IN (
+            SELECT (user_id << 32) | id FROM tracker_transaction WHERE category_id = new.id
+        );
+        INSERT INTO tracker_transaction_search (rowid, document)
+        SELECT (user_id << 32) | id, coalesce(note, '') || ' ' || new.name
+        FROM tracker_transaction WHERE category_id = new.id;
+    END
+    """,
+    """
+    INSERT INTO tracker_transaction_search (rowid, document)
+    SELECT (t.user_id << 32) | t.id, coalesce(t.note, '') || ' ' || coalesce(c.name, '')
+    FROM tracker_transaction t LEFT JOIN tracker_category c ON c.id = t.category_id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS tracker_category_search_update",
+    "DROP TRIGGER IF EXISTS tracker_transaction_search_delete",
+    "DROP TRIGGER IF EXISTS tracker_transaction_search_update",
+    "DROP TRIGGER IF EXISTS tracker_transaction_search_insert",
+    "DROP TABLE IF EXISTS tracker_transaction_search",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE tracker_transaction_search (
+        transaction_id bigint PRIMARY KEY,
+        user_id integer NOT NULL,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    """
+    CREATE INDEX tracker_transaction_search_user_doc_idx
+    ON tracker_transaction_search USING gin (user_id, document)
+    """,
+    """
+    CREATE FUNCTION tracker_transaction_search_document(note text, category_id bigint)
+    RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('english', coalesce(note, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(
+                (SELECT name FROM tracker_category WHERE id = category_id), '')), 'B')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE FUNCTION tracker_transaction_search_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM tracker_transaction_search WHERE transaction_id = OLD.id;
+        ELSE
+            INSERT INTO tracker_transaction_search (transaction_id, user_id, document)
+            VALUES (NEW.id, NEW.user_id, tracker_transaction_search_document(NEW.note, NEW.category_id))
+            ON CONFLICT (transaction_id) DO UPDATE
+            SET user_id = EXCLUDED.user_id, document = EXCLUDED.document;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tracker_transaction_search_sync
+    AFTER INSERT OR DELETE OR UPDATE OF note, category_id ON tracker_transaction
+    FOR EACH ROW EXECUTE FUNCTION tracker_transaction_search_sync()
+    """,
+    """
+    CREATE FUNCTION tracker_category_search_sync() RETURNS trigger AS $$
+    BEGIN
+        UPDATE tracker_transaction_search s
+        SET document = tracker_transaction_search_document(t.note, t.category_id)
+        FROM tracker_transaction t
+        WHERE t.category_id = NEW.id AND s.transaction_id = t.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tracker_category_search_sync
+    AFTER UPDATE OF name ON tracker_category
+    FOR EACH ROW EXECUTE FUNCTION tracker_category_search_sync()
+    """,
+    """
+    INSERT INTO tracker_transaction_search (transaction_id, user_id, document)
+    SELECT id, user_id, tracker_transaction_search_document(note, category_id)
+    FROM tracker_transaction
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TRIGGER IF EXISTS tracker_category_search_sync ON tracker_category",
+    "DROP FUNCTION IF EXISTS tracker_category_search_sync()",
+    "DROP TRIGGER IF EXISTS tracker_transaction_search_sync ON tracker_transaction",
+    "DROP FUNCTION IF EXISTS tracker_transaction_search_sync()",
+    "DROP FUNCTION IF EXISTS tracker_transaction_search_document(text, bigint)",
+    "DROP TABLE IF EXISTS tracker_transaction_search",
+]
+
+STATEMENTS = {
+    "sqlite": (SQLITE_FORWARD, SQLITE_BACKWARD),
+    "postgresql": (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+}
+
+
+def run(direction):
+    def operation(apps, schema_editor):
+        # Other databases fall back to unindexed matching (tracker.search)
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        if statements is not None:
+            for sql in statements[direction]:
+                schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_receipt_processing'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(0), run(1)),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_spent(apps, schema_editor):
+    # Existing spending sets the alert level without recording alerts
+    Budget = apps.get_model("tracker", "Budget")
+    MonthlyRollup = apps.get_model("tracker", "MonthlyRollup")
+
+    total = MonthlyRollup.objects.filter(
+        user_id=OuterRef("user_id"),
+        category_id=OuterRef("category_id"),
+        month=OuterRef("month"),
+        type="expense",
+    ).values("total")[:1]
+    Budget.objects.update(spent=Coalesce(Subquery(total), Value(0), output_field=DecimalField()))
+
+    thresholds = sorted(settings.BUDGET_ALERT_THRESHOLDS)
+    reached = []
+    for budget in Budget.objects.filter(spent__gt=0).only("amount", "spent").iterator():
+        levels = [t for t in thresholds if budget.amount <= 0 or budget.spent * 100 >= budget.amount * t]
+        if levels:
+            budget.alert_level = levels[-1]
+            reached.append(budget)
+    Budget.objects.bulk_update(reached, ["alert_level"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_recurring_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='alert_level',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='spent',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=16),
+        ),
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveSmallIntegerField()),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='tracker.budget')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', '-id'], name='budget_alert_user_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_spent, migrations.RunPython.noop),
+    ]
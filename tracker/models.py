@@ -1,8 +1,26 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Lower
 from django.conf import settings
 
 
-class Category(models.Model):
+class VersionedModel(models.Model):
+    """
+    Base of the rows whose writes bump their user's data version
+    (tracker.signals). A save runs in one transaction with its signals,
+    so the new version never commits before the row and the rollup,
+    budget and ledger writes derived from it. Deletes need nothing: the
+    collector already sends its signals inside its transaction.
+    """
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Category(VersionedModel):
     """
     Category model — user-specific, can be 'income' or 'expense'.
     """
@@ -19,15 +37,24 @@ class Category(models.Model):
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
 
+    # Data version of the last write (delta sync, see tracker.sync)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
     class Meta:
         unique_together = ("user", "name", "type")
         ordering = ["type", "name"]
+        indexes = [
+            # Case-insensitive name lookups (?category= filter, duplicate check)
+            models.Index("user", Lower("name"), name="category_user_lower_name_idx"),
+            # Delta sync
+            models.Index(fields=["user", "change_seq"], name="category_user_seq_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type})"
 
 
-class Transaction(models.Model):
+class Transaction(VersionedModel):
     """
     Transaction model with receipt upload.
     """
@@ -52,19 +79,82 @@ class Transaction(models.Model):
     date = models.DateField()
     note = models.TextField(blank=True, null=True)
 
-    # Receipt image
+    RECEIPT_STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    )
+
+    # Receipt image. Uploads land under receipts/ and are then moved to
+    # content-addressed names with display and thumbnail versions by
+    # tracker.receipts.
     receipt = models.ImageField(upload_to="receipts/", null=True, blank=True)
+    receipt_display = models.ImageField(null=True, blank=True, editable=False)
+    receipt_thumbnail = models.ImageField(null=True, blank=True, editable=False)
+    receipt_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    receipt_status = models.CharField(
+        max_length=10, choices=RECEIPT_STATUS_CHOICES, blank=True, editable=False
+    )
+
+    # Set on occurrences materialized from a RecurringRule (tracker.recurring)
+    recurring_rule = models.ForeignKey(
+        "RecurringRule",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,  # covered by txn_recurring_occurrence_uniq
+        related_name="transactions"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Data version of the last write (delta sync, see tracker.sync)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ["-date", "-created_at"]
+        indexes = [
+            # Ledger listing and its keyset pagination, date range filters
+            models.Index(
+                fields=["user", "-date", "-created_at", "id"],
+                name="txn_user_date_created_idx",
+            ),
+            # ?type= filters and per-type aggregation over a date range
+            models.Index(
+                fields=["user", "type", "date"],
+                include=["amount", "category"],
+                name="txn_user_type_date_idx",
+            ),
+            # ?category= filters and budget/category spend over a date range
+            models.Index(
+                fields=["user", "category", "date"],
+                include=["amount", "type"],
+                name="txn_user_category_date_idx",
+            ),
+            # Delta sync
+            models.Index(fields=["user", "change_seq"], name="txn_user_seq_idx"),
+            # Receipt processing queue
+            models.Index(
+                fields=["id"],
+                condition=models.Q(receipt_status="pending"),
+                name="txn_receipt_pending_idx",
+            ),
+        ]
+        constraints = [
+            # Idempotency key of materialized occurrences: one per rule and date
+            models.UniqueConstraint(
+                fields=["recurring_rule", "date"],
+                condition=models.Q(recurring_rule__isnull=False),
+                name="txn_recurring_occurrence_uniq",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} {self.type} {self.amount} {self.date}"
 
 
-class Budget(models.Model):
+class Budget(VersionedModel):
     """
     Monthly budget per category.
     """
@@ -81,8 +171,262 @@ class Budget(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     month = models.DateField()  # store first day of each month
 
+    # Expenses in the category and month so far, and the highest alert
+    # threshold they have reached (tracker.budgets)
+    spent = models.DecimalField(max_digits=16, decimal_places=2, default=0, editable=False)
+    alert_level = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # Data version of the last write (delta sync, see tracker.sync)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
     class Meta:
         unique_together = ("user", "category", "month")
+        indexes = [
+            # Delta sync
+            models.Index(fields=["user", "change_seq"], name="budget_user_seq_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.category} - {self.month}: {self.amount}"
+
+
+class BudgetAlert(models.Model):
+    """
+    Recorded when a budget's spending reaches one of the
+    BUDGET_ALERT_THRESHOLDS percentages of its amount.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="budget_alerts"
+    )
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name="alerts"
+    )
+    threshold = models.PositiveSmallIntegerField()  # percent of the amount
+    spent = models.DecimalField(max_digits=16, decimal_places=2)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # Newest first, for the alerts endpoint
+            models.Index(fields=["user", "-id"], name="budget_alert_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.budget} reached {self.threshold}%"
+
+
+class RecurringRule(models.Model):
+    """
+    A transaction that repeats: every `interval` days, weeks or months
+    from `start_date`, until `end_date` if set. Occurrences become
+    Transactions when the materialize_recurring command runs.
+    """
+    FREQUENCY_CHOICES = (
+        ("daily", "Daily"),
+        ("weekly", "Weekly"),
+        ("monthly", "Monthly"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recurring_rules"
+    )
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="recurring_rules"
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    note = models.TextField(blank=True, null=True)
+
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+
+    # First occurrence not yet materialized; null once the rule has ended
+    next_date = models.DateField(null=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["start_date", "id"]
+        indexes = [
+            # Due rules, for materialize_recurring
+            models.Index(fields=["next_date", "id"], name="recurring_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.type} {self.amount} every {self.interval} {self.frequency}"
+
+
+class TransactionFlag(models.Model):
+    """
+    An unusual transaction found by the anomaly scan (tracker.anomalies).
+
+    The transaction references carry no database constraint, so bulk
+    deletes of transactions need not look here: flags of deleted rows are
+    hidden by the API's join and pruned by the next scan. Dismissed flags
+    are kept (with dismissed_at) so rescans do not raise them again.
+    """
+    REASON_CHOICES = (
+        ("outlier", "Unusually large"),
+        ("duplicate", "Possible duplicate"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="transaction_flags"
+    )
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,  # covered by txn_flag_uniq
+        related_name="flags"
+    )
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    # Outliers: the amount as a multiple of the typical (median) amount
+    score = models.FloatField(null=True)
+    typical = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    # Duplicates: the earlier transaction it repeats
+    duplicate_of = models.ForeignKey(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # Open flags newest first, for the flags endpoint
+            models.Index(
+                fields=["user", "-id"],
+                condition=models.Q(dismissed_at__isnull=True),
+                name="txn_flag_user_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["transaction", "reason"], name="txn_flag_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} {self.reason}"
+
+
+class AnomalyScan(models.Model):
+    """
+    A run of the scan_anomalies command. The next run scores transactions
+    after the last_transaction_id of the latest finished one.
+    """
+    last_transaction_id = models.PositiveBigIntegerField(default=0)
+    scored = models.PositiveIntegerField(default=0)
+    flagged = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"scan {self.pk} up to {self.last_transaction_id}"
+
+
+class MonthlyRollup(models.Model):
+    """
+    Running totals per user, month, transaction type and category.
+    Kept in step with Transaction writes by tracker.signals; the
+    analytics endpoints read from here instead of re-aggregating.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="monthly_rollups"
+    )
+    month = models.DateField()  # first day of the month
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name="monthly_rollups"
+    )
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "month"], name="rollup_user_month_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "month", "type", "category"],
+                condition=models.Q(category__isnull=False),
+                name="uniq_rollup_per_category",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "month", "type"],
+                condition=models.Q(category__isnull=True),
+                name="uniq_rollup_uncategorized",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.month:%Y-%m} {self.type} {self.category}: {self.total}"
+
+
+class UserDataVersion(models.Model):
+    """
+    Per-user counter bumped on every Transaction, Category or Budget write.
+    Cached analytics are keyed by it, so a bump invalidates them all, and
+    each written row records the version as its change_seq.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="data_version"
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    # Sync tokens below this are stale: tombstones up to it were pruned
+    sync_floor = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} v{self.version}"
+
+
+class SyncTombstone(models.Model):
+    """
+    A deleted Transaction, Category or Budget, kept so delta sync can
+    report the deletion. Pruned by the prune_sync_tombstones command.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="sync_tombstones"
+    )
+    model = models.CharField(max_length=20)  # model_name of the deleted row
+    object_id = models.PositiveBigIntegerField()
+    change_seq = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "change_seq"], name="tombstone_user_seq_idx"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.model} {self.object_id} @{self.change_seq}"
@@ -0,0 +1,175 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Keyset pagination over the (-date, -created_at, id) ordering.
+
+    The cursor carries the sort key of the row it points at, so every page
+    is a bounded index range scan however deep the client has paged.
+    """
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    forward_ordering = ("-date", "-created_at", "id")
+    reverse_ordering = ("date", "created_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if position is None:
+            queryset = queryset.order_by(*self.forward_ordering)
+        elif reverse:
+            queryset = queryset.filter(self.before(position)).order_by(*self.reverse_ordering)
+        else:
+            queryset = queryset.filter(self.after(position)).order_by(*self.forward_ordering)
+
+        rows = list(queryset[:self.size + 1])
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    # ---------------------------
+    # Keyset predicates
+    # ---------------------------
+    def after(self, position):
+        d, c, i = position
+        return (
+            Q(date__lt=d)
+            | Q(date=d, created_at__lt=c)
+            | Q(date=d, created_at=c, id__gt=i)
+        )
+
+    def before(self, position):
+        d, c, i = position
+        return (
+            Q(date__gt=d)
+            | Q(date=d, created_at__gt=c)
+            | Q(date=d, created_at=c, id__lt=i)
+        )
+
+    # ---------------------------
+    # Cursor encoding
+    # ---------------------------
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def position_of(self, row):
+        if isinstance(row, dict):
+            return row["date"], row["created_at"], row["id"]
+        return row.date, row.created_at, row.pk
+
+    def encode_cursor(self, row, reverse):
+        d, c, i = self.position_of(row)
+        payload = json.dumps(
+            {"d": d.isoformat(), "c": c.isoformat(), "i": i, "r": int(reverse)},
+            separators=(",", ":"),
+        )
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position = (
+                parse_date(payload["d"]),
+                parse_datetime(payload["c"]),
+                int(payload["i"]),
+            )
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class NewestFirstPagination(CursorPagination):
+    """
+    Newest rows first (budget alerts, transaction flags). Ids follow
+    creation order and are unique, so the stock cursor stays an index
+    range scan.
+    """
+    ordering = "-id"
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
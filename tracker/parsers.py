@@ -0,0 +1,27 @@
+import codecs
+import csv
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a text/csv request body into a list of dicts keyed by the
+    header row.
+    """
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        try:
+            return read_csv(codecs.iterdecode(stream, encoding))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f"CSV parse error - {exc}")
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    return list(reader)
@@ -5,4 +5,4 @@ class IsOwnerOrReadOnly(BasePermission):
     Allow read-only to authenticated users, but writes only to owners.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.id
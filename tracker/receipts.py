@@ -0,0 +1,226 @@
+"""
+Receipt image processing.
+
+Uploads are saved as-is under receipts/ and marked pending. After the
+saving transaction commits, a worker thread (RECEIPT_WORKERS of them per
+process) hashes the upload, stores it under a content-addressed name, and
+renders an orientation-corrected display JPEG and thumbnail next to it.
+The same image uploaded twice is stored, and rendered, once.
+
+Rows left pending (RECEIPT_WORKERS=0, a crash, or receipts from before
+this existed) are handled by the process_receipts command.
+"""
+import copy
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import signals
+from .models import Transaction
+
+logger = logging.getLogger("tracker.receipts")
+
+ORIGINALS = "receipts/originals"
+DISPLAY = "receipts/display"
+THUMBNAILS = "receipts/thumbnails"
+
+DISPLAY_SIZE = (1600, 1600)
+DISPLAY_QUALITY = 80
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+
+# Files younger than this may belong to a receipt still being processed
+GC_GRACE = timedelta(hours=1)
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp", "HEIF": ".heic"}
+
+
+def storage():
+    return Transaction._meta.get_field("receipt").storage
+
+
+def content_name(prefix, digest, extension):
+    # Two-level fan-out keeps directories small
+    return f"{prefix}/{digest[:2]}/{digest}{extension}"
+
+
+def ensure(name, make):
+    """
+    Store the bytes returned by `make()` as `name` unless it exists.
+    """
+    files = storage()
+    if files.exists(name):
+        return name
+    saved = files.save(name, ContentFile(make()))
+    if saved != name:
+        # Another worker stored the same content first
+        files.delete(saved)
+    return name
+
+
+def render(image, size, quality):
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+# ---------------------------
+# Processing
+# ---------------------------
+def process(transaction_id):
+    """
+    Process a pending receipt. Returns the resulting status, or None if
+    the row no longer has a pending receipt.
+    """
+    txn = Transaction.objects.filter(pk=transaction_id, receipt_status="pending").first()
+    if txn is None or not txn.receipt:
+        return None
+    upload = txn.receipt.name
+
+    try:
+        with txn.receipt.open("rb") as fh:
+            data = fh.read()
+        digest = hashlib.sha256(data).hexdigest()
+        image = Image.open(BytesIO(data))
+        extension = EXTENSIONS.get(image.format, ".img")
+
+        display = content_name(DISPLAY, digest, ".jpg")
+        thumbnail = content_name(THUMBNAILS, digest, ".jpg")
+        if not (storage().exists(display) and storage().exists(thumbnail)):
+            # Camera photos are stored sideways with an EXIF rotation
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            ensure(display, lambda: render(image, DISPLAY_SIZE, DISPLAY_QUALITY))
+            ensure(thumbnail, lambda: render(image, THUMBNAIL_SIZE, THUMBNAIL_QUALITY))
+        original = ensure(content_name(ORIGINALS, digest, extension), lambda: data)
+    except (OSError, Image.DecompressionBombError) as exc:
+        # Missing or unreadable files (UnidentifiedImageError is an OSError)
+        logger.warning("receipt of transaction %s could not be processed: %s", transaction_id, exc)
+        return finish(txn, upload, receipt_status="failed")
+    except Exception:
+        # e.g. a malformed EXIF block; the row must not stay pending
+        logger.exception("receipt of transaction %s could not be processed", transaction_id)
+        return finish(txn, upload, receipt_status="failed")
+
+    status = finish(
+        txn, upload,
+        receipt=original,
+        receipt_display=display,
+        receipt_thumbnail=thumbnail,
+        receipt_sha256=digest,
+        receipt_status="ready",
+    )
+    if status and upload != original and not Transaction.objects.filter(receipt=upload).exists():
+        storage().delete(upload)
+    return status
+
+
+def finish(txn, upload, **values):
+    """
+    Record the result unless the receipt was replaced meanwhile. Sent as
+    a bulk change so the data version, ETags and sync stamps follow.
+    """
+    with transaction.atomic():
+        current = Transaction.objects.select_for_update().filter(
+            pk=txn.pk, receipt=upload, receipt_status="pending"
+        ).first()
+        if current is None:
+            return None
+        Transaction.objects.filter(pk=current.pk).update(**values)
+
+        after = copy.copy(current)
+        for name, value in values.items():
+            setattr(after, name, value)
+        signals.transactions_bulk_changed.send(
+            sender=Transaction, user_id=current.user_id, updated=[(current, after)]
+        )
+    return values["receipt_status"]
+
+
+# ---------------------------
+# Worker pool (per process)
+# ---------------------------
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECEIPT_WORKERS, thread_name_prefix="receipts"
+            )
+        return _executor
+
+
+def enqueue(transaction_id):
+    """
+    Process a receipt in the background. Call after the upload commits.
+    """
+    if settings.RECEIPT_WORKERS:
+        executor().submit(run, transaction_id)
+
+
+def run(transaction_id):
+    # Worker threads keep their own connections, like request threads
+    close_old_connections()
+    try:
+        return process(transaction_id)
+    except Exception:
+        logger.exception("receipt processing failed for transaction %s", transaction_id)
+    finally:
+        close_old_connections()
+
+
+def pending_ids(retry_failed=False):
+    statuses = ["pending", "failed"] if retry_failed else ["pending"]
+    return list(
+        Transaction.objects.filter(receipt_status__in=statuses)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+# ---------------------------
+# Garbage collection
+# ---------------------------
+def collect_garbage():
+    """
+    Delete content-addressed files no transaction references any more.
+    Returns the number of files deleted.
+    """
+    files = storage()
+    referenced = set()
+    rows = Transaction.objects.filter(~Q(receipt="") & Q(receipt__isnull=False)).values_list(
+        "receipt", "receipt_display", "receipt_thumbnail"
+    )
+    for names in rows.iterator(chunk_size=5000):
+        referenced.update(names)
+
+    cutoff = timezone.now() - GC_GRACE
+    deleted = 0
+    for prefix in (ORIGINALS, DISPLAY, THUMBNAILS):
+        if not files.exists(prefix):
+            continue
+        for directory in files.listdir(prefix)[0]:
+            for filename in files.listdir(f"{prefix}/{directory}")[1]:
+                name = f"{prefix}/{directory}/{filename}"
+                if name in referenced or files.get_modified_time(name) > cutoff:
+                    continue
+                files.delete(name)
+                deleted += 1
+    return deleted
@@ -0,0 +1,156 @@
+"""
+Recurring transactions.
+
+A RecurringRule's occurrences are computed from its start date (monthly
+rules keep their day of month, clamped in shorter months) and turned into
+Transactions by `materialize`, which the materialize_recurring command
+runs. Due rules are handled in batches with a fixed number of queries
+each, however many rules, users or missed occurrences a batch holds, so a
+run that was skipped for months catches up in one pass.
+
+Each occurrence is stored with its rule and date, which are unique
+together: an occurrence that already exists is never created twice.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RecurringRule, Transaction
+from .signals import transactions_created
+
+RULE_BATCH_SIZE = 1000
+INSERT_BATCH_SIZE = 5000
+
+
+# ---------------------------
+# Schedule
+# ---------------------------
+def occurrence(rule, n):
+    """
+    Date of the rule's `n`th occurrence, counting from 0 at start_date.
+    """
+    if rule.frequency == "daily":
+        return rule.start_date + timedelta(days=n * rule.interval)
+    if rule.frequency == "weekly":
+        return rule.start_date + timedelta(weeks=n * rule.interval)
+    # Counted from the start so a 31st does not drift to the 28th
+    return rule.start_date + relativedelta(months=n * rule.interval)
+
+
+def index_of(rule, day):
+    """
+    Index of the last occurrence on or before `day` (approximately, for
+    clamped month ends; callers step forward from it).
+    """
+    start = rule.start_date
+    if rule.frequency == "monthly":
+        return ((day.year - start.year) * 12 + day.month - start.month) // rule.interval
+    return (day - start).days // (rule.interval * (7 if rule.frequency == "weekly" else 1))
+
+
+def within_end(rule, day):
+    return day if rule.end_date is None or day <= rule.end_date else None
+
+
+def first_on_or_after(rule, day):
+    """
+    The first occurrence on or after `day`, or None if the rule ends first.
+    """
+    n = max(index_of(rule, day), 0)
+    while occurrence(rule, n) < day:
+        n += 1
+    return within_end(rule, occurrence(rule, n))
+
+
+def schedule(rule):
+    """
+    Set next_date for a new or edited rule: its first occurrence after
+    the ones already materialized.
+    """
+    last = None
+    if rule.pk:
+        last = rule.transactions.order_by("-date").values_list("date", flat=True).first()
+    day = rule.start_date if last is None else max(rule.start_date, last + timedelta(days=1))
+    rule.next_date = first_on_or_after(rule, day)
+
+
+def due_dates(rule, today):
+    """
+    The rule's occurrences from next_date up to `today`, and the
+    occurrence after them (None once the rule has ended).
+    """
+    dates = []
+    day = first_on_or_after(rule, rule.next_date)
+    n = index_of(rule, day) if day else 0
+    while day is not None and day <= today:
+        dates.append(day)
+        n += 1
+        day = within_end(rule, occurrence(rule, n))
+    return dates, day
+
+
+# ---------------------------
+# Materialization
+# ---------------------------
+def materialize(today=None, batch_size=RULE_BATCH_SIZE):
+    """
+    Create every occurrence due on or before `today` (default: the current
+    date) for all users. Returns (rules processed, transactions created).
+
+    Each batch is one database transaction: the due rules are locked
+    (others running concurrently skip them), occurrences that already
+    exist are looked up with one query, the rest are bulk inserted, and
+    the rules' next_date moves past `today`.
+    """
+    today = today or timezone.localdate()
+    due = RecurringRule.objects.filter(next_date__lte=today).order_by("next_date", "id")
+
+    rules = created = 0
+    while True:
+        with transaction.atomic():
+            batch = list(due.select_for_update(skip_locked=True)[:batch_size])
+            if not batch:
+                break
+            created += materialize_rules(batch, today)
+            rules += len(batch)
+    return rules, created
+
+
+def materialize_rules(rules, today):
+    existing = set(
+        Transaction.objects.filter(
+            recurring_rule__in=rules,
+            date__gte=min(rule.next_date for rule in rules),
+            date__lte=today,
+        ).values_list("recurring_rule_id", "date")
+    )
+
+    pending, advanced = [], defaultdict(list)
+    for rule in rules:
+        dates, rule.next_date = due_dates(rule, today)
+        advanced[rule.next_date].append(rule.pk)
+        pending += [
+            Transaction(
+                user_id=rule.user_id,
+                type=rule.type,
+                category_id=rule.category_id,
+                amount=rule.amount,
+                date=day,
+                note=rule.note,
+                recurring_rule_id=rule.pk,
+            )
+            for day in dates
+            if (rule.pk, day) not in existing
+        ]
+
+    created = Transaction.objects.bulk_create(pending, batch_size=INSERT_BATCH_SIZE)
+    # One UPDATE per distinct next date; rules of a batch mostly share a few
+    for next_date, ids in advanced.items():
+        RecurringRule.objects.filter(pk__in=ids).update(next_date=next_date)
+
+    if created:
+        transactions_created.send(sender=Transaction, created=created)
+    return len(created)
@@ -0,0 +1,26 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamingExportRenderer(BaseRenderer):
+    """
+    Content negotiation target for the streaming export. Rows are written
+    by the view itself; only error payloads are rendered here.
+    """
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data).encode(self.charset)
+
+
+class CSVRenderer(StreamingExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(StreamingExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
@@ -0,0 +1,289 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from . import caching
+from .models import MonthlyRollup, Transaction
+
+APPLY_BATCH_SIZE = 1000
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def bucket_of(txn):
+    """
+    (user_id, month, type, category_id, amount) for a Transaction, with
+    values normalised the way the database would store them.
+    """
+    meta = Transaction._meta
+    txn_date = meta.get_field("date").to_python(txn.date)
+    amount = meta.get_field("amount").to_python(txn.amount)
+    return txn.user_id, month_start(txn_date), txn.type, txn.category_id, amount
+
+
+# ---------------------------
+# Incremental maintenance
+# ---------------------------
+def apply(user_id, month, ttype, category_id, amount, count):
+    """
+    Add `amount` and `count` to a single rollup bucket.
+
+    Buckets are created on demand for positive counts and dropped once
+    their count reaches zero. A removal never creates a bucket, so a
+    cascading user delete cannot resurrect rows for that user.
+    """
+    bucket = MonthlyRollup.objects.filter(
+        user_id=user_id, month=month, type=ttype, category_id=category_id
+    )
+    updated = bucket.update(total=F("total") + amount, count=F("count") + count)
+
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.create(
+                    user_id=user_id,
+                    month=month,
+                    type=ttype,
+                    category_id=category_id,
+                    total=amount,
+                    count=count,
+                )
+        except IntegrityError:
+            # Lost a race with a concurrent insert of the same bucket.
+            bucket.update(total=F("total") + amount, count=F("count") + count)
+    elif updated and count < 0:
+        bucket.filter(count__lte=0).delete()
+
+
+def add_transaction(txn):
+    user_id, month, ttype, category_id, amount = bucket_of(txn)
+    apply(user_id, month, ttype, category_id, amount, 1)
+
+
+def remove_transaction(txn):
+    user_id, month, ttype, category_id, amount = bucket_of(txn)
+    apply(user_id, month, ttype, category_id, -amount, -1)
+
+
+def move_transaction(old_bucket, txn):
+    """
+    Re-file an edited transaction. `old_bucket` is the bucket_of() result
+    captured before the save.
+    """
+    new_bucket = bucket_of(txn)
+    if old_bucket[:4] == new_bucket[:4]:
+        if old_bucket[4] != new_bucket[4]:
+            apply(*new_bucket[:4], new_bucket[4] - old_bucket[4], 0)
+        return
+
+    apply(*old_bucket[:4], -old_bucket[4], -1)
+    apply(*new_bucket[:4], new_bucket[4], 1)
+
+
+def deltas(created=(), updated=(), deleted=()):
+    """
+    Net (amount, count) change per bucket key, (user_id, month, type,
+    category_id), of a batch of transaction writes. `updated` holds
+    (before, after) pairs.
+    """
+    totals = defaultdict(lambda: [Decimal(0), 0])
+
+    def add(txn, sign):
+        *key, amount = bucket_of(txn)
+        delta = totals[tuple(key)]
+        delta[0] += sign * amount
+        delta[1] += sign
+
+    for txn in created:
+        add(txn, 1)
+    for before, after in updated:
+        add(before, -1)
+        add(after, 1)
+    for txn in deleted:
+        add(txn, -1)
+
+    return {key: (amount, count) for key, (amount, count) in totals.items() if amount or count}
+
+
+def apply_changes(created=(), updated=(), deleted=()):
+    """
+    Apply a batch of transaction writes, touching each affected bucket
+    once.
+    """
+    for key, (amount, count) in deltas(created, updated, deleted).items():
+        apply(*key, amount, count)
+
+
+def apply_many(changes):
+    """
+    Apply deltas (as returned by deltas()) to buckets of many users with a
+    few queries per APPLY_BATCH_SIZE buckets: the buckets are read and
+    locked together, then written back with bulk_update, bulk_create and
+    one delete.
+    """
+    keys = list(changes)
+    for start in range(0, len(keys), APPLY_BATCH_SIZE):
+        chunk = {key: changes[key] for key in keys[start:start + APPLY_BATCH_SIZE]}
+        with transaction.atomic():
+            # A superset of the buckets (every category of those users and
+            # months), read as tuples and narrowed down here
+            rows = MonthlyRollup.objects.select_for_update().filter(
+                user_id__in={key[0] for key in chunk}, month__in={key[1] for key in chunk}
+            ).values_list("id", "user_id", "month", "type", "category_id", "total", "count")
+            existing = {tuple(row[1:5]): row for row in rows if tuple(row[1:5]) in chunk}
+
+            changed, emptied, new = [], [], []
+            for key, (amount, count) in chunk.items():
+                user_id, month, ttype, category_id = key
+                row = existing.get(key)
+                if row is None:
+                    if count > 0:
+                        new.append(MonthlyRollup(
+                            user_id=user_id, month=month, type=ttype, category_id=category_id,
+                            total=amount, count=count,
+                        ))
+                    continue
+                pk, total, current = row[0], row[5] + amount, row[6] + count
+                if current <= 0:
+                    emptied.append(pk)
+                    continue
+                changed.append(MonthlyRollup(
+                    id=pk, user_id=user_id, month=month, type=ttype, category_id=category_id,
+                    total=total, count=current,
+                ))
+
+            write_rows(changed)
+            if emptied:
+                MonthlyRollup.objects.filter(pk__in=emptied).delete()
+            try:
+                with transaction.atomic():
+                    MonthlyRollup.objects.bulk_create(new, batch_size=APPLY_BATCH_SIZE)
+            except IntegrityError:
+                # A concurrent write created some of these buckets first
+                for row in new:
+                    apply(row.user_id, row.month, row.type, row.category_id, row.total, row.count)
+
+
+def write_rows(rows, fields=("total", "count")):
+    """
+    Save `fields` of already-locked rows of one model (rollup totals by
+    default). An upsert on the primary key where the backend has one:
+    bulk_update's CASE expressions cost more to build than the write
+    itself.
+    """
+    if not rows:
+        return
+    model = type(rows[0])
+    if connections[model.objects.db].features.supports_update_conflicts_with_target:
+        model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=list(fields),
+            batch_size=APPLY_BATCH_SIZE,
+        )
+    else:
+        model.objects.bulk_update(rows, list(fields), batch_size=APPLY_BATCH_SIZE)
+
+
+def uncategorize(category):
+    """
+    Fold a category's buckets into the uncategorized bucket of the same
+    month and type. Called right before the category is deleted, which
+    SET_NULLs its transactions.
+    """
+    for row in MonthlyRollup.objects.filter(category=category):
+        apply(row.user_id, row.month, row.type, None, row.total, row.count)
+    MonthlyRollup.objects.filter(category=category).delete()
+
+
+# ---------------------------
+# Rebuild / verification
+# ---------------------------
+def aggregate_transactions(user_ids=None):
+    """
+    Compute rollup rows straight from the Transaction table.
+    """
+    qs = Transaction.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+
+    return (
+        qs.annotate(month=TruncMonth("date"))
+        .values("user_id", "month", "type", "category_id")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by()
+    )
+
+
+def _key(row):
+    return row["user_id"], row["month"], row["type"], row["category_id"]
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Replace the rollups of `user_ids` (or every user) with freshly
+    aggregated rows and bump the users' data versions, so analytics
+    cached from the old rollups are not served again. Returns the number
+    of buckets written.
+    """
+    rows = [
+        MonthlyRollup(
+            user_id=row["user_id"],
+            month=row["month"],
+            type=row["type"],
+            category_id=row["category_id"],
+            total=row["total"],
+            count=row["count"],
+        )
+        for row in aggregate_transactions(user_ids)
+    ]
+
+    with transaction.atomic():
+        existing = MonthlyRollup.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        touched = user_ids
+        if touched is None:
+            touched = {row.user_id for row in rows}
+            touched.update(existing.values_list("user_id", flat=True).distinct())
+        existing.delete()
+        MonthlyRollup.objects.bulk_create(rows, batch_size=batch_size)
+        caching.bump_versions(touched)
+
+    return len(rows)
+
+
+def verify(user_ids=None):
+    """
+    Compare stored rollups with the raw rows. Returns a list of
+    (key, expected, stored) tuples where each side is (total, count)
+    or None when the bucket is missing.
+    """
+    expected = {
+        _key(row): (row["total"], row["count"])
+        for row in aggregate_transactions(user_ids)
+    }
+
+    stored_qs = MonthlyRollup.objects.values(
+        "user_id", "month", "type", "category_id", "total", "count"
+    )
+    if user_ids is not None:
+        stored_qs = stored_qs.filter(user_id__in=user_ids)
+    stored = {_key(row): (row["total"], row["count"]) for row in stored_qs}
+
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key)
+        have = stored.get(key)
+        if want is not None:
+            want = (Decimal(want[0]), want[1])
+        if want != have:
+            mismatches.append((key, want, have))
+
+    return sorted(mismatches, key=lambda m: (m[0][0], m[0][1], m[0][2], m[0][3] or 0))
@@ -0,0 +1,116 @@
+"""
+Full-text search over transaction notes and category names.
+
+Migration 0009 maintains a per-transaction search document (note plus
+category name) with database triggers: an FTS5 table on SQLite and a
+GIN-indexed tsvector table on PostgreSQL, both scoped per user. FTS5 rows
+are keyed user_id << 32 | transaction id, so a search reads one rowid
+range (the triggers refuse ids that do not fit), and the GIN index covers
+(user_id, document).
+Queries cost the number of the user's matches rather than the size of the
+ledger or of other users' matches; on SQLite, prefixes longer than
+INDEXED_PREFIX (which only complete a few words) are the exception and
+are expanded across all users. Other databases fall back to unindexed
+substring matching.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import Transaction
+
+MAX_TERMS = 8
+# Longest prefix the FTS5 table has a prefix index for (migration 0009)
+INDEXED_PREFIX = 6
+USER_SHIFT = 32
+
+# CROSS JOIN pins the join order: driven from tracker_transaction, SQLite
+# would re-run the full-text query once per row of the user.
+SQLITE_MATCHES = """
+    FROM tracker_transaction_search s
+    CROSS JOIN tracker_transaction t ON t.id = s.rowid & %s
+    WHERE s.document MATCH %s AND s.rowid BETWEEN %s AND %s{filters}
+"""
+
+POSTGRES_MATCHES = """
+    FROM tracker_transaction_search s
+    JOIN tracker_transaction t ON t.id = s.transaction_id
+    CROSS JOIN to_tsquery('english', %s) q
+    WHERE s.document @@ q AND s.user_id = %s{filters}
+"""
+
+ORDERING = {
+    # FTS5's rank is bm25, lower is better
+    "sqlite": "ORDER BY s.rank, t.date DESC, t.id DESC",
+    "postgresql": "ORDER BY ts_rank(s.document, q) DESC, t.date DESC, t.id DESC",
+}
+
+
+def terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def match_expression(vendor, words):
+    """
+    Every word must appear in the note or category name, as a prefix so
+    results show up while the user is still typing.
+    """
+    if vendor == "postgresql":
+        return " & ".join(f"{word}:*" for word in words)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(user, query, ttype=None, date_from=None, date_to=None, offset=0, limit=20):
+    """
+    One page of `user`'s transactions matching `query`, best first.
+    Returns (total matches, ids in rank order).
+    """
+    words = terms(query)
+    if not words:
+        return 0, []
+
+    connection = connections[Transaction.objects.db]
+    vendor = connection.vendor
+    if vendor not in ORDERING:
+        return fallback(user, words, ttype, date_from, date_to, offset, limit)
+
+    if vendor == "sqlite":
+        params = [
+            (1 << USER_SHIFT) - 1,
+            match_expression(vendor, words),
+            user.pk << USER_SHIFT,
+            ((user.pk + 1) << USER_SHIFT) - 1,
+        ]
+    else:
+        params = [match_expression(vendor, words), user.pk]
+    filters = ""
+    for clause, value in (("t.type = %s", ttype), ("t.date >= %s", date_from), ("t.date <= %s", date_to)):
+        if value:
+            filters += f" AND {clause}"
+            params.append(value)
+
+    matches = (SQLITE_MATCHES if vendor == "sqlite" else POSTGRES_MATCHES).format(filters=filters)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) {matches}", params)
+        (total,) = cursor.fetchone()
+        if not total or offset >= total:
+            return total, []
+        cursor.execute(f"SELECT t.id {matches} {ORDERING[vendor]} LIMIT %s OFFSET %s", params + [limit, offset])
+        return total, [pk for (pk,) in cursor.fetchall()]
+
+
+def fallback(user, words, ttype, date_from, date_to, offset, limit):
+    queryset = Transaction.objects.filter(user=user)
+    for word in words:
+        queryset = queryset.filter(Q(note__icontains=word) | Q(category__name__icontains=word))
+    if ttype:
+        queryset = queryset.filter(type=ttype)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    total = queryset.count()
+    ids = list(queryset.order_by("-date", "-id").values_list("id", flat=True)[offset:offset + limit])
+    return total, ids
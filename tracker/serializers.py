@@ -1,6 +1,27 @@
+from decimal import Decimal
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Transaction, Category, Budget
+from django.utils import timezone
+from django.db.models import Value
+from django.db.models.functions import Lower
+from .models import Transaction, TransactionFlag, Category, Budget, BudgetAlert, RecurringRule
+from . import budgets, recurring
+from .instrumentation import span
+
+
+# ---------------------------------------------------------
+# Timing
+# ---------------------------------------------------------
+class TimedSerializerMixin:
+    """
+    Counts to_representation() towards the request's `serialize` timing.
+    """
+    def to_representation(self, instance):
+        with span("serialize"):
+            return super().to_representation(instance)
 
 
 # ---------------------------------------------------------
@@ -33,7 +54,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 # ---------------------------------------------------------
 # Category Serializer
 # ---------------------------------------------------------
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ("id", "name", "type")
@@ -42,9 +63,9 @@ class CategorySerializer(serializers.ModelSerializer):
     def validate(self, data):
         user = self.context["request"].user
 
-        if Category.objects.filter(
+        if Category.objects.alias(lower_name=Lower("name")).filter(
             user=user,
-            name__iexact=data["name"],
+            lower_name=Lower(Value(data["name"])),
             type=data["type"],
         ).exists():
             raise serializers.ValidationError("Category already exists.")
@@ -52,26 +73,48 @@ class CategorySerializer(serializers.ModelSerializer):
         return data
 
 
+# ---------------------------------------------------------
+# Sparse field selection
+# ---------------------------------------------------------
+class DynamicFieldsMixin:
+    """
+    Accepts a `fields` kwarg naming the subset of fields to render.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": f"Unknown field(s): {', '.join(sorted(unknown))}"}
+                )
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 # ---------------------------------------------------------
 # Transaction Serializer
 # ---------------------------------------------------------
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
     category_type = serializers.CharField(source="category.type", read_only=True)
-    receipt = serializers.SerializerMethodField()
+    receipt = serializers.ImageField(required=False, allow_null=True)
+
+    # Lists link only the thumbnail; full-size images are fetched per transaction
+    detail_only_fields = ("receipt", "receipt_display")
 
     class Meta:
         model = Transaction
-        fields = "__all__"
+        exclude = ("change_seq", "receipt_sha256")
         read_only_fields = ("id", "user", "category_name", "category_type")
 
-    def get_receipt(self, obj):
-        request = self.context.get("request")
-        if obj.receipt and request:
-            return request.build_absolute_uri(obj.receipt.url)
-        elif obj.receipt:
-            return obj.receipt.url
-        return None
+    def __init__(self, *args, detail=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not detail:
+            for name in self.detail_only_fields:
+                self.fields.pop(name, None)
 
     def validate(self, data):
         if data["amount"] <= 0:
@@ -87,13 +130,236 @@ class TransactionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+# ---------------------------------------------------------
+# Read-optimised Transaction rows (list endpoint)
+# ---------------------------------------------------------
+class TransactionRowSerializer:
+    """
+    Renders rows from Transaction .values() queries to the exact JSON
+    TransactionSerializer(detail=False) produces, without building model
+    instances or going through DRF's per-field machinery.
+
+    Field order and the `fields=` subset are taken from
+    TransactionSerializer itself, so the two cannot drift apart.
+    """
+    # Source values each output field needs from .values()
+    SOURCES = {
+        "id": ("id",),
+        "category_name": ("category__name",),
+        "category_type": ("category__type",),
+        "receipt": ("receipt",),
+        "receipt_display": ("receipt_display",),
+        "receipt_thumbnail": ("receipt_thumbnail",),
+        "receipt_status": ("receipt_status",),
+        "type": ("type",),
+        "amount": ("amount",),
+        "date": ("date",),
+        "note": ("note",),
+        "created_at": ("created_at",),
+        "user": ("user_id",),
+        "category": ("category_id",),
+        "recurring_rule": ("recurring_rule_id",),
+    }
+    # Always fetched: the keyset paginator positions on them
+    POSITION = ("id", "date", "created_at")
+
+    CENT = Decimal("0.01")
+
+    def __init__(self, request, fields=None):
+        self.request = request
+        self.fields = list(
+            TransactionSerializer(fields=fields, detail=False, context={"request": request}).fields
+        )
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        self.storage = Transaction._meta.get_field("receipt").storage
+
+    @classmethod
+    def supported(cls):
+        """
+        False when DRF settings change how values are rendered, in which
+        case callers should fall back to TransactionSerializer.
+        """
+        return (
+            api_settings.COERCE_DECIMAL_TO_STRING
+            and api_settings.DATE_FORMAT == api_settings.DATETIME_FORMAT == "iso-8601"
+            and set(TransactionSerializer().fields) == set(cls.SOURCES)
+        )
+
+    def values(self):
+        names = set(self.POSITION)
+        for field in self.fields:
+            names.update(self.SOURCES[field])
+        return sorted(names)
+
+    def render(self, rows):
+        fields = self.fields
+        convert = {
+            "receipt": self.receipt_url,
+            "receipt_display": self.receipt_url,
+            "receipt_thumbnail": self.receipt_url,
+            "amount": self.amount,
+            "date": date_iso,
+            "created_at": self.datetime_iso,
+        }
+        plan = [(name, self.SOURCES[name][0], convert.get(name)) for name in fields]
+        optional = {"category_name", "category_type"}
+
+        data = []
+        with span("serialize"):
+            for row in rows:
+                item = {}
+                for name, source, fn in plan:
+                    value = row[source]
+                    if value is None:
+                        # A null category omits these keys entirely, as DRF does
+                        if name in optional:
+                            continue
+                    elif fn is not None:
+                        value = fn(value)
+                    item[name] = value
+                data.append(item)
+        return data
+
+    def amount(self, value):
+        return f"{value.quantize(self.CENT):f}"
+
+    def datetime_iso(self, value):
+        if self.timezone is not None:
+            if timezone.is_aware(value):
+                value = value.astimezone(self.timezone)
+            else:
+                value = timezone.make_aware(value, self.timezone)
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    def receipt_url(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+
+def date_iso(value):
+    return value.isoformat()
+
+
 # ---------------------------------------------------------
 # Budget Serializer
 # ---------------------------------------------------------
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source="category.name")
 
     class Meta:
         model = Budget
-        fields = "__all__"
+        # Spending is served by BudgetStatusSerializer: it changes with
+        # transaction writes, which do not re-stamp budgets for sync
+        exclude = ("change_seq", "spent", "alert_level")
         read_only_fields = ("id",)
+
+
+class BudgetStatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category_name = serializers.ReadOnlyField(source="category.name")
+    utilization = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Budget
+        fields = (
+            "id", "category", "category_name", "month", "amount",
+            "spent", "utilization", "alert_level",
+        )
+
+    def get_utilization(self, budget):
+        return budgets.utilization(budget.spent, budget.amount)
+
+
+class BudgetAlertSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = serializers.ReadOnlyField(source="budget.category_id")
+    category_name = serializers.ReadOnlyField(source="budget.category.name")
+    month = serializers.DateField(source="budget.month", read_only=True)
+
+    class Meta:
+        model = BudgetAlert
+        fields = (
+            "id", "budget", "category", "category_name", "month",
+            "threshold", "spent", "amount", "created_at",
+        )
+
+
+# ---------------------------------------------------------
+# Transaction Flag Serializer
+# ---------------------------------------------------------
+class FlaggedTransactionSerializer(serializers.ModelSerializer):
+    category_name = serializers.ReadOnlyField(source="category.name")
+
+    class Meta:
+        model = Transaction
+        fields = ("id", "type", "category", "category_name", "amount", "date", "note")
+
+
+class TransactionFlagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    transaction = FlaggedTransactionSerializer(read_only=True)
+
+    class Meta:
+        model = TransactionFlag
+        fields = ("id", "reason", "score", "typical", "duplicate_of", "created_at", "transaction")
+
+
+# ---------------------------------------------------------
+# Recurring Rule Serializer
+# ---------------------------------------------------------
+class RecurringRuleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category_name = serializers.ReadOnlyField(source="category.name")
+
+    # Changing any of these recomputes next_date
+    schedule_fields = ("frequency", "interval", "start_date", "end_date")
+
+    class Meta:
+        model = RecurringRule
+        exclude = ("user",)
+        read_only_fields = ("id", "next_date", "created_at")
+
+    def validate_category(self, category):
+        if category is not None and category.user_id != self.context["request"].user.pk:
+            raise serializers.ValidationError(f'Invalid pk "{category.pk}" - object does not exist.')
+        return category
+
+    def validate(self, data):
+        def value(name):
+            if name in data:
+                return data[name]
+            if self.instance is not None:
+                return getattr(self.instance, name)
+            return RecurringRule._meta.get_field(name).get_default()
+
+        if value("amount") <= 0:
+            raise serializers.ValidationError("Amount must be positive.")
+        if value("interval") < 1:
+            raise serializers.ValidationError("Interval must be at least 1.")
+        if value("end_date") and value("end_date") < value("start_date"):
+            raise serializers.ValidationError("End date must not be before the start date.")
+        if value("category") and value("category").type != value("type"):
+            raise serializers.ValidationError("Rule type must match category type.")
+
+        return data
+
+    def create(self, validated_data):
+        rule = RecurringRule(user=self.context["request"].user, **validated_data)
+        recurring.schedule(rule)
+        rule.save()
+        return rule
+
+    def update(self, instance, validated_data):
+        reschedule = any(
+            getattr(instance, name) != validated_data[name]
+            for name in self.schedule_fields if name in validated_data
+        )
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        if reschedule:
+            recurring.schedule(instance)
+        instance.save()
+        return instance
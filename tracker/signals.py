@@ -1,43 +1,257 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import User
-from .models import Category
-
-DEFAULT_EXPENSE_CATEGORIES = [
-    "Utilities",
-    "Rent",
-    "Insurance",
-    "Housing",
-    "Debt",
-    "Clothing",
-    "Savings",
-    "Gifting",
-    "Medical",
-    "Miscellaneous",
-]
-
-DEFAULT_INCOME_CATEGORIES = [
-    "Salary",
-    "Investments",
-    "Bonus",
-    "Business",
-    "Other Income",
-]
+from .models import Budget, Category, RecurringRule, Transaction
+from . import authentication, budgets, caching, ledger, receipts, rollups, sync
+from .defaults import seed_default_categories
+
+# Sent by code that writes transactions in bulk (bulk_create, bulk_update,
+# raw deletes) and so bypasses the per-row model signals. Keyword args:
+# user_id, created=[Transaction], updated=[(before, after)], deleted=[Transaction].
+transactions_bulk_changed = Signal()
+
+# Sent by code that creates transactions for many users at once (recurring
+# materialization), where one transactions_bulk_changed per user would cost
+# queries per user. Receivers work set-wise. Keyword args: created=[Transaction].
+transactions_created = Signal()
+
 
+# ---------------------------------------------------------
+# Default categories for new users
+# ---------------------------------------------------------
 @receiver(post_save, sender=User)
-def create_default_categories(sender, instance, created, **kwargs):
-    if created:
-        # Seed expense categories
-        for name in DEFAULT_EXPENSE_CATEGORIES:
-            Category.objects.get_or_create(
-                user=instance,
-                name=name,
-                type="expense"
-            )
-        # Seed income categories
-        for name in DEFAULT_INCOME_CATEGORIES:
-            Category.objects.get_or_create(
-                user=instance,
-                name=name,
-                type="income"
-            )
+def create_default_categories(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        seed_default_categories([instance.pk])
+
+
+# ---------------------------------------------------------
+# Monthly rollups
+# ---------------------------------------------------------
+@receiver(pre_save, sender=Transaction)
+def remember_rollup_bucket(sender, instance, raw, **kwargs):
+    instance._rollup_bucket = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    old = Transaction.objects.filter(pk=instance.pk).only(
+        "user_id", "type", "category_id", "amount", "date"
+    ).first()
+    if old is not None:
+        instance._rollup_bucket = rollups.bucket_of(old)
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_bucket = getattr(instance, "_rollup_bucket", None)
+    if old_bucket is None:
+        rollups.add_transaction(instance)
+    else:
+        rollups.move_transaction(old_bucket, instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollups.remove_transaction(instance)
+
+
+@receiver(transactions_bulk_changed)
+def update_rollup_in_bulk(sender, created=(), updated=(), deleted=(), **kwargs):
+    rollups.apply_changes(created, updated, deleted)
+
+
+@receiver(transactions_created)
+def update_rollups_for_created(sender, created, **kwargs):
+    rollups.apply_many(rollups.deltas(created=created))
+
+
+@receiver(pre_delete, sender=Category)
+def uncategorize_rollups(sender, instance, **kwargs):
+    # Transactions in this category are about to be SET_NULL.
+    rollups.uncategorize(instance)
+
+
+# ---------------------------------------------------------
+# Budget utilization (spent counters and alerts)
+# ---------------------------------------------------------
+@receiver(post_save, sender=Transaction)
+def update_budgets_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        budgets.transaction_saved(getattr(instance, "_rollup_bucket", None), instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_budgets_on_delete(sender, instance, **kwargs):
+    budgets.transaction_deleted(instance)
+
+
+@receiver(transactions_bulk_changed)
+def update_budgets_in_bulk(sender, created=(), updated=(), deleted=(), **kwargs):
+    budgets.apply(rollups.deltas(created, updated, deleted))
+
+
+@receiver(transactions_created)
+def update_budgets_for_created(sender, created, **kwargs):
+    budgets.apply(rollups.deltas(created=created))
+
+
+@receiver(pre_save, sender=Budget)
+def refresh_budget_spent(sender, instance, raw, **kwargs):
+    instance._alert_thresholds = [] if raw else budgets.refresh(instance)
+
+
+@receiver(post_save, sender=Budget)
+def record_budget_alerts(sender, instance, raw, **kwargs):
+    if not raw:
+        budgets.record(instance, instance._alert_thresholds)
+
+
+# ---------------------------------------------------------
+# Data versions: analytics cache invalidation and delta sync
+# ---------------------------------------------------------
+@receiver(pre_save, sender=Transaction)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Budget)
+def bump_version_on_save(sender, instance, raw, **kwargs):
+    # Before the save, so the row is written with the version it creates;
+    # VersionedModel.save commits both together. save(update_fields=...)
+    # callers must include change_seq.
+    if not raw:
+        instance.change_seq = caching.bump_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Budget)
+def bump_version_on_delete(sender, instance, **kwargs):
+    seq = caching.bump_version(instance.user_id, create=False)
+    if seq is not None:
+        sync.record_deletions(instance.user_id, sender, [instance.pk], seq)
+
+
+@receiver(transactions_bulk_changed)
+def bump_version_in_bulk(sender, user_id, created=(), updated=(), deleted=(), **kwargs):
+    seq = caching.bump_version(user_id)
+    sync.stamp(Transaction, [txn.pk for txn in created] + [after.pk for _, after in updated], seq)
+    sync.record_deletions(user_id, Transaction, [txn.pk for txn in deleted], seq)
+
+
+@receiver(transactions_created)
+def bump_versions_for_created(sender, created, **kwargs):
+    caching.bump_versions({txn.user_id for txn in created})
+    sync.stamp_with_versions(Transaction, [txn.pk for txn in created])
+
+
+@receiver(pre_delete, sender=Category)
+def stamp_uncategorized_transactions(sender, instance, **kwargs):
+    # Transactions in this category are about to be SET_NULL without signals
+    seq = caching.bump_version(instance.user_id, create=False)
+    if seq is not None:
+        instance.transactions.update(change_seq=seq)
+        ledger.changed(instance.user_id)
+
+
+@receiver(pre_delete, sender=RecurringRule)
+def stamp_unlinked_occurrences(sender, instance, **kwargs):
+    # The rule's occurrences are about to lose their recurring_rule without signals
+    if not instance.transactions.exists():
+        return
+    seq = caching.bump_version(instance.user_id, create=False)
+    if seq is not None:
+        instance.transactions.update(change_seq=seq)
+        ledger.changed(instance.user_id)
+
+
+# ---------------------------------------------------------
+# Columnar ledger cache (after the version bumps above)
+# ---------------------------------------------------------
+@receiver(post_save, sender=Transaction)
+def patch_ledger_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        ledger.changed(instance.user_id, ledger.upsert_patch([ledger.row_of(instance)]))
+
+
+@receiver(post_delete, sender=Transaction)
+def patch_ledger_on_delete(sender, instance, **kwargs):
+    ledger.changed(instance.user_id, ledger.delete_patch([instance.pk]))
+
+
+@receiver(transactions_bulk_changed)
+def patch_ledger_in_bulk(sender, user_id, created=(), updated=(), deleted=(), **kwargs):
+    ledger.changed(user_id, ledger.bulk_patch(created, updated, deleted))
+
+
+@receiver(transactions_created)
+def patch_ledger_for_created(sender, created, **kwargs):
+    by_user = defaultdict(list)
+    for txn in created:
+        by_user[txn.user_id].append(txn)
+    for user_id, txns in by_user.items():
+        ledger.changed(user_id, ledger.bulk_patch(created=txns))
+
+
+@receiver(post_save, sender=Category)
+def patch_ledger_on_category_save(sender, instance, raw, **kwargs):
+    if not raw:
+        ledger.changed(instance.user_id, ledger.rename_patch(instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Category)
+def patch_ledger_on_category_delete(sender, instance, **kwargs):
+    ledger.changed(instance.user_id, ledger.uncategorize_patch(instance.pk))
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def advance_ledger_on_budget_change(sender, instance, raw=False, **kwargs):
+    # Budgets are not in the ledger, but they do bump the data version.
+    if not raw:
+        ledger.changed(instance.user_id)
+
+
+@receiver(post_delete, sender=User)
+def forget_ledger(sender, instance, **kwargs):
+    ledger.cache.forget(instance.pk)
+
+
+# ---------------------------------------------------------
+# Cached JWT users
+# ---------------------------------------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Again after commit: a request may have cached the old row meanwhile
+    authentication.user_cache.forget(instance.pk)
+    transaction.on_commit(lambda: authentication.user_cache.forget(instance.pk))
+
+
+# ---------------------------------------------------------
+# Receipt processing
+# ---------------------------------------------------------
+@receiver(pre_save, sender=Transaction)
+def reset_receipt_versions(sender, instance, raw, **kwargs):
+    instance._receipt_uploaded = False
+    if raw:
+        return
+    if instance.receipt and not instance.receipt._committed:
+        # A new upload: its versions are rendered after commit
+        instance._receipt_uploaded = True
+        instance.receipt_status = "pending"
+    elif instance.receipt:
+        return
+    else:
+        instance.receipt_status = ""
+    instance.receipt_display = None
+    instance.receipt_thumbnail = None
+    instance.receipt_sha256 = ""
+
+
+@receiver(post_save, sender=Transaction)
+def process_receipt(sender, instance, raw, **kwargs):
+    if not raw and instance._receipt_uploaded:
+        pk = instance.pk
+        transaction.on_commit(lambda: receipts.enqueue(pk))
@@ -0,0 +1,121 @@
+"""
+Delta sync for offline clients.
+
+Every Transaction, Category and Budget write bumps the user's data
+version (tracker.caching) and stamps the row with it as `change_seq`;
+deletes leave a SyncTombstone at their version. A sync token is the
+version a client last synced at, so "changes since token" is an index
+range scan per model and costs the number of changes, not the size of
+the account.
+
+Tombstones older than SYNC_TOMBSTONE_DAYS are pruned, raising the
+user's `sync_floor`; tokens below it (or from the future, e.g. after a
+restore) get a full resync instead.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Budget, Category, SyncTombstone, Transaction, UserDataVersion
+
+STAMP_BATCH_SIZE = 1000
+
+
+# ---------------------------
+# Write side (called from signals)
+# ---------------------------
+def stamp(model, ids, seq):
+    """
+    Set change_seq on rows written without model signals (bulk writes,
+    SET_NULL cascades).
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), STAMP_BATCH_SIZE):
+        model.objects.filter(pk__in=ids[start:start + STAMP_BATCH_SIZE]).update(change_seq=seq)
+
+
+def stamp_with_versions(model, ids):
+    """
+    Set change_seq on rows of many users to each user's current version,
+    for writes that bumped them all together (caching.bump_versions).
+    """
+    version = UserDataVersion.objects.filter(user_id=OuterRef("user_id")).values("version")[:1]
+    ids = list(ids)
+    for start in range(0, len(ids), STAMP_BATCH_SIZE):
+        model.objects.filter(pk__in=ids[start:start + STAMP_BATCH_SIZE]).update(change_seq=Subquery(version))
+
+
+def record_deletions(user_id, model, ids, seq):
+    SyncTombstone.objects.bulk_create(
+        [
+            SyncTombstone(user_id=user_id, model=model._meta.model_name, object_id=pk, change_seq=seq)
+            for pk in ids
+        ],
+        batch_size=STAMP_BATCH_SIZE,
+    )
+
+
+def prune(days):
+    """
+    Delete tombstones older than `days`, raising each affected user's
+    sync_floor to the newest pruned change. Returns the number deleted.
+    """
+    old = SyncTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    with transaction.atomic():
+        floors = old.values("user_id").annotate(seq=Max("change_seq")).order_by()
+        for row in floors:
+            UserDataVersion.objects.filter(
+                user_id=row["user_id"], sync_floor__lt=row["seq"]
+            ).update(sync_floor=row["seq"])
+        deleted, _ = old.delete()
+    return deleted
+
+
+# ---------------------------
+# Read side
+# ---------------------------
+def parse_token(value):
+    if value in (None, ""):
+        return None
+    try:
+        token = int(value)
+    except ValueError:
+        token = -1
+    if token < 0:
+        raise ValueError("Invalid sync token")
+    return token
+
+
+def changes(user, since, serialize):
+    """
+    Rows of `user` changed since the token `since` (None for everything).
+
+    `serialize` maps each of "transactions", "categories" and "budgets"
+    to a function rendering a queryset of that model. Returns the payload
+    with the token to send next time; clients apply `deleted` before
+    `changed`.
+    """
+    version, floor = (
+        UserDataVersion.objects.filter(user=user)
+        .values_list("version", "sync_floor")
+        .first()
+    ) or (0, 0)
+    full = since is None or since < floor or since > version
+
+    models = {"transactions": Transaction, "categories": Category, "budgets": Budget}
+    deleted = {key: [] for key in models}
+    if not full:
+        names = {model._meta.model_name: key for key, model in models.items()}
+        tombstones = SyncTombstone.objects.filter(user=user, change_seq__gt=since)
+        for name, pk in tombstones.values_list("model", "object_id"):
+            deleted[names[name]].append(pk)
+
+    payload = {"token": str(version), "full": full}
+    for key, model in models.items():
+        queryset = model.objects.filter(user=user)
+        if not full:
+            queryset = queryset.filter(change_seq__gt=since)
+        payload[key] = {"changed": serialize[key](queryset), "deleted": deleted[key]}
+    return payload
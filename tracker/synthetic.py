@@ -0,0 +1,166 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from . import caching, rollups
+from .budgets import reconcile as reconcile_budgets
+from .defaults import seed_default_categories
+from .models import Budget, Category, RecurringRule, Transaction
+
+INSERT_BATCH_SIZE = 5000
+
+# Typical monthly spend per default expense category, in whole currency
+# units. Anything not listed gets DEFAULT_SPEND.
+TYPICAL_SPEND = {
+    "Rent": 1200,
+    "Housing": 300,
+    "Utilities": 150,
+    "Insurance": 120,
+    "Debt": 250,
+    "Clothing": 80,
+    "Medical": 60,
+    "Gifting": 50,
+}
+DEFAULT_SPEND = 100
+
+
+def generate(
+    users=10,
+    transactions=500,
+    months=24,
+    categories=6,
+    budget_months=12,
+    uncategorized=0.05,
+    seed=42,
+    prefix="synth",
+    password="synthetic",
+    end=None,
+):
+    """
+    Create `users` users, each with about `transactions` transactions
+    spread over the last `months` months.
+
+    Each user spends in `categories` of the default expense categories,
+    with skewed weights, and gets a monthly salary from a recurring rule. `uncategorized` is
+    the fraction of expenses with no category. Budgets cover the last
+    `budget_months` months of every active expense category.
+
+    Everything is written with bulk inserts and a seeded RNG, so the same
+    arguments always produce the same dataset. Returns the new users' ids.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - relativedelta(months=months)
+    span_days = max((end - start).days, 1)
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        first = User.objects.count()
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}-{first + n}", password=password_hash)
+                for n in range(users)
+            ],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=f"{prefix}-")
+            .order_by("-pk")
+            .values_list("pk", flat=True)[:users]
+        )[::-1]
+        seed_default_categories(user_ids)
+
+        by_user = {}
+        for cat in Category.objects.filter(user_id__in=user_ids).values("id", "user_id", "name", "type"):
+            by_user.setdefault(cat["user_id"], []).append(cat)
+
+        pending, budgets, rules = [], [], []
+        for user_id in user_ids:
+            cats = by_user[user_id]
+            expense = [c for c in cats if c["type"] == "expense"]
+            income = [c for c in cats if c["type"] == "income"]
+            active = rng.sample(expense, min(categories, len(expense)))
+            weights = [rng.expovariate(1.0) for _ in active]
+            salary = next(c for c in income if c["name"] == "Salary")
+            monthly_salary = Decimal(rng.randint(2500, 9000))
+
+            month = start.replace(day=1)
+            while month <= end:
+                pending.append(_txn(user_id, "income", salary["id"], monthly_salary, month, "Salary"))
+                month += relativedelta(months=1)
+            rules.append(RecurringRule(
+                user_id=user_id,
+                type="income",
+                category_id=salary["id"],
+                amount=monthly_salary,
+                note="Salary",
+                frequency="monthly",
+                start_date=start.replace(day=1),
+                next_date=month,
+            ))
+
+            n_expenses = max(transactions - months, 0)
+            for i in range(n_expenses):
+                category = rng.choices(active, weights)[0] if active else None
+                if rng.random() < uncategorized:
+                    category = None
+                typical = TYPICAL_SPEND.get(category["name"], DEFAULT_SPEND) if category else DEFAULT_SPEND
+                amount = Decimal(round(rng.lognormvariate(0, 0.6) * typical / 4, 2)).quantize(Decimal("0.01"))
+                pending.append(_txn(
+                    user_id,
+                    "expense",
+                    category["id"] if category else None,
+                    max(amount, Decimal("0.01")),
+                    start + timedelta(days=rng.randrange(span_days)),
+                    f"synthetic expense {i}" if i % 4 else None,
+                ))
+
+                if len(pending) >= INSERT_BATCH_SIZE:
+                    Transaction.objects.bulk_create(pending, batch_size=INSERT_BATCH_SIZE)
+                    pending = []
+
+            month = end.replace(day=1) - relativedelta(months=budget_months - 1)
+            for _ in range(budget_months):
+                for category in active:
+                    typical = TYPICAL_SPEND.get(category["name"], DEFAULT_SPEND)
+                    budgets.append(Budget(
+                        user_id=user_id,
+                        category_id=category["id"],
+                        amount=Decimal(typical),
+                        month=month,
+                    ))
+                month += relativedelta(months=1)
+
+        Transaction.objects.bulk_create(pending, batch_size=INSERT_BATCH_SIZE)
+        Budget.objects.bulk_create(budgets, batch_size=INSERT_BATCH_SIZE)
+        RecurringRule.objects.bulk_create(rules, batch_size=INSERT_BATCH_SIZE)
+        # Salaries are the rules' occurrences so far
+        Transaction.objects.filter(user_id__in=user_ids, type="income", note="Salary").update(
+            recurring_rule_id=Subquery(
+                RecurringRule.objects.filter(user_id=OuterRef("user_id")).values("pk")[:1]
+            )
+        )
+
+        # Bulk inserts bypass the model signals that maintain derived state
+        rollups.rebuild(user_ids)
+        reconcile_budgets(user_ids)
+        caching.bump_versions(user_ids)
+
+    return user_ids
+
+
+def _txn(user_id, ttype, category_id, amount, when, note):
+    return Transaction(
+        user_id=user_id,
+        type=ttype,
+        category_id=category_id,
+        amount=amount,
+        date=when,
+        note=note,
+    )
@@ -1,3 +1,2336 @@
-from django.test import TestCase
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    analytics,
+    analytics_views,
+    anomalies,
+    authentication,
+    batch,
+    budgets,
+    caching,
+    db_routers,
+    defaults,
+    exports,
+    forecast,
+    importer,
+    instrumentation,
+    ledger,
+    receipts,
+    recurring,
+    rollups,
+    search,
+    sync,
+    views,
+)
+from .benchmarking import url_names
+from .management.commands import benchmark_endpoints
+from .models import (
+    AnomalyScan,
+    Budget,
+    BudgetAlert,
+    Category,
+    MonthlyRollup,
+    RecurringRule,
+    SyncTombstone,
+    Transaction,
+    TransactionFlag,
+    UserDataVersion,
+)
+from .serializers import TransactionRowSerializer, TransactionSerializer
+
+
+# ---------------------------------------------------------
+# Query plans
+# ---------------------------------------------------------
+# Replicas share the schema; keep every query on the connection that holds
+# the test transaction.
+@override_settings(DATABASE_REPLICAS=[])
+class QueryPlanTests(TestCase):
+    """
+    Every query the main endpoints issue against tracker tables must be
+    answerable from an index. Fails if a change to a view or to the
+    indexes makes any of them fall back to a full table scan.
+    """
+    users = 3
+    transactions_per_user = 400
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date(2023, 1, 1)
+        for n in range(cls.users):
+            user = User.objects.create_user(f"plan-user-{n}", password="x")
+            categories = list(Category.objects.filter(user=user))
+            Transaction.objects.bulk_create(
+                Transaction(
+                    user=user,
+                    type=categories[i % len(categories)].type,
+                    category=categories[i % len(categories)] if i % 7 else None,
+                    amount=Decimal(i % 250) + Decimal("0.99"),
+                    date=start + timedelta(days=i * 2),
+                    note=f"row {i}",
+                )
+                for i in range(cls.transactions_per_user)
+            )
+        cls.user = User.objects.get(username="plan-user-0")
+        rollups.rebuild()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # A seq scan that survives this has no index to fall back on.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                return [
+                    line for (line,) in cursor.fetchall()
+                    if "Seq Scan on tracker_" in line
+                ]
+            if connection.vendor == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                return [
+                    row[3] for row in cursor.fetchall()
+                    if row[3].startswith("SCAN tracker_") and " USING " not in row[3]
+                ]
+        self.skipTest(f"no plan inspection for {connection.vendor}")
+
+    def assertIndexedQueries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        scans = []
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if "tracker_" not in sql or not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            scans += [(sql, step) for step in self.explain(sql)]
+        self.assertEqual(scans, [], f"full table scan behind {url}")
+        return response
+
+    def test_transaction_list(self):
+        self.assertIndexedQueries("/api/transactions/")
+
+    def test_transaction_list_deep_page(self):
+        first = self.assertIndexedQueries("/api/transactions/?page_size=100").json()
+        self.assertIndexedQueries(first["next"])
+
+    def test_transaction_list_filters(self):
+        self.assertIndexedQueries("/api/transactions/?type=expense")
+        self.assertIndexedQueries("/api/transactions/?category=rent")
+        self.assertIndexedQueries("/api/transactions/?date_from=2023-06-01&date_to=2023-09-30")
+
+    def test_categories_and_budgets(self):
+        self.assertIndexedQueries("/api/categories/")
+        self.assertIndexedQueries("/api/budgets/")
+
+    def test_analytics(self):
+        self.assertIndexedQueries("/api/analytics/monthly/")
+        self.assertIndexedQueries("/api/analytics/monthly-summary/")
+        self.assertIndexedQueries("/api/analytics/monthly-summary/?year=2023&month=5")
+        self.assertIndexedQueries("/api/analytics/category-totals/?type=expense")
+        self.assertIndexedQueries(
+            "/api/analytics/monthly-category/?date_from=2023-02-10&date_to=2023-11-20"
+        )
+        self.assertIndexedQueries("/api/analytics/budget-vs-expense/?start=2023-01&end=2023-12")
+        self.assertIndexedQueries("/api/analytics/dashboard/")
+
+    def test_sync(self):
+        self.assertIndexedQueries("/api/sync/?since=1")
+
+    def test_transaction_flags(self):
+        self.assertIndexedQueries("/api/transaction-flags/")
+
+    def test_search(self):
+        self.assertIndexedQueries("/api/transactions/search/?q=row")
+        self.assertIndexedQueries("/api/transactions/search/?q=rent&type=expense&date_from=2023-06-01")
+
+
+# ---------------------------------------------------------
+# Monthly rollups
+# ---------------------------------------------------------
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("rollup-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.utilities = Category.objects.get(user=cls.user, name="Utilities")
+
+    def expense(self, amount, day=date(2024, 1, 15), category=None):
+        return Transaction.objects.create(
+            user=self.user, type="expense", category=category or self.rent,
+            amount=Decimal(amount), date=day,
+        )
+
+    def buckets(self):
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+        return {
+            (row.month, row.category_id): (row.total, row.count)
+            for row in MonthlyRollup.objects.filter(user=self.user)
+        }
+
+    def test_rollups_follow_transaction_writes(self):
+        january, february = date(2024, 1, 1), date(2024, 2, 1)
+        txn = self.expense("10.10")
+        self.expense("20.25")
+        self.assertEqual(self.buckets(), {(january, self.rent.pk): (Decimal("30.35"), 2)})
+
+        txn.amount = Decimal("12.40")
+        txn.save()
+        self.assertEqual(self.buckets(), {(january, self.rent.pk): (Decimal("32.65"), 2)})
+
+        txn.category = self.utilities
+        txn.save()
+        self.assertEqual(self.buckets(), {
+            (january, self.rent.pk): (Decimal("20.25"), 1),
+            (january, self.utilities.pk): (Decimal("12.40"), 1),
+        })
+
+        txn.date = date(2024, 2, 3)
+        txn.save()
+        self.assertEqual(self.buckets(), {
+            (january, self.rent.pk): (Decimal("20.25"), 1),
+            (february, self.utilities.pk): (Decimal("12.40"), 1),
+        })
+
+        self.utilities.delete()
+        self.assertEqual(self.buckets(), {
+            (january, self.rent.pk): (Decimal("20.25"), 1),
+            (february, None): (Decimal("12.40"), 1),
+        })
+
+        txn.refresh_from_db()
+        txn.delete()
+        self.assertEqual(self.buckets(), {(january, self.rent.pk): (Decimal("20.25"), 1)})
+
+    def test_rebuild_repairs_drift(self):
+        self.expense("10.10")
+        self.expense("5.05", day=date(2024, 3, 2))
+        MonthlyRollup.objects.filter(user=self.user, month=date(2024, 1, 1)).update(total=1, count=9)
+        MonthlyRollup.objects.filter(user=self.user, month=date(2024, 3, 1)).delete()
+        self.assertEqual(len(rollups.verify([self.user.pk])), 2)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--verify", stdout=io.StringIO())
+
+        call_command("rebuild_rollups", "--user", str(self.user.pk), stdout=io.StringIO())
+        self.assertEqual(len(self.buckets()), 2)
+
+
+# ---------------------------------------------------------
+# Transaction list: keyset pagination and sparse fields
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class TransactionListTests(TestCase):
+    url = "/api/transactions/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("list-user", password="x")
+        rent = Category.objects.get(user=cls.user, name="Rent")
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=cls.user, type="expense", category=rent if n % 2 else None,
+                amount=Decimal(n + 1), date=date(2024, 1, 1 + n % 3),
+            )
+            for n in range(17)
+        )
+        # Ties on date and created_at leave only the id to order by
+        Transaction.objects.filter(date=date(2024, 1, 2)).update(
+            created_at=timezone.make_aware(datetime(2024, 1, 2, 9))
+        )
+        cls.ordered = list(
+            Transaction.objects.filter(user=cls.user)
+            .order_by("-date", "-created_at", "id")
+            .values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_pages_have_no_gaps_or_duplicates(self):
+        pages, url = [], f"{self.url}?page_size=4"
+        while url:
+            page = self.get(url)
+            pages.append([row["id"] for row in page["results"]])
+            url = page["next"]
+
+        self.assertEqual([len(ids) for ids in pages], [4, 4, 4, 4, 1])
+        self.assertEqual([pk for ids in pages for pk in ids], self.ordered)
+
+        # And back again from the second page
+        second = self.get(self.get(self.url, page_size=4)["next"])
+        first = self.get(second["previous"])
+        self.assertEqual([row["id"] for row in first["results"]], self.ordered[:4])
+        self.assertIsNone(first["previous"])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "not-a-cursor"}).status_code, 404)
+
+    def test_sparse_fields(self):
+        results = self.get(self.url, fields="id, amount,category_name")["results"]
+        self.assertEqual([row["id"] for row in results], self.ordered[:len(results)])
+        # category_name is left out for uncategorized rows, as in full rows
+        self.assertEqual({tuple(sorted(row)) for row in results}, {
+            ("amount", "category_name", "id"), ("amount", "id"),
+        })
+
+        response = self.client.get(self.url, {"fields": "id,bogus"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bogus", response.json()["fields"])
+
+
+# ---------------------------------------------------------
+# Budget vs expense over a month range
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class BudgetVsExpenseTests(TestCase):
+    url = "/api/analytics/budget-vs-expense/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("bve-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.utilities = Category.objects.get(user=cls.user, name="Utilities")
+        Budget.objects.create(user=cls.user, category=cls.rent, amount=Decimal("500.00"), month=date(2024, 2, 1))
+        for day, category, amount in [
+            (date(2024, 1, 3), cls.rent, "450.00"),
+            (date(2024, 2, 3), cls.rent, "480.50"),
+            (date(2024, 2, 9), cls.utilities, "60.25"),
+        ]:
+            Transaction.objects.create(
+                user=cls.user, type="expense", category=category, amount=Decimal(amount), date=day,
+            )
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def categories(self, response, month):
+        for result in response.json()["results"]:
+            if result["month"] == month:
+                return {c["category"]: (c["budget"], c["spent"]) for c in result["categories"]}
+
+    def test_every_month_of_the_range(self):
+        response = self.client.get(self.url, {"start": "2023-12", "end": "2024-03"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r["month"] for r in response.json()["results"]], ["2023-12", "2024-01", "2024-02", "2024-03"]
+        )
+        february = self.categories(response, "2024-02")
+        self.assertEqual(len(february), Category.objects.filter(user=self.user).count())
+        self.assertEqual(february["Rent"], (500.0, 480.5))
+        self.assertEqual(february["Utilities"], (0, 60.25))
+        self.assertEqual(self.categories(response, "2024-01")["Rent"], (0, 450.0))
+        self.assertEqual(self.categories(response, "2023-12")["Rent"], (0, 0))
+
+        # The single-month route returns that month's list
+        month = self.client.get(f"{self.url}2024/2/").json()
+        self.assertEqual({c["category"]: (c["budget"], c["spent"]) for c in month}, february)
+
+    def test_queries_do_not_grow_with_the_range(self):
+        with CaptureQueriesContext(connection) as one_month:
+            self.client.get(self.url, {"start": "2024-02", "end": "2024-02"})
+        # Categories, budgets and rollups (the async view also reads the data version)
+        self.assertEqual(len(one_month.captured_queries), 4 if settings.ASYNC_ANALYTICS else 3)
+
+        for n in range(5):
+            Category.objects.create(user=self.user, name=f"Extra {n}", type="expense")
+        with self.assertNumQueries(len(one_month.captured_queries)):
+            response = self.client.get(self.url, {"start": "2021-03", "end": "2024-02"})
+        self.assertEqual(len(response.json()["results"]), views.MAX_BUDGET_MONTHS)
+
+    def test_invalid_ranges(self):
+        for params in (
+            {"start": "2021-01", "end": "2024-01"},  # 37 months
+            {"start": "2024-03", "end": "2024-02"},
+            {"start": "2024-13", "end": "2024-12"},
+            {"start": "2024-01"},
+        ):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+# ---------------------------------------------------------
+# Streaming export
+# ---------------------------------------------------------
+class ExportTests(TestCase):
+    url = "/api/transactions/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("export-user", password="x")
+        other = User.objects.create_user("export-other", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.rows = [
+            Transaction.objects.create(
+                user=cls.user, type="expense", category=cls.rent if n % 2 else None,
+                amount=Decimal("12.5") + n, date=date(2024, 1, 1 + n), note=f"row, {n}" if n else None,
+            )
+            for n in range(5)
+        ]
+        Transaction.objects.create(user=other, type="expense", amount=Decimal("1.00"), date=date(2024, 1, 1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **kwargs):
+        response = self.client.get(self.url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, [chunk.decode() for chunk in response.streaming_content]
+
+    def test_csv(self):
+        with mock.patch.object(exports, "ROWS_PER_CHUNK", 2):
+            response, chunks = self.export(data={"format": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="transactions.csv"', response["Content-Disposition"])
+        # Two rows per chunk after the header's
+        self.assertEqual(len(chunks), 3)
+
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEqual(tuple(rows[0]), exports.EXPORT_FIELDS)
+        self.assertEqual([int(row["id"]) for row in rows], [t.pk for t in reversed(self.rows)])
+        newest = rows[0]
+        self.assertEqual(
+            (newest["date"], newest["amount"], newest["category_name"], newest["note"]),
+            ("2024-01-05", "16.50", "", "row, 4"),
+        )
+        self.assertEqual((rows[1]["category"], rows[1]["category_name"]), (str(self.rent.pk), "Rent"))
+
+    def test_ndjson(self):
+        response, chunks = self.export(HTTP_ACCEPT="application/x-ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1], {
+            "id": self.rows[0].pk, "date": "2024-01-01", "type": "expense", "category": None,
+            "category_name": None, "amount": "12.50", "note": None, "receipt": None,
+            "created_at": self.rows[0].created_at.isoformat(),
+        })
+
+    def test_filters_apply(self):
+        _, chunks = self.export(data={"format": "ndjson", "date_from": "2024-01-04"})
+        self.assertEqual(len("".join(chunks).splitlines()), 2)
+
+
+# ---------------------------------------------------------
+# Bulk import
+# ---------------------------------------------------------
+class ImportTests(TestCase):
+    url = "/api/transactions/import/"
+    rows = [
+        {"date": "2024-01-01", "type": "expense", "amount": "900", "category": "rent", "note": "january"},
+        {"date": "2024-13-01", "type": "expense", "amount": "-5"},
+        {"date": "2024-01-02", "type": "income", "amount": "10", "category": "Rent"},
+        {"date": "2024-01-03", "type": "Income", "amount": "1500.50"},
+        "not a row",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("import-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_valid_rows_are_imported_and_the_rest_reported(self):
+        response = self.client.post(self.url, self.rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["errors"], [
+            {"row": 1, "errors": {
+                "date": ["Date has wrong format. Use YYYY-MM-DD."],
+                "non_field_errors": ["Amount must be positive."],
+            }},
+            {"row": 2, "errors": {"category": ['No income category named "Rent".']}},
+            {"row": 4, "errors": {"non_field_errors": ["Expected an object."]}},
+        ])
+
+        rent, salary = Transaction.objects.filter(user=self.user).order_by("date")
+        self.assertEqual((rent.category, rent.amount, rent.note), (self.rent, Decimal("900"), "january"))
+        self.assertEqual((salary.type, salary.category, salary.note), ("income", None, None))
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+
+    def test_atomic_import_rejects_the_batch(self):
+        response = self.client.post(f"{self.url}?atomic=true", self.rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], 0)
+        self.assertEqual(len(response.data["errors"]), 3)
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        response = self.client.post(f"{self.url}?atomic=true", self.rows[:1], format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_csv_bodies_and_uploads(self):
+        body = "Date,Type,Amount,Category,Note\n2024-02-01,expense,12.30,Rent,\"a, b\"\n"
+        response = self.client.generic("POST", self.url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.objects.get(user=self.user).note, "a, b")
+
+        upload = SimpleUploadedFile("ledger.csv", ("\ufeff" + body).encode(), content_type="text/csv")
+        response = self.client.post(self.url, {"file": upload}, format="multipart")
+        self.assertEqual(response.data["created"], 1)
+
+    def test_limits(self):
+        with mock.patch.object(importer, "MAX_IMPORT_ROWS", 2):
+            response = self.client.post(self.url, self.rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"rows": "x"}, format="json").status_code, 400)
+
+        # One INSERT per IMPORT_BATCH_SIZE rows
+        with mock.patch.object(importer, "IMPORT_BATCH_SIZE", 2):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(self.url, [self.rows[0]] * 5, format="json")
+        self.assertEqual(response.data["created"], 5)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "tracker_transaction"')]
+        self.assertEqual(len(inserts), 3)
+
+
+# ---------------------------------------------------------
+# Analytics cache and conditional GETs
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class AnalyticsCacheTests(TestCase):
+    url = "/api/analytics/category-totals/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cache-user", password="x")
+        cls.other = User.objects.create_user("cache-other", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.txn = Transaction.objects.create(
+            user=cls.user, type="expense", category=cls.rent, amount=Decimal("100.00"), date=date(2024, 1, 5),
+        )
+
+    def setUp(self):
+        # Ids and versions repeat across rolled-back tests
+        caching.get_cache().clear()
+        ledger.cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_hit_until_the_next_write(self):
+        response = self.client.get(self.url, {"type": "expense", "date_from": "2024-01-01"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        payload = response.json()
+
+        # Equivalent query strings share the entry
+        response = self.client.get(f"{self.url}?date_from=2024-01-01&type=expense&date_to=")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json(), payload)
+
+        other = APIClient()
+        other.force_authenticate(self.other)
+        response = other.get(self.url, {"type": "expense", "date_from": "2024-01-01"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotEqual(response.json(), payload)
+
+        Transaction.objects.create(
+            user=self.user, type="expense", category=self.rent, amount=Decimal("5.00"), date=date(2024, 1, 6),
+        )
+        response = self.client.get(self.url, {"type": "expense", "date_from": "2024-01-01"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotEqual(response.json(), payload)
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            response = self.client.get(self.url, {"date_from": "x"})
+            self.assertEqual((response.status_code, response["X-Cache"]), (400, "MISS"))
+
+    def test_rollup_rebuild_invalidates(self):
+        url = "/api/analytics/monthly-summary/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        MonthlyRollup.objects.filter(user=self.user).update(total=1)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        call_command("rebuild_rollups", "--user", str(self.user.pk), stdout=io.StringIO())
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["expense_total"], 100.0)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("etag-user", password="x")
+        cls.txn = Transaction.objects.create(
+            user=cls.user, type="expense", amount=Decimal("10.00"), date=date(2024, 1, 5),
+        )
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified_until_a_write(self):
+        for url in ("/api/transactions/", "/api/analytics/monthly-summary/", "/api/categories/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+            # Answered from the data version alone
+            self.assertEqual(len(ctx.captured_queries), 1)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"x", W/{etag}').status_code, 304)
+
+            self.txn.note = f"seen {url}"
+            self.txn.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_tags_follow_url_and_format(self):
+        url = "/api/transactions/"
+        tags = {
+            self.client.get(url)["ETag"],
+            self.client.get(url, {"type": "income"})["ETag"],
+            self.client.get(url, HTTP_ACCEPT="text/html")["ETag"],
+        }
+        self.assertEqual(len(tags), 3)
+        self.assertNotIn("ETag", self.client.post(url, {}, format="json"))
+
+
+# ---------------------------------------------------------
+# Transaction row serializer
+# ---------------------------------------------------------
+class TransactionRowSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("rows-user", password="x")
+        rent = Category.objects.get(user=cls.user, name="Rent")
+        rule = RecurringRule.objects.create(
+            user=cls.user, type="expense", category=rent, amount=Decimal("900"),
+            frequency="monthly", start_date=date(2024, 1, 1),
+        )
+        Transaction.objects.bulk_create([
+            Transaction(user=cls.user, type="expense", category=rent, amount=Decimal("5"), date=date(2024, 1, 1)),
+            Transaction(user=cls.user, type="income", amount=Decimal("1234.5"), date=date(2024, 1, 2), note="é \" ✓"),
+            Transaction(
+                user=cls.user, type="expense", category=rent, amount=Decimal("0.01"), date=date(2024, 1, 3),
+                receipt="receipts/a b.jpg", receipt_display="receipts/display/a.jpg",
+                receipt_thumbnail="receipts/thumbs/a.jpg", receipt_status="done", recurring_rule=rule,
+            ),
+        ])
+        # Whole seconds: isoformat() drops the fraction
+        Transaction.objects.filter(date=date(2024, 1, 2)).update(
+            created_at=timezone.make_aware(datetime(2024, 1, 2, 23, 30))
+        )
+
+    def render_both(self, fields=None):
+        request = APIRequestFactory().get("/api/transactions/")
+        queryset = Transaction.objects.filter(user=self.user).order_by("id")
+        renderer = JSONRenderer()
+        expected = renderer.render(TransactionSerializer(
+            queryset.select_related("category"), many=True, detail=False, fields=fields,
+            context={"request": request},
+        ).data)
+        rows = TransactionRowSerializer(request, fields=fields)
+        return expected, renderer.render(rows.render(queryset.values(*rows.values())))
+
+    def test_same_json_as_transaction_serializer(self):
+        self.assertTrue(TransactionRowSerializer.supported())
+        for zone in ("UTC", "America/New_York", "Asia/Kolkata"):
+            with timezone.override(zone):
+                expected, fast = self.render_both()
+                self.assertEqual(fast, expected, zone)
+        self.assertIn(b'"receipt_thumbnail":"http://testserver/media/receipts/thumbs/a.jpg"', fast)
+        self.assertNotIn(b'"category_name":null', fast)
+
+    def test_same_json_for_field_subsets(self):
+        expected, fast = self.render_both(["amount", "category_name", "created_at", "id"])
+        self.assertEqual(fast, expected)
+
+
+# ---------------------------------------------------------
+# Default categories
+# ---------------------------------------------------------
+class SeedCategoriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"seed-user-{n}", password="x") for n in range(5)]
+
+    def seed(self):
+        out = io.StringIO()
+        call_command("seed_categories", batch_size=2, stdout=out)
+        return out.getvalue().splitlines()
+
+    def counts(self):
+        return {
+            user.pk: Category.objects.filter(user=user).count() for user in self.users
+        }
+
+    def test_batches_seed_every_user_once(self):
+        Category.objects.filter(user__in=self.users).delete()
+        Category.objects.create(user=self.users[0], name="Rent", type="expense")
+
+        lines = self.seed()
+        expected = {user.pk: len(defaults.DEFAULT_CATEGORIES) for user in self.users}
+        self.assertEqual(self.counts(), expected)
+        # One progress line per batch of two users
+        total = User.objects.count()
+        progress = [line for line in lines if line.startswith("Seeded ")]
+        self.assertEqual(len(progress), -(-total // 2))
+        self.assertTrue(progress[-1].startswith(f"Seeded {total}/{total} users"))
+
+        # A re-run inserts nothing
+        before = set(Category.objects.values_list("pk", flat=True))
+        self.seed()
+        self.assertEqual(set(Category.objects.values_list("pk", flat=True)), before)
+        self.assertEqual(self.counts(), expected)
+
+    def test_missing_defaults_are_restored(self):
+        Category.objects.filter(user=self.users[1], name="Medical").delete()
+        others = Category.objects.exclude(user=self.users[1]).count()
+        self.seed()
+        self.assertTrue(Category.objects.filter(user=self.users[1], name="Medical").exists())
+        self.assertEqual(Category.objects.exclude(user=self.users[1]).count(), others)
+
+
+# ---------------------------------------------------------
+# Synthetic data and endpoint benchmarks
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class SyntheticDataTests(TestCase):
+    def generate(self, prefix):
+        call_command(
+            "generate_data", users=2, transactions=40, months=6, categories=3, budget_months=2,
+            seed=7, prefix=prefix, stdout=io.StringIO(),
+        )
+        return list(User.objects.filter(username__startswith=f"{prefix}-").order_by("pk"))
+
+    def dataset(self, user):
+        return (
+            list(
+                Transaction.objects.filter(user=user)
+                .order_by("date", "type", "amount", "note")
+                .values_list("type", "category__name", "amount", "date", "note")
+            ),
+            sorted(Budget.objects.filter(user=user).values_list("category__name", "month", "amount")),
+        )
+
+    def test_generate_data(self):
+        users = self.generate("synth-a")
+        self.assertEqual(len(users), 2)
+        for user in users:
+            # 34 expenses plus a salary for each of the 7 months touched
+            self.assertEqual(Transaction.objects.filter(user=user).count(), 41)
+            self.assertEqual(Transaction.objects.filter(user=user, type="income").count(), 7)
+            self.assertEqual(Budget.objects.filter(user=user).count(), 6)
+            self.assertEqual(RecurringRule.objects.filter(user=user).count(), 1)
+        # Derived state is built as the rows would have built it
+        self.assertEqual(rollups.verify([user.pk for user in users]), [])
+        self.assertEqual(budgets.reconcile([user.pk for user in users], repair=False), [])
+
+        # The same seed gives the same data
+        again = self.generate("synth-b")
+        self.assertEqual([self.dataset(user) for user in again], [self.dataset(user) for user in users])
+        self.assertNotEqual(self.dataset(users[0]), self.dataset(users[1]))
+
+    def test_every_route_has_a_benchmark(self):
+        names = [
+            name for name in url_names()
+            if name.split(":")[0] not in benchmark_endpoints.SKIPPED_NAMESPACES
+        ]
+        self.assertEqual([name for name in names if name not in benchmark_endpoints.ROUTES], [])
+
+    def test_benchmark_endpoints(self):
+        output = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "bench.json")
+        options = dict(
+            sizes="30", requests=2, warmup=0, background_users=1,
+            routes="monthly,transaction-list,sync", output=output, stdout=io.StringIO(),
+        )
+        # Already on the test database
+        with mock.patch.object(benchmark_endpoints, "scratch_database", contextlib.nullcontext):
+            call_command("benchmark_endpoints", **options)
+            with open(output) as fh:
+                report = json.load(fh)
+            out = io.StringIO()
+            call_command("benchmark_endpoints", **{**options, "compare": output, "stdout": out})
+
+        self.assertEqual(report["meta"]["sizes"], [30])
+        results = {row["route"]: row for row in report["results"]}
+        self.assertEqual(sorted(results), ["monthly", "sync", "transaction-list"])
+        for row in results.values():
+            self.assertEqual((row["status"], row["requests"]), (200, 2))
+            self.assertGreater(row["queries"], 0)
+            self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+        self.assertIn(f"Compared with {output}", out.getvalue())
+
+
+# ---------------------------------------------------------
+# Performance instrumentation
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("perf-user", password="x")
+        cls.admin = User.objects.create_user("perf-admin", password="x", is_staff=True)
+        Transaction.objects.create(
+            user=cls.user, type="expense", amount=Decimal("10.00"), date=date(2024, 1, 5),
+        )
+
+    def setUp(self):
+        authentication.user_cache.clear()
+        instrumentation.stats.reset()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            entries[name] = dict(param.split("=", 1) for param in params)
+        return entries
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/transactions/")
+        self.assertEqual(response.status_code, 200)
+
+        timing = self.server_timing(response)
+        self.assertEqual(timing["db"]["desc"], f'"{len(ctx.captured_queries)} queries"')
+        self.assertEqual(list(timing), ["db", "auth", "render", "serialize", "view", "total"])
+        durations = {name: float(params["dur"]) for name, params in timing.items()}
+        self.assertTrue(all(ms >= 0 for ms in durations.values()))
+        self.assertGreaterEqual(durations["total"], durations["view"])
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_https_redirects_are_not_timed(self):
+        response = APIClient().get("/api/transactions/")
+        self.assertEqual(response.status_code, 301)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(instrumentation.stats.snapshot(), {})
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertIsNone(instrumentation.percentile([], 50))
+        self.assertEqual(instrumentation.percentile([7], 99), 7)
+        self.assertEqual(instrumentation.percentile(values, 0), 1)
+        self.assertEqual(instrumentation.percentile(values, 50), 50)
+        self.assertEqual(instrumentation.percentile(values, 95), 95)
+        self.assertEqual(instrumentation.percentile(values, 100), 100)
+        self.assertEqual(instrumentation.percentile([1, 2, 3], 50), 2)
+
+    @override_settings(PERF_STATS_WINDOW=3)
+    def test_route_stats_keep_a_window(self):
+        stats = instrumentation.RouteStats()
+        for n in range(1, 6):
+            stats.record("route", {"total_ms": n * 10.0, "db_ms": float(n), "queries": n})
+
+        route = stats.snapshot()["route"]
+        self.assertEqual(route["count"], 5)
+        self.assertEqual(route["window"], 3)
+        # Only the last three requests: 30, 40 and 50 ms
+        self.assertEqual((route["p50_ms"], route["p99_ms"]), (40.0, 50.0))
+        self.assertEqual((route["db_p50_ms"], route["mean_queries"], route["max_queries"]), (4.0, 4, 5))
+
+    def test_perf_stats_endpoint(self):
+        self.client.get("/api/transactions/")
+        self.assertEqual(self.client.get("/api/perf/").status_code, 403)
+        self.assertEqual(self.client.delete("/api/perf/").status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        data = self.client.get("/api/perf/").json()
+        self.assertEqual(data["window"], settings.PERF_STATS_WINDOW)
+        self.assertEqual(data["routes"]["transaction-list"]["count"], 1)
+        # The forbidden requests are recorded too
+        self.assertEqual(data["routes"]["perf-stats"]["count"], 2)
+
+        self.assertEqual(self.client.delete("/api/perf/").status_code, 204)
+        self.assertEqual(list(self.client.get("/api/perf/").json()["routes"]), ["perf-stats"])
+
+
+# ---------------------------------------------------------
+# Analytics dashboard
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class DashboardTests(TestCase):
+    url = "/api/analytics/dashboard/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("dashboard-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.salary = Category.objects.get(user=cls.user, name="Salary")
+        cls.this_month = date.today().replace(day=1)
+        for months_ago in range(3):
+            cls.add_month(cls.this_month - relativedelta(months=months_ago))
+        Transaction.objects.create(user=cls.user, type="expense", amount=Decimal("3.10"), date=cls.this_month)
+        Budget.objects.create(user=cls.user, category=cls.rent, amount=Decimal("900.00"), month=cls.this_month)
+
+    @classmethod
+    def add_month(cls, month):
+        Transaction.objects.create(
+            user=cls.user, type="expense", category=cls.rent, amount=Decimal("812.45"), date=month,
+        )
+        Transaction.objects.create(
+            user=cls.user, type="income", category=cls.salary, amount=Decimal("2500.00"), date=month,
+        )
+
+    def setUp(self):
+        caching.get_cache().clear()
+        ledger.cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_payload_matches_the_individual_endpoints(self):
+        dashboard = self.client.get(self.url).json()
+        month = self.this_month
+        self.assertEqual(dashboard, {
+            "monthly": self.client.get("/api/analytics/monthly/").json(),
+            "monthly_summary": self.client.get("/api/analytics/monthly-summary/").json(),
+            "category_totals": self.client.get("/api/analytics/category-totals/").json(),
+            "monthly_category": self.client.get("/api/analytics/monthly-category/").json(),
+            "budget_vs_expense": self.client.get(
+                f"/api/analytics/budget-vs-expense/{month.year}/{month.month}/"
+            ).json(),
+        })
+        self.assertEqual(dashboard["monthly"]["expense_total"], 815.55)
+
+    def test_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Data version, rollups, categories, budgets
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+        for months_ago in range(3, 15):
+            self.add_month(self.this_month - relativedelta(months=months_ago))
+        Category.objects.create(user=self.user, name="Travel", type="expense")
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+# ---------------------------------------------------------
+# Columnar ledger cache
+# ---------------------------------------------------------
+# Commit callbacks run here; keep receipt workers out of it
+@override_settings(RECEIPT_WORKERS=0)
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ledger-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.utilities = Category.objects.get(user=cls.user, name="Utilities")
+        cls.salary = Category.objects.get(user=cls.user, name="Salary")
+        categories = [cls.rent, cls.utilities, None]
+        # Amounts that do not add up exactly in binary floating point
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=cls.user, type="expense", category=categories[n % 3],
+                amount=Decimal("0.10") + Decimal(n % 7) / 100, date=date(2024, 1 + n % 4, 1 + n % 28),
+            )
+            for n in range(300)
+        )
+        Transaction.objects.create(
+            user=cls.user, type="income", category=cls.salary, amount=Decimal("2500.33"), date=date(2024, 2, 1),
+        )
+
+    def setUp(self):
+        # Ids and versions repeat across rolled-back tests
+        ledger.cache.clear()
+
+    def ledger_rows(self, *filters):
+        return ledger.monthly_rows(self.user, caching.current_version(self.user.pk), *filters)
+
+    def expected(self, ttype=None, date_from=None, date_to=None):
+        queryset = Transaction.objects.filter(user=self.user)
+        if ttype:
+            queryset = queryset.filter(type=ttype)
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        totals = {}
+        for row in rollups.aggregate_transactions([self.user.pk]).filter(pk__in=queryset.values("pk")):
+            # SQLite sums decimals as floats; to the cent they must agree
+            total = Decimal(row["total"]).quantize(Decimal("0.01"))
+            totals[row["month"], row["type"], row["category_id"]] = (total, row["count"])
+        return totals
+
+    def assertMatchesDatabase(self, *filters):
+        rows = self.ledger_rows(*filters)
+        self.assertEqual(
+            {(r["month"], r["type"], r["category_id"]): (r["total"], r["count"]) for r in rows},
+            self.expected(*filters),
+        )
+        names = {c.pk: c.name for c in Category.objects.filter(user=self.user)}
+        self.assertEqual([r["category__name"] for r in rows], [names.get(r["category_id"]) for r in rows])
+        return rows
+
+    def test_matches_database_aggregation(self):
+        rows = self.assertMatchesDatabase()
+        self.assertEqual(sum(r["count"] for r in rows), 301)
+        self.assertEqual(sum(r["total"] for r in rows if r["type"] == "expense"), Decimal("38.97"))
+        self.assertMatchesDatabase("expense")
+        self.assertMatchesDatabase(None, date(2024, 1, 10), date(2024, 3, 20))
+        self.assertMatchesDatabase("income", date(2024, 2, 1), date(2024, 2, 1))
+        self.assertEqual(self.ledger_rows("transfer"), [])
+
+    @contextmanager
+    def patched(self):
+        """
+        Run a write, then check the cached ledger was patched, not
+        reloaded, and still matches the database.
+        """
+        patches = ledger.cache.patches
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        self.assertGreater(ledger.cache.patches, patches)
+        misses = ledger.cache.misses
+        self.assertMatchesDatabase()
+        self.assertEqual(ledger.cache.misses, misses)
+
+    def test_writes_patch_the_cached_ledger(self):
+        self.assertMatchesDatabase()
+        txn = Transaction.objects.filter(user=self.user, category=self.rent).first()
+
+        with self.patched():
+            Transaction.objects.create(
+                user=self.user, type="expense", category=self.rent, amount=Decimal("7.77"), date=date(2024, 6, 1),
+            )
+        txn.amount, txn.category = Decimal("1.01"), self.utilities
+        with self.patched():
+            txn.save()
+        self.rent.name = "Housing costs"
+        with self.patched():
+            self.rent.save()
+        with self.patched():
+            self.utilities.delete()
+        txn.refresh_from_db()
+        with self.patched():
+            txn.delete()
+
+    def test_missed_writes_reload(self):
+        self.assertMatchesDatabase()
+        Transaction.objects.filter(user=self.user, type="income").update(amount=Decimal("1.00"))
+        caching.bump_version(self.user.pk)
+        misses = ledger.cache.misses
+        rows = self.assertMatchesDatabase("income")
+        self.assertEqual(ledger.cache.misses, misses + 1)
+        self.assertEqual(rows[0]["total"], Decimal("1.00"))
+
+
+# ---------------------------------------------------------
+# Async analytics views
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class AsyncAnalyticsViewTests(TransactionTestCase):
+    """
+    The async views are called directly: the URLconf serves them only with
+    ASYNC_ANALYTICS on. Committed data (TransactionTestCase), so their
+    reads run concurrently on other connections.
+    """
+    def setUp(self):
+        caching.get_cache().clear()
+        ledger.cache.clear()
+        self.user = User.objects.create_user("async-user", password="x")
+        rent = Category.objects.get(user=self.user, name="Rent")
+        salary = Category.objects.get(user=self.user, name="Salary")
+        this_month = date.today().replace(day=1)
+        for months_ago in range(4):
+            day = this_month - relativedelta(months=months_ago)
+            Transaction.objects.create(
+                user=self.user, type="expense", category=rent, amount=Decimal("12.34"), date=day,
+            )
+            Transaction.objects.create(
+                user=self.user, type="income", category=salary, amount=Decimal("100.00"),
+                date=day + timedelta(days=10),
+            )
+        Budget.objects.create(user=self.user, category=rent, amount=Decimal("50.00"), month=this_month)
+        self.auth = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def endpoints(self):
+        this_month = date.today().replace(day=1)
+        first = this_month - relativedelta(months=3)
+        # A range edge inside a month adds the raw-transaction query
+        mid_month = (first + timedelta(days=5)).isoformat()
+        return [
+            ("monthly-summary", {}, views.MonthlySummaryView, analytics_views.MonthlySummaryView),
+            ("monthly", {}, views.MonthlyTotalsView, analytics_views.MonthlyTotalsView),
+            ("category-totals", {"date_from": mid_month}, views.CategoryAnalyticsView,
+             analytics_views.CategoryAnalyticsView),
+            ("monthly-category", {"type": "income"}, views.MonthlyCategoryAnalyticsView,
+             analytics_views.MonthlyCategoryAnalyticsView),
+            ("dashboard", {}, views.DashboardView, analytics_views.DashboardView),
+            ("forecast", {"months": "2"}, views.ForecastView, analytics_views.ForecastView),
+            ("budget-vs-expense", {"start": first.strftime("%Y-%m"), "end": this_month.strftime("%Y-%m")},
+             None, analytics_views.BudgetVsExpenseView),
+        ]
+
+    def sync_get(self, view, url, params, **headers):
+        handler = views.budget_vs_expense if view is None else view.as_view()
+        request = APIRequestFactory().get(url, params, headers={**self.auth, **headers})
+        response = handler(request)
+        response.render()
+        return response
+
+    def async_get(self, view, url, params, auth=True, **headers):
+        request = AsyncRequestFactory().get(url, params, headers={**(self.auth if auth else {}), **headers})
+        return async_to_sync(view.as_view())(request)
+
+    def test_payloads_match_the_sync_views(self):
+        main = threading.get_ident()
+        threads = set()
+        fetch = analytics.fetch
+
+        def recording(queryset):
+            threads.add(threading.get_ident())
+            return fetch(queryset)
+
+        for name, params, sync_view, async_view in self.endpoints():
+            url = f"/api/analytics/{name}/"
+            with mock.patch.object(analytics, "fetch", recording):
+                response = self.async_get(async_view, url, params)
+            self.assertEqual(response.status_code, 200, name)
+            caching.get_cache().clear()
+            expected = self.sync_get(sync_view, url, params)
+            self.assertEqual(response.content, expected.content, name)
+            self.assertEqual(response.get("ETag"), expected.get("ETag"), name)
+            caching.get_cache().clear()
+
+        # Reads ran on worker threads, not the request's
+        self.assertTrue(threads)
+        self.assertNotIn(main, threads)
+
+    def test_unauthenticated(self):
+        url = "/api/analytics/monthly-summary/"
+        response = self.async_get(analytics_views.MonthlySummaryView, url, {}, auth=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+        expected = views.MonthlySummaryView.as_view()(APIRequestFactory().get(url))
+        expected.render()
+        self.assertEqual(response.content, expected.content)
+
+    def test_conditional_get_and_shared_cache(self):
+        url = "/api/analytics/monthly-summary/"
+        view = analytics_views.MonthlySummaryView
+        first = self.async_get(view, url, {})
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        # The sync view answers from the entry the async one stored
+        response = self.sync_get(views.MonthlySummaryView, url, {})
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.content, first.content)
+
+        response = self.async_get(view, url, {}, If_None_Match=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+
+        Transaction.objects.create(
+            user=self.user, type="expense", amount=Decimal("1.00"), date=date(2020, 1, 1),
+        )
+        response = self.async_get(view, url, {}, If_None_Match=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.sync_get(views.MonthlySummaryView, url, {})["X-Cache"], "HIT")
+
+
+# ---------------------------------------------------------
+# Batch mutations
+# ---------------------------------------------------------
+class BatchMutationTests(TestCase):
+    url = "/api/transactions/batch/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("batch-user", password="x")
+        cls.other = User.objects.create_user("batch-other", password="x")
+        cls.food, cls.rent = Category.objects.filter(user=cls.user, type="expense")[:2]
+        cls.salary = Category.objects.filter(user=cls.user, type="income").first()
+        cls.txns = [
+            Transaction.objects.create(
+                user=cls.user, type="expense", category=cls.food,
+                amount=Decimal(n + 1), date=date(2024, 1 + n % 3, 1),
+            )
+            for n in range(6)
+        ]
+        cls.foreign = Transaction.objects.create(
+            user=cls.other, type="expense", amount=Decimal("1.00"), date=date(2024, 1, 1),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_operations_get_their_own_results(self):
+        a, b, c, d, e, _ = self.txns
+        response = self.client.post(self.url, {"operations": [
+            {"op": "update", "id": a.pk, "fields": {"category": self.rent.pk}},
+            {"op": "update", "id": b.pk, "fields": {"category": self.rent.pk}},
+            {"op": "update", "id": c.pk, "fields": {"amount": "42.50", "note": "fixed"}},
+            {"op": "delete", "id": d.pk},
+            {"op": "update", "id": e.pk, "fields": {"category": self.salary.pk}},
+            {"op": "delete", "id": self.foreign.pk},
+            {"op": "delete", "id": a.pk},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["applied"], 4)
+        self.assertEqual([r["status"] for r in response.data["results"]], [200, 200, 200, 204, 400, 404, 400])
+
+        self.assertEqual(Transaction.objects.filter(category=self.rent).count(), 2)
+        c.refresh_from_db()
+        self.assertEqual((c.amount, c.note), (Decimal("42.50"), "fixed"))
+        self.assertFalse(Transaction.objects.filter(pk=d.pk).exists())
+        self.assertTrue(Transaction.objects.filter(pk=self.foreign.pk).exists())
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+
+    def test_atomic_batch_applies_nothing_on_failure(self):
+        a, b = self.txns[:2]
+        response = self.client.post(self.url + "?atomic=true", {"operations": [
+            {"op": "delete", "id": a.pk},
+            {"op": "update", "id": b.pk, "fields": {"amount": "-1"}},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r["status"] for r in response.data["results"]], [424, 400])
+        self.assertTrue(Transaction.objects.filter(pk=a.pk).exists())
+
+    def test_one_statement_per_field_set(self):
+        operations = [{"op": "update", "id": t.pk, "fields": {"category": self.rent.pk}} for t in self.txns[:3]]
+        operations += [{"op": "delete", "id": t.pk} for t in self.txns[3:]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {"operations": operations}, format="json")
+        self.assertEqual(response.data["applied"], 6)
+
+        writes = [
+            q["sql"].split()[0] for q in ctx.captured_queries
+            if q["sql"].startswith(('UPDATE "tracker_transaction"', 'DELETE FROM "tracker_transaction"'))
+        ]
+        # The last UPDATE stamps change_seq on every updated row (delta sync)
+        self.assertEqual(writes, ["UPDATE", "DELETE", "UPDATE"])
+
+    def test_deletes_skip_the_per_row_signals(self):
+        doomed = self.txns[:3]
+        with mock.patch.object(batch, "BATCH_SIZE", 2), CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {"operations": [
+                {"op": "delete", "id": t.pk} for t in doomed
+            ]}, format="json")
+        self.assertEqual(response.data["applied"], 3)
+
+        deletes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('DELETE FROM "tracker_transaction"')]
+        self.assertEqual(len(deletes), 2)
+        # Deletions are accounted for once, by transactions_bulk_changed
+        self.assertFalse(Transaction.objects.filter(pk__in=[t.pk for t in doomed]).exists())
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+        tombstones = SyncTombstone.objects.filter(user=self.user, model="transaction")
+        self.assertEqual(sorted(tombstones.values_list("object_id", flat=True)), sorted(t.pk for t in doomed))
+
+    def test_deletes_use_the_collector_when_needed(self):
+        # Only unconstrained DO_NOTHING keys point at Transaction today
+        self.assertTrue(batch.raw_delete_is_safe())
+
+        a, b, c = self.txns[:3]
+        with mock.patch.object(batch, "raw_delete_is_safe", return_value=False):
+            response = self.client.post(self.url, {"operations": [
+                {"op": "delete", "id": a.pk},
+                {"op": "delete", "id": b.pk},
+                {"op": "update", "id": c.pk, "fields": {"amount": "9.99"}},
+            ]}, format="json")
+        self.assertEqual(response.data["applied"], 3)
+
+        # Deletions are accounted for once, by the per-row signals
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+        tombstones = SyncTombstone.objects.filter(user=self.user, model="transaction")
+        self.assertEqual(sorted(tombstones.values_list("object_id", flat=True)), [a.pk, b.pk])
+
+
+# ---------------------------------------------------------
+# Delta sync
+# ---------------------------------------------------------
+class SyncTests(TestCase):
+    url = "/api/sync/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("sync-user", password="x")
+        cls.food, cls.rent = Category.objects.filter(user=cls.user, type="expense")[:2]
+        cls.txns = [
+            Transaction.objects.create(
+                user=cls.user, type="expense", category=cls.food,
+                amount=Decimal(n + 1), date=date(2024, 1, n + 1),
+            )
+            for n in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {"since": token} if token is not None else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, data, key):
+        return sorted(row["id"] for row in data[key]["changed"])
+
+    def test_full_sync_then_deltas(self):
+        data = self.sync()
+        self.assertTrue(data["full"])
+        self.assertEqual(self.ids(data, "transactions"), sorted(t.pk for t in self.txns))
+        self.assertEqual(len(data["categories"]["changed"]), Category.objects.filter(user=self.user).count())
+
+        token = data["token"]
+        data = self.sync(token)
+        self.assertFalse(data["full"])
+        self.assertEqual(self.ids(data, "transactions"), [])
+
+        a, b = self.txns[:2]
+        a.note = "edited"
+        a.save()
+        deleted_pk = b.pk
+        b.delete()
+        budget = Budget.objects.create(user=self.user, category=self.rent, amount=100, month=date(2024, 1, 1))
+
+        data = self.sync(token)
+        self.assertEqual(self.ids(data, "transactions"), [a.pk])
+        self.assertEqual(data["transactions"]["changed"][0]["note"], "edited")
+        self.assertEqual(data["transactions"]["deleted"], [deleted_pk])
+        self.assertEqual(self.ids(data, "budgets"), [budget.pk])
+        self.assertEqual(self.sync(data["token"])["transactions"], {"changed": [], "deleted": []})
+
+    def test_bulk_writes_and_category_deletes_are_synced(self):
+        token = self.sync()["token"]
+        a, b, c = self.txns[:3]
+        self.client.post("/api/transactions/batch/", {"operations": [
+            {"op": "update", "id": a.pk, "fields": {"category": self.rent.pk}},
+            {"op": "delete", "id": b.pk},
+        ]}, format="json")
+        self.client.post("/api/transactions/import/", [
+            {"date": "2024-02-01", "type": "expense", "amount": "3.00"},
+        ], format="json")
+
+        data = self.sync(token)
+        imported = Transaction.objects.get(user=self.user, date=date(2024, 2, 1))
+        self.assertEqual(self.ids(data, "transactions"), [a.pk, imported.pk])
+        self.assertEqual(data["transactions"]["deleted"], [b.pk])
+
+        token = data["token"]
+        food_pk = self.food.pk
+        self.food.delete()
+        data = self.sync(token)
+        self.assertEqual(data["categories"]["deleted"], [food_pk])
+        self.assertEqual(self.ids(data, "transactions"), [c.pk, self.txns[3].pk, self.txns[4].pk])
+        self.assertTrue(all("category_name" not in row for row in data["transactions"]["changed"]))
+
+    def test_reseeded_categories_are_synced(self):
+        rent = Category.objects.get(user=self.user, name="Rent")
+        rent_pk = rent.pk
+        rent.delete()
+        token = self.sync()["token"]
+
+        call_command("seed_categories", stdout=io.StringIO())
+        data = self.sync(token)
+        rent = Category.objects.get(user=self.user, name="Rent")
+        self.assertEqual(self.ids(data, "categories"), [rent.pk])
+        self.assertNotEqual(rent.pk, rent_pk)
+        self.assertEqual(self.sync(data["token"])["categories"], {"changed": [], "deleted": []})
+
+    def test_stale_and_invalid_tokens(self):
+        token = int(self.sync()["token"])
+        self.txns[0].delete()
+        SyncTombstone.objects.update(deleted_at=timezone.make_aware(datetime(2000, 1, 1)))
+        sync.prune(days=30)
+
+        self.assertEqual(SyncTombstone.objects.count(), 0)
+        self.assertTrue(self.sync(token)["full"])
+        self.assertTrue(self.sync(token + 1000)["full"])
+        self.assertEqual(self.client.get(self.url, {"since": "abc"}).status_code, 400)
+
+    def test_user_delete_leaves_no_tombstones(self):
+        self.user.delete()
+        self.assertFalse(SyncTombstone.objects.exists())
+        self.assertFalse(UserDataVersion.objects.filter(user_id=self.user.pk).exists())
+
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class VersionVisibilityTests(TransactionTestCase):
+    """
+    A bumped version must not be visible to other connections before the
+    write it stands for commits: a read in between would cache the old
+    data under the new version, and sync would move past the new row.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user("visibility-user", password="x")
+        self.rent = Category.objects.get(user=self.user, name="Rent")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def version_elsewhere(self):
+        seen = []
+
+        def read():
+            # A thread has its own connection, like a concurrent request
+            try:
+                seen.append(caching.current_version(self.user.pk))
+            except OperationalError:
+                # SQLite's shared-cache test database locks the written table
+                seen.append(None)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        return seen[0]
+
+    def test_versions_commit_with_their_writes(self):
+        bump = caching.bump_version
+        bumps = []
+
+        def interleaved(user_id, **kwargs):
+            version = bump(user_id, **kwargs)
+            bumps.append((version, self.version_elsewhere()))
+            return version
+
+        with mock.patch.object(caching, "bump_version", interleaved):
+            response = self.client.post("/api/transactions/", {
+                "type": "expense", "category": self.rent.pk, "amount": "15.00", "date": "2024-03-01",
+            }, format="json")
+            self.assertEqual(response.status_code, 201)
+            txn = Transaction.objects.get(pk=response.data["id"])
+            txn.amount = Decimal("20.00")
+            txn.save()
+            self.rent.name = "Lodging"
+            self.rent.save()
+
+        self.assertEqual(len(bumps), 3)
+        for version, seen in bumps:
+            self.assertNotEqual(seen, version)
+        self.assertEqual(Transaction.objects.get(pk=txn.pk).change_seq, bumps[1][0])
+
+
+# ---------------------------------------------------------
+# Search
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class SearchTests(TestCase):
+    url = "/api/transactions/search/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("search-user", password="x")
+        cls.other = User.objects.create_user("search-other", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.medical = Category.objects.get(user=cls.user, name="Medical")
+
+        def add(note, category=None, day=1, user=None):
+            return Transaction.objects.create(
+                user=user or cls.user, type="expense", category=category,
+                amount=Decimal("10.00"), date=date(2024, 3, day), note=note,
+            )
+
+        cls.uber = add("Uber ride to the airport", day=5)
+        cls.uber_eats = add("uber eats dinner", day=6)
+        cls.pharmacy = add("pharmacy", cls.medical, day=7)
+        cls.march_rent = add(None, cls.rent, day=1)
+        cls.foreign = add("uber ride", user=cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, q, **params):
+        return [row["id"] for row in self.search(q, **params)["results"]]
+
+    def test_matches_note_and_category_of_own_transactions(self):
+        self.assertEqual(sorted(self.ids("uber")), sorted([self.uber.pk, self.uber_eats.pk]))
+        self.assertEqual(self.ids("rent"), [self.march_rent.pk])
+        self.assertEqual(self.ids("medical pharmacy"), [self.pharmacy.pk])
+        self.assertEqual(self.ids("nothing like this"), [])
+        self.assertEqual(self.search("")["count"], 0)
+
+    def test_every_word_must_match_as_a_prefix(self):
+        self.assertEqual(self.ids("uber ride"), [self.uber.pk])
+        self.assertEqual(self.ids("ub rid"), [self.uber.pk])
+        self.assertEqual(self.ids("Airport!"), [self.uber.pk])
+
+    def test_filters(self):
+        self.assertEqual(self.ids("uber", date_from="2024-03-06"), [self.uber_eats.pk])
+        self.assertEqual(self.ids("uber", type="income"), [])
+        response = self.client.get(self.url, {"q": "uber", "date_to": "March"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {"q": "uber", "page": "0"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagination(self):
+        first = self.search("uber", page_size=1)
+        self.assertEqual(first["count"], 2)
+        self.assertEqual(len(first["results"]), 1)
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(first["next"]).data
+        self.assertIsNone(second["next"])
+        self.assertEqual(
+            sorted([first["results"][0]["id"], second["results"][0]["id"]]),
+            sorted([self.uber.pk, self.uber_eats.pk]),
+        )
+
+    def test_fields_subset_keeps_rank_order(self):
+        data = self.search("uber", fields="note")
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(set(data["results"][0]), {"note"})
+
+    def test_index_follows_writes(self):
+        self.uber.note = "taxi"
+        self.uber.save()
+        self.assertEqual(self.ids("uber"), [self.uber_eats.pk])
+        self.assertEqual(self.ids("taxi"), [self.uber.pk])
+
+        self.rent.name = "Mortgage"
+        self.rent.save()
+        self.assertEqual(self.ids("mortgage"), [self.march_rent.pk])
+        self.assertEqual(self.ids("rent"), [])
+
+        self.pharmacy.delete()
+        self.assertEqual(self.ids("pharmacy"), [])
+
+    def test_index_is_scoped_per_user(self):
+        Transaction.objects.filter(pk=self.foreign.pk).update(user=self.user)
+        self.assertEqual(self.search("uber ride")["count"], 2)
+        Transaction.objects.filter(pk=self.foreign.pk).update(user=self.other)
+        self.assertEqual(self.ids("uber ride"), [self.uber.pk])
+
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "EXPLAIN QUERY PLAN SELECT t.id " + search.SQLITE_MATCHES.format(filters=""),
+                    [0, '"uber"*', 0, 0],
+                )
+                plan = " ".join(row[-1] for row in cursor.fetchall())
+            # Full-text match plus both rowid bounds (the user's range)
+            self.assertIn("VIRTUAL TABLE INDEX 0:M0><", plan)
+
+    @skipUnless(connection.vendor == "sqlite", "the SQLite index keys rows by user and id")
+    def test_ids_beyond_the_index_key_are_refused(self):
+        # user_id << 32 | id would collide with another row's key
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Transaction.objects.create(
+                id=1 << search.USER_SHIFT, user=self.user, type="expense",
+                amount=Decimal("1.00"), date=date(2024, 3, 1),
+            )
+        self.assertEqual(self.ids("uber ride"), [self.uber.pk])
+
+    def test_index_follows_bulk_writes(self):
+        response = self.client.post(
+            "/api/transactions/import/",
+            [{"date": "2024-04-01", "type": "expense", "amount": "5", "category": "Rent", "note": "garage"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        (garage,) = self.ids("garage")
+
+        response = self.client.post("/api/transactions/batch/", {"operations": [
+            {"op": "update", "id": garage, "fields": {"note": "parking"}},
+            {"op": "delete", "id": self.uber_eats.pk},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids("garage"), [])
+        self.assertEqual(self.ids("parking"), [garage])
+        self.assertEqual(self.ids("uber"), [self.uber.pk])
+
+
+# ---------------------------------------------------------
+# Recurring transactions
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class RecurringRuleTests(TestCase):
+    url = "/api/recurring-rules/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("recurring-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.salary = Category.objects.get(user=cls.user, name="Salary")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rule(self, user=None, frequency="monthly", start=date(2024, 1, 31), **kwargs):
+        user = user or self.user
+        rule = RecurringRule(
+            user=user, type="expense", amount=Decimal("1200.00"), note="rent",
+            category=Category.objects.get(user=user, name="Rent"),
+            frequency=frequency, start_date=start, **kwargs,
+        )
+        recurring.schedule(rule)
+        rule.save()
+        return rule
+
+    def dates(self, rule):
+        return list(rule.transactions.order_by("date").values_list("date", flat=True))
+
+    def test_schedule(self):
+        monthly = self.rule()
+        self.assertEqual(
+            [recurring.occurrence(monthly, n) for n in range(4)],
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+        fortnightly = self.rule(frequency="weekly", interval=2, start=date(2024, 1, 1))
+        self.assertEqual(recurring.first_on_or_after(fortnightly, date(2024, 1, 2)), date(2024, 1, 15))
+        ended = self.rule(frequency="daily", start=date(2024, 1, 1), end_date=date(2024, 1, 3))
+        self.assertIsNone(recurring.first_on_or_after(ended, date(2024, 1, 4)))
+
+    def test_catches_up_missed_occurrences_once(self):
+        rule = self.rule()
+        self.assertEqual(recurring.materialize(date(2024, 4, 15)), (1, 3))
+        self.assertEqual(self.dates(rule), [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)])
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, date(2024, 4, 30))
+
+        self.assertEqual(recurring.materialize(date(2024, 4, 15)), (0, 0))
+        # A lost next_date update does not duplicate occurrences
+        RecurringRule.objects.filter(pk=rule.pk).update(next_date=rule.start_date)
+        self.assertEqual(recurring.materialize(date(2024, 4, 30)), (1, 1))
+        self.assertEqual(len(self.dates(rule)), 4)
+
+    def test_end_date(self):
+        rule = self.rule(frequency="daily", start=date(2024, 1, 1), end_date=date(2024, 1, 5))
+        recurring.materialize(date(2024, 2, 1))
+        self.assertEqual(len(self.dates(rule)), 5)
+        rule.refresh_from_db()
+        self.assertIsNone(rule.next_date)
+
+    def test_materialized_rows_update_derived_state(self):
+        self.rule()
+        version = caching.current_version(self.user.pk)
+        recurring.materialize(date(2024, 3, 1))
+
+        self.assertEqual(rollups.verify([self.user.pk]), [])
+        self.assertGreater(caching.current_version(self.user.pk), version)
+        changed = self.client.get("/api/sync/", {"since": version}).data["transactions"]["changed"]
+        self.assertEqual(len(changed), 2)
+        self.assertEqual({row["note"] for row in changed}, {"rent"})
+
+    def test_batches_use_a_fixed_number_of_queries(self):
+        users = [User.objects.create_user(f"recurring-{n}", password="x") for n in range(12)]
+
+        def run(rules, today):
+            with CaptureQueriesContext(connection) as ctx:
+                recurring.materialize(today, batch_size=100)
+            return len(ctx.captured_queries)
+
+        few = run([self.rule(user=u, start=date(2024, 1, 1)) for u in users[:2]], date(2024, 3, 1))
+        many = run([self.rule(user=u, start=date(2024, 5, 1)) for u in users[2:]], date(2024, 7, 1))
+        self.assertEqual(few, many)
+
+    def test_api(self):
+        response = self.client.post(self.url, {
+            "type": "income", "category": self.salary.pk, "amount": "3000.00",
+            "frequency": "monthly", "start_date": "2024-01-25",
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["next_date"], "2024-01-25")
+        self.assertEqual(response.data["category_name"], "Salary")
+        rule = RecurringRule.objects.get(pk=response.data["id"])
+
+        recurring.materialize(date(2024, 3, 1))
+        txn = rule.transactions.order_by("date").first()
+        self.assertEqual(self.client.get(f"/api/transactions/{txn.pk}/").data["recurring_rule"], rule.pk)
+
+        # Rescheduling continues after what was already materialized
+        response = self.client.patch(f"{self.url}{rule.pk}/", {"frequency": "weekly"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["next_date"], "2024-02-29")
+
+        other = User.objects.create_user("recurring-other", password="x")
+        foreign = Category.objects.get(user=other, name="Salary")
+        invalid = [
+            {"category": foreign.pk},
+            {"category": self.rent.pk},
+            {"amount": "0"},
+            {"interval": 0},
+            {"end_date": "2023-12-31"},
+        ]
+        for change in invalid:
+            data = {
+                "type": "income", "category": self.salary.pk, "amount": "10", "frequency": "monthly",
+                "start_date": "2024-01-01", **change,
+            }
+            self.assertEqual(self.client.post(self.url, data, format="json").status_code, 400, change)
+
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"{self.url}{rule.pk}/").status_code, 404)
+
+    def test_deleting_a_rule_keeps_its_transactions(self):
+        rule = self.rule()
+        recurring.materialize(date(2024, 3, 1))
+        version = caching.current_version(self.user.pk)
+
+        rule.delete()
+        self.assertEqual(Transaction.objects.filter(user=self.user, note="rent").count(), 2)
+        changed = self.client.get("/api/sync/", {"since": version}).data["transactions"]["changed"]
+        self.assertEqual([row["recurring_rule"] for row in changed], [None, None])
+
+
+# ---------------------------------------------------------
+# Budget utilization
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[], BUDGET_ALERT_THRESHOLDS=[50, 80, 100])
+class BudgetUtilizationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("budget-user", password="x")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+        cls.utilities = Category.objects.get(user=cls.user, name="Utilities")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expense(self, amount, day=date(2024, 1, 10), category=None):
+        return Transaction.objects.create(
+            user=self.user, type="expense", category=category or self.rent,
+            amount=Decimal(amount), date=day,
+        )
+
+    def budget(self, amount="100.00", month=date(2024, 1, 1), category=None):
+        return Budget.objects.create(
+            user=self.user, category=category or self.rent, amount=Decimal(amount), month=month,
+        )
+
+    def spent(self, budget):
+        budget.refresh_from_db()
+        return budget.spent
+
+    def thresholds(self, budget):
+        return list(budget.alerts.order_by("id").values_list("threshold", flat=True))
+
+    def test_spent_follows_transaction_writes(self):
+        self.expense("40.00")
+        budget = self.budget()
+        self.assertEqual(budget.spent, Decimal("40.00"))
+
+        txn = self.expense("5.00")
+        self.assertEqual(self.spent(budget), Decimal("45.00"))
+        txn.amount = Decimal("7.50")
+        txn.save()
+        self.assertEqual(self.spent(budget), Decimal("47.50"))
+        txn.date = date(2024, 2, 1)
+        txn.save()
+        self.assertEqual(self.spent(budget), Decimal("40.00"))
+        txn.date, txn.category = date(2024, 1, 2), self.utilities
+        txn.save()
+        self.assertEqual(self.spent(budget), Decimal("40.00"))
+        txn.category = self.rent
+        txn.save()
+        txn.delete()
+        self.assertEqual(self.spent(budget), Decimal("40.00"))
+
+        response = self.client.post("/api/transactions/import/", [
+            {"date": "2024-01-15", "type": "expense", "amount": "2.50", "category": "Rent"},
+            {"date": "2024-01-16", "type": "income", "amount": "900", "category": "Salary"},
+        ], format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.spent(budget), Decimal("42.50"))
+
+        rule = RecurringRule(
+            user=self.user, type="expense", category=self.rent, amount=Decimal("10.00"),
+            frequency="weekly", start_date=date(2024, 1, 1),
+        )
+        recurring.schedule(rule)
+        rule.save()
+        recurring.materialize(date(2024, 1, 31))
+        self.assertEqual(self.spent(budget), Decimal("92.50"))
+        self.assertEqual(budgets.reconcile([self.user.pk], repair=False), [])
+
+    def test_alerts_when_thresholds_are_crossed(self):
+        budget = self.budget()
+        self.expense("49.99")
+        self.assertEqual(self.thresholds(budget), [])
+        self.expense("35.00")
+        self.assertEqual(self.thresholds(budget), [50, 80])
+        refund = self.expense("20.00")
+        self.assertEqual(self.thresholds(budget), [50, 80, 100])
+
+        # Dropping below a threshold lets it alert again
+        refund.delete()
+        budget.refresh_from_db()
+        self.assertEqual(budget.alert_level, 80)
+        self.expense("15.01")
+        self.assertEqual(self.thresholds(budget), [50, 80, 100, 100])
+
+        # Lowering the amount counts as crossing too
+        other = self.budget(amount="1000.00", category=self.utilities)
+        self.expense("600.00", category=self.utilities)
+        other.amount = Decimal("700.00")
+        other.save()
+        self.assertEqual(self.thresholds(other), [50, 80])
+
+        # Each alert records the spending and amount it was raised at
+        alerts = BudgetAlert.objects.filter(user=self.user, threshold=50).order_by("id")
+        self.assertEqual(list(alerts.values_list("budget_id", "spent", "amount")), [
+            (budget.pk, Decimal("84.99"), Decimal("100.00")),
+            (other.pk, Decimal("600.00"), Decimal("1000.00")),
+        ])
+
+    def test_status_and_alerts_endpoints(self):
+        budget = self.budget()
+        self.budget(month=date(2024, 2, 1))
+        self.expense("85.00")
+
+        response = self.client.get("/api/budgets/status/", {"month": "2024-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["id"], budget.pk)
+        self.assertEqual(response.data[0]["spent"], "85.00")
+        self.assertEqual(response.data[0]["utilization"], 85.0)
+        self.assertEqual(response.data[0]["alert_level"], 80)
+        self.assertEqual(self.client.get("/api/budgets/status/", {"month": "2024"}).status_code, 400)
+        # Spending is not part of the synced budget rows
+        self.assertNotIn("spent", self.client.get(f"/api/budgets/{budget.pk}/").data)
+
+        alerts = self.client.get("/api/budget-alerts/").data["results"]
+        self.assertEqual([a["threshold"] for a in alerts], [80, 50])
+        self.assertEqual(alerts[0]["category_name"], "Rent")
+        self.assertEqual(alerts[0]["month"], "2024-01-01")
+
+        other = User.objects.create_user("budget-other", password="x")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get("/api/budget-alerts/").data["results"], [])
+        self.assertEqual(self.client.get("/api/budgets/status/", {"month": "2024-01"}).data, [])
+
+    def test_reconcile_repairs_drift(self):
+        budget = self.budget()
+        self.expense("60.00")
+        Budget.objects.filter(pk=budget.pk).update(spent=0, alert_level=0)
+
+        self.assertEqual(
+            budgets.reconcile([self.user.pk], repair=False),
+            [(budget.pk, (Decimal("60.00"), 50), (Decimal("0.00"), 0))],
+        )
+        with self.assertRaises(CommandError):
+            call_command("reconcile_budgets", "--verify", stdout=io.StringIO())
+
+        call_command("reconcile_budgets", "--user", str(self.user.pk), stdout=io.StringIO())
+        self.assertEqual(self.spent(budget), Decimal("60.00"))
+        self.assertEqual(self.thresholds(budget), [50, 50])
+        call_command("reconcile_budgets", "--verify", stdout=io.StringIO())
+
+
+# ---------------------------------------------------------
+# Spend forecast
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class ForecastTests(TestCase):
+    url = "/api/analytics/forecast/"
+    today = date(2024, 10, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("forecast-user", password="x")
+
+    def rows(self, category_id, name, amounts, last=date(2024, 9, 1)):
+        """
+        Monthly expense rows ending at `last`, oldest first.
+        """
+        start = forecast.month_index(last) - len(amounts) + 1
+        return [
+            {
+                "month": forecast.month_of(start + n), "type": "expense", "category_id": category_id,
+                "category__name": name, "total": Decimal(amount),
+            }
+            for n, amount in enumerate(amounts)
+        ]
+
+    def test_projections(self):
+        rows = (
+            # Steady, and seasonal with a December peak (October 2021 on)
+            self.rows(1, "Rent", ["1000"] * 6)
+            + self.rows(2, "Gifting", ["500" if m % 12 == 2 else "50" for m in range(36)], last=date(2024, 9, 1))
+            # Only this month: projected at its pace
+            + self.rows(3, "Travel", ["300"], last=date(2024, 10, 1))
+            + self.rows(1, "Rent", ["1000"], last=date(2024, 10, 1))
+            + [{"month": date(2024, 9, 1), "type": "income", "category_id": 4,
+                "category__name": "Salary", "total": Decimal("5000")}]
+        )
+        result = forecast.forecast(rows, self.today, horizon=3)
+
+        self.assertEqual(result["months"], ["2024-11", "2024-12", "2025-01"])
+        by_name = {c["category"]: c for c in result["categories"]}
+        self.assertEqual(list(by_name), ["Gifting", "Rent", "Travel"])
+        self.assertEqual(by_name["Rent"]["month_end"], 1000.0)
+        self.assertEqual(by_name["Rent"]["forecast"], [1000.0, 1000.0, 1000.0])
+        self.assertEqual(by_name["Gifting"]["forecast"], [50.0, 500.0, 50.0])
+        self.assertEqual(by_name["Travel"]["month_end"], round(300 * 31 / 15, 2))
+        self.assertEqual(result["total"]["spent"], 1300.0)
+
+        # Exponential smoothing follows a level shift
+        shifted = forecast.forecast(self.rows(1, "Rent", ["1000"] * 12 + ["1200"] * 3), self.today)
+        projected = shifted["categories"][0]["forecast"][0]
+        self.assertGreater(projected, 1100)
+        self.assertLess(projected, 1200)
+
+        empty = forecast.forecast([], self.today)
+        self.assertEqual(empty["categories"], [])
+        self.assertEqual(empty["total"]["forecast"], [0.0, 0.0, 0.0])
+
+    def test_endpoint_is_cached_until_data_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        rent = Category.objects.get(user=self.user, name="Rent")
+        month = date.today().replace(day=1)
+        for months_ago in range(1, 4):
+            Transaction.objects.create(
+                user=self.user, type="expense", category=rent, amount=Decimal("900.00"),
+                date=forecast.month_of(forecast.month_index(month) - months_ago),
+            )
+
+        response = client.get(self.url, {"months": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["categories"][0]["forecast"], [900.0, 900.0])
+        self.assertEqual(client.get(self.url, {"months": 2})["X-Cache"], "HIT")
+
+        Transaction.objects.create(
+            user=self.user, type="expense", category=rent, amount=Decimal("50.00"), date=month,
+        )
+        response = client.get(self.url, {"months": 2})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["total"]["spent"], 50.0)
+
+        for months in ("0", "13", "x"):
+            self.assertEqual(client.get(self.url, {"months": months}).status_code, 400)
+
+
+# ---------------------------------------------------------
+# Anomaly detection
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=[])
+class AnomalyTests(TestCase):
+    url = "/api/transaction-flags/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("anomaly-user", password="x")
+        cls.other = User.objects.create_user("anomaly-other", password="x")
+        cls.utilities = Category.objects.get(user=cls.user, name="Utilities")
+        cls.rent = Category.objects.get(user=cls.user, name="Rent")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expense(self, amount, days_ago, user=None, category=None):
+        user = user or self.user
+        return Transaction.objects.create(
+            user=user, type="expense", amount=Decimal(amount),
+            category=category or Category.objects.get(user=user, name="Utilities"),
+            date=date.today() - timedelta(days=days_ago),
+        )
+
+    def history(self, user=None):
+        for n, amount in enumerate(["80.00", "95.00", "100.00", "105.00", "120.00", "90.00"]):
+            self.expense(amount, 30 * (n + 1), user=user)
+
+    def scan(self, **kwargs):
+        return anomalies.scan(workers=1, until=timezone.now(), **kwargs)
+
+    def flags(self):
+        """
+        Open (not dismissed) flags as (transaction id, reason).
+        """
+        return set(
+            TransactionFlag.objects.filter(dismissed_at__isnull=True).values_list("transaction_id", "reason")
+        )
+
+    def test_outliers_and_duplicates(self):
+        self.history()
+        usual = self.expense("100.00", 1)
+        spike = self.expense("500.00", 2)
+        paid = self.expense("95.00", 3, category=self.rent)
+        again = self.expense("95.00", 3, category=self.rent)
+        rule = RecurringRule.objects.create(
+            user=self.user, type="expense", category=self.rent, amount=Decimal("95.00"),
+            frequency="weekly", start_date=date.today() - timedelta(days=9),
+        )
+        recurring.materialize()
+
+        run = self.scan()
+        self.assertEqual(run.scored, 10 + rule.transactions.count())
+        self.assertEqual(self.flags(), {(spike.pk, "outlier"), (again.pk, "duplicate")})
+        self.assertNotIn(usual.pk, {pk for pk, _ in self.flags()})
+        outlier = TransactionFlag.objects.get(reason="outlier")
+        self.assertEqual(outlier.typical, Decimal("100.00"))
+        self.assertEqual(outlier.score, 5.0)
+        self.assertEqual(TransactionFlag.objects.get(reason="duplicate").duplicate_of_id, paid.pk)
+
+    def test_scans_are_incremental(self):
+        self.history()
+        spike = self.expense("500.00", 1)
+        self.scan()
+        self.assertEqual(self.scan().scored, 0)
+
+        # Dismissed flags stay dismissed; new transactions are scored
+        dismissed = TransactionFlag.objects.get(transaction=spike)
+        self.assertEqual(self.client.delete(f"{self.url}{dismissed.pk}/").status_code, 204)
+        late = self.expense("600.00", 1)
+        run = self.scan()
+        self.assertEqual(run.scored, 1)
+        self.assertEqual(self.flags(), {(late.pk, "outlier")})
+
+        # Not yet settled: left for the next run
+        self.expense("700.00", 0)
+        self.assertEqual(anomalies.scan(workers=1).scored, 0)
+        self.assertEqual(AnomalyScan.objects.filter(finished_at__isnull=False).count(), 4)
+
+        # A full rescan starts over, but dismissals stand
+        self.assertEqual(self.scan(full=True).scored, 9)
+        self.assertEqual(len(self.flags()), 2)
+        self.assertEqual(TransactionFlag.objects.filter(transaction=spike).count(), 1)
+        dismissed.refresh_from_db()
+        self.assertIsNotNone(dismissed.dismissed_at)
+
+    def test_shards_score_users_independently(self):
+        self.history()
+        self.history(user=self.other)
+        spike = self.expense("500.00", 1)
+        self.expense("110.00", 1, user=self.other)
+
+        self.scan(shard_size=1)
+        sharded = self.flags()
+        self.assertEqual(sharded, {(spike.pk, "outlier")})
+        TransactionFlag.objects.all().delete()
+        self.scan(full=True)
+        self.assertEqual(self.flags(), sharded)
+
+    def test_api_lists_own_flags(self):
+        self.history()
+        self.history(user=self.other)
+        spike = self.expense("500.00", 1)
+        self.expense("800.00", 1, user=self.other)
+        first = self.expense("42.00", 2)
+        second = self.expense("42.00", 2)
+        etag = self.client.get(self.url)["ETag"]
+        self.scan()
+
+        # New flags change the ETag
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        results = response.json()["results"]
+        self.assertEqual([f["transaction"]["id"] for f in results], [second.pk, spike.pk])
+        self.assertEqual(results[1]["transaction"]["category_name"], "Utilities")
+
+        response = self.client.get(self.url, {"reason": "duplicate"})
+        [flag] = response.json()["results"]
+        self.assertEqual(flag["duplicate_of"], first.pk)
+
+        other_flag = TransactionFlag.objects.get(user=self.other)
+        self.assertEqual(self.client.get(f"{self.url}{other_flag.pk}/").status_code, 404)
+        self.assertEqual(self.client.delete(f"{self.url}{flag['id']}/").status_code, 204)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1)
+        self.assertEqual(self.client.get(f"{self.url}{flag['id']}/").status_code, 404)
+
+        # Flags of deleted transactions are hidden, then pruned by the next scan
+        Transaction.objects.filter(pk=spike.pk).delete()
+        self.assertEqual(self.client.get(self.url).json()["results"], [])
+        self.scan()
+        self.assertFalse(TransactionFlag.objects.filter(transaction_id=spike.pk).exists())
+
+
+# ---------------------------------------------------------
+# Receipt processing
+# ---------------------------------------------------------
+def photo(width=1200, height=800, orientation=None, color="white"):
+    image = Image.new("RGB", (width, height), color)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return SimpleUploadedFile("IMG_0001.jpg", out.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(RECEIPT_WORKERS=0, DATABASE_REPLICAS=[])
+class ReceiptProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("receipt-user", password="x")
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, image):
+        response = self.client.post("/api/transactions/", {
+            "type": "expense", "amount": "12.50", "date": "2024-05-01", "receipt": image,
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["receipt_status"], "pending")
+        return response.data["id"]
+
+    def test_versions_are_rendered_and_stored_by_content(self):
+        first = self.upload(photo(orientation=6))
+        second = self.upload(photo(orientation=6))
+        self.assertEqual(receipts.process(first), "ready")
+        self.assertEqual(receipts.process(second), "ready")
+
+        a, b = Transaction.objects.filter(pk__in=[first, second])
+        self.assertEqual(a.receipt.name, b.receipt.name)
+        self.assertTrue(a.receipt.name.startswith(f"{receipts.ORIGINALS}/{a.receipt_sha256[:2]}/"))
+        with Image.open(a.receipt_thumbnail.path) as thumbnail:
+            # Orientation 6 turns the landscape photo upright
+            self.assertEqual(thumbnail.size, (213, 320))
+        with Image.open(a.receipt_display.path) as display:
+            self.assertEqual(display.size, (800, 1200))
+        self.assertEqual(len(os.listdir(os.path.dirname(a.receipt.path))), 1)
+        # The uploads themselves are gone
+        uploads = os.path.join(settings.MEDIA_ROOT, "receipts")
+        self.assertEqual([f for f in os.listdir(uploads) if os.path.isfile(os.path.join(uploads, f))], [])
+
+    def test_lists_link_thumbnails_and_details_originals(self):
+        pk = self.upload(photo())
+        receipts.process(pk)
+
+        row = self.client.get("/api/transactions/").data["results"][0]
+        self.assertNotIn("receipt", row)
+        self.assertNotIn("receipt_display", row)
+        self.assertTrue(row["receipt_thumbnail"].endswith(".jpg"))
+        self.assertEqual(row["receipt_status"], "ready")
+
+        detail = self.client.get(f"/api/transactions/{pk}/").data
+        self.assertIn(f"/media/{receipts.ORIGINALS}/", detail["receipt"])
+        self.assertEqual(detail["receipt_thumbnail"], row["receipt_thumbnail"])
+
+    def test_unreadable_upload_fails_and_unreferenced_files_are_collected(self):
+        pk = self.upload(photo())
+        receipt = Transaction.objects.get(pk=pk).receipt
+        receipt.storage.delete(receipt.name)
+        with self.assertLogs("tracker.receipts", "WARNING"):
+            self.assertEqual(receipts.process(pk), "failed")
+
+        other = self.upload(photo(color="black"))
+        receipts.process(other)
+        Transaction.objects.filter(pk=other).delete()
+        with mock.patch.object(receipts, "GC_GRACE", timedelta(0)):
+            self.assertEqual(receipts.collect_garbage(), 3)
+
+    def test_unexpected_errors_fail_the_receipt(self):
+        pk = self.upload(photo(orientation=6))
+        with mock.patch.object(receipts.ImageOps, "exif_transpose", side_effect=ValueError("bad EXIF")):
+            with self.assertLogs("tracker.receipts", "ERROR"):
+                self.assertEqual(receipts.process(pk), "failed")
+        self.assertEqual(Transaction.objects.get(pk=pk).receipt_status, "failed")
+
+
+# ---------------------------------------------------------
+# Cached JWT users
+# ---------------------------------------------------------
+class CachedAuthenticationTests(TestCase):
+    url = "/api/categories/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("auth-user", password="x")
+
+    def setUp(self):
+        authentication.user_cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        return response, [q for q in ctx.captured_queries if "auth_user" in q["sql"]]
+
+    def test_cached_user_skips_the_auth_query(self):
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_password_change_revokes_cached_token(self):
+        # simplejwt reads its settings at import, so override_settings can't reach them
+        with mock.patch.object(jwt_settings, "CHECK_REVOKE_TOKEN", True):
+            token = RefreshToken.for_user(self.user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.user.set_password("changed")
+            self.user.save()
+            self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+# ---------------------------------------------------------
+# Read replicas
+# ---------------------------------------------------------
+@override_settings(DATABASE_REPLICAS=["replica-a", "replica-b", "replica-c"])
+class ReplicaPinningTests(SimpleTestCase):
+    def setUp(self):
+        self.healthy = {"replica-a", "replica-b", "replica-c"}
+        patcher = mock.patch.object(db_routers.health, "is_healthy", side_effect=lambda alias: alias in self.healthy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = db_routers.ReplicaRouter()
+
+    def request_reads(self, count, between=None):
+        token = db_routers.begin_request()
+        try:
+            db_routers.allow_replica_reads()
+            aliases = []
+            for _ in range(count):
+                aliases.append(self.router.db_for_read(Transaction))
+                if between:
+                    between(aliases[-1])
+            return aliases
+        finally:
+            db_routers.end_request(token)
+
+    def test_one_replica_per_request(self):
+        chosen = set()
+        for _ in range(20):
+            aliases = self.request_reads(5)
+            self.assertEqual(len(set(aliases)), 1)
+            chosen.add(aliases[0])
+        # The choice is still spread across requests
+        self.assertGreater(len(chosen), 1)
+
+    def test_unhealthy_replica_is_replaced(self):
+        aliases = self.request_reads(3, between=self.healthy.discard)
+        self.assertEqual(len(set(aliases)), 3)
+
+        self.healthy.clear()
+        self.assertEqual(self.request_reads(1), ["default"])
+
+
+# Commit callbacks run here; keep receipt workers out of it
+@skipUnless(settings.DATABASE_REPLICAS, "set DATABASE_REPLICA_URLS to test replica routing")
+@override_settings(RECEIPT_WORKERS=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Run with a replica configured, e.g. two SQLite files:
+    DATABASE_URL=sqlite:////tmp/a.db DATABASE_REPLICA_URLS=sqlite:////tmp/b.db
+
+    In tests the replica mirrors the default test database. It is a
+    separate connection, so data must be committed for it to be seen.
+    """
+    databases = {"default", *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        self.user = User.objects.create_user("replica-user", password="x")
+        self.category = Category.objects.filter(user=self.user, type="expense").first()
+        Transaction.objects.create(
+            user=self.user, type="expense", category=self.category,
+            amount=Decimal("10.00"), date=date(2024, 3, 1),
+        )
+
+        db_routers.health.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queries_by_alias(self, method, url, data=None):
+        contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in self.databases}
+        for ctx in contexts.values():
+            ctx.__enter__()
+        try:
+            response = getattr(self.client, method)(url, data, format="json")
+        finally:
+            for ctx in contexts.values():
+                ctx.__exit__(None, None, None)
+        return response, {alias: len(ctx.captured_queries) for alias, ctx in contexts.items()}
+
+    def replica_queries(self, counts):
+        return sum(n for alias, n in counts.items() if alias != "default")
+
+    def test_analytics_and_list_read_from_replica(self):
+        for url in ("/api/analytics/monthly-summary/", "/api/analytics/dashboard/", "/api/transactions/"):
+            response, counts = self.queries_by_alias("get", url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertGreater(self.replica_queries(counts), 0, url)
+
+    def test_writes_and_other_reads_use_primary(self):
+        response, counts = self.queries_by_alias("post", "/api/transactions/", {
+            "type": "expense", "category": self.category.pk, "amount": "5.00", "date": "2024-03-02",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.replica_queries(counts), 0)
+
+        response, counts = self.queries_by_alias("get", "/api/categories/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.replica_queries(counts), 0)
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        token = db_routers.begin_request()
+        try:
+            db_routers.allow_replica_reads()
+            self.assertIn(db_routers.ReplicaRouter().db_for_read(Transaction), settings.DATABASE_REPLICAS)
+            Transaction.objects.filter(pk=0).update(note="x")
+            self.assertEqual(db_routers.ReplicaRouter().db_for_read(Transaction), "default")
+        finally:
+            db_routers.end_request(token)
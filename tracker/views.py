@@ -1,24 +1,41 @@
-from rest_framework import viewsets, generics, permissions
+from rest_framework import viewsets, generics, mixins, permissions, status
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.urls import replace_query_param
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.utils import timezone
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
-from collections import defaultdict
 
-from .models import Transaction, Category, Budget
+from .models import Transaction, TransactionFlag, Category, Budget, BudgetAlert, RecurringRule
 from .serializers import (
     TransactionSerializer,
+    TransactionRowSerializer,
     RegisterSerializer,
     CategorySerializer,
     BudgetSerializer,
+    BudgetStatusSerializer,
+    BudgetAlertSerializer,
+    RecurringRuleSerializer,
+    TransactionFlagSerializer,
 )
 from .permissions import IsOwnerOrReadOnly
+from .caching import ETagMixin, cache_analytics
+from .db_routers import replica_reads
+from .pagination import NewestFirstPagination, TransactionCursorPagination
+from .renderers import CSVRenderer, NDJSONRenderer
+from .parsers import CSVParser
+from . import authentication, batch, caching, db_routers, exports, importer, instrumentation, ledger, search, sync
+from . import analytics, forecast
 
 
 # ---------------------------
@@ -33,12 +50,16 @@ class RegisterView(generics.CreateAPIView):
 # ---------------------------
 # Transactions CRUD
 # ---------------------------
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ETagMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
+    replica_read_actions = ("list", "search")
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = TransactionCursorPagination
+    search_page_size = 20
+    search_max_page_size = 100
 
     def get_queryset(self):
-        qs = Transaction.objects.filter(user=self.request.user)
+        qs = Transaction.objects.filter(user=self.request.user).select_related("category")
 
         # Optional filters
         ttype = self.request.query_params.get("type")
@@ -49,7 +70,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if ttype:
             qs = qs.filter(type=ttype)
         if category_name:
-            qs = qs.filter(category__name__iexact=category_name)
+            # Compare on LOWER(name) so category_user_lower_name_idx applies
+            categories = (
+                Category.objects.filter(user=self.request.user)
+                .alias(lower_name=Lower("name"))
+                .filter(lower_name=Lower(Value(category_name)))
+            )
+            qs = qs.filter(category__in=categories)
         if date_from:
             qs = qs.filter(date__gte=date_from)
         if date_to:
@@ -57,14 +84,165 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         return qs
 
+    def requested_fields(self):
+        # ?fields=id,amount,date limits the rendered columns on reads
+        fields = self.request.query_params.get("fields")
+        if fields and self.request.method == "GET":
+            return [f.strip() for f in fields.split(",") if f.strip()]
+        return None
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        if self.action in ("list", "search"):
+            kwargs.setdefault("detail", False)
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        fields = self.requested_fields()
+        if not TransactionRowSerializer.supported():
+            return super().list(request, *args, **kwargs)
+
+        # Flat rows with the category joined in, rendered without DRF fields
+        rows = TransactionRowSerializer(request, fields=fields)
+        queryset = self.filter_queryset(self.get_queryset()).values(*rows.values())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.render(page))
+        return Response(rows.render(queryset))
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Full-text search over notes and category names, best match first:
+        ?q=uber ride, optionally with type, date_from and date_to, paged
+        with page and page_size.
+        """
+        params = request.query_params
+        try:
+            date_from = analytics.parse_date(params.get("date_from"), "date_from")
+            date_to = analytics.parse_date(params.get("date_to"), "date_to")
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = int(params.get("page", 1))
+            page_size = min(int(params.get("page_size", self.search_page_size)), self.search_max_page_size)
+        except ValueError:
+            page = page_size = 0
+        if page < 1 or page_size < 1:
+            return Response({"detail": "Invalid page"}, status=status.HTTP_400_BAD_REQUEST)
+
+        total, ids = search.search(
+            request.user, params.get("q", ""), params.get("type"), date_from, date_to,
+            offset=(page - 1) * page_size, limit=page_size,
+        )
+
+        # Fetched by id, then put back in rank order
+        position = {pk: i for i, pk in enumerate(ids)}
+        queryset = Transaction.objects.filter(pk__in=ids)
+        if TransactionRowSerializer.supported():
+            rows = TransactionRowSerializer(request, fields=self.requested_fields())
+            found = sorted(queryset.values(*rows.values()), key=lambda row: position[row["id"]])
+            results = rows.render(found)
+        else:
+            found = sorted(queryset.select_related("category"), key=lambda txn: position[txn.pk])
+            results = self.get_serializer(found, many=True).data
+
+        url = request.build_absolute_uri()
+        return Response({
+            "count": total,
+            "next": replace_query_param(url, "page", page + 1) if page * page_size < total else None,
+            "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+            "results": results,
+        })
+
+    @action(detail=False, methods=["get"], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream the filtered ledger as CSV (default) or NDJSON, selected
+        with ?format=csv|ndjson or the Accept header.
+        """
+        renderer = request.accepted_renderer
+        rows = exports.export_rows(self.get_queryset())
+
+        if renderer.format == "ndjson":
+            content = exports.stream_ndjson(rows)
+        else:
+            content = exports.stream_csv(rows)
+
+        response = StreamingHttpResponse(content, content_type=renderer.media_type)
+        response["Content-Disposition"] = f'attachment; filename="transactions.{renderer.format}"'
+        return response
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[JSONParser, CSVParser, MultiPartParser],
+    )
+    def import_rows(self, request):
+        """
+        Bulk-create transactions from a JSON array, a text/csv body or a
+        multipart CSV `file`. Columns: date, type, amount, category (name),
+        note. Pass ?atomic=true to reject the batch if any row is invalid.
+        """
+        try:
+            if "file" in request.FILES:
+                rows = importer.rows_from_upload(request.FILES["file"])
+            else:
+                rows = request.data
+            if isinstance(rows, dict) and "rows" in rows:
+                rows = rows["rows"]
+            if not isinstance(rows, list):
+                raise ValueError("Expected a list of rows.")
+
+            atomic = request.query_params.get("atomic", "").lower() in ("1", "true", "yes")
+            report = importer.import_rows(request.user, rows, atomic=atomic)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if report["errors"] and not report["created"]:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def apply_batch(self, request):
+        """
+        Apply a list of update/delete operations to the caller's
+        transactions in one database transaction:
+        {"operations": [{"op": "update", "id": 1, "fields": {"category": 2}},
+                        {"op": "delete", "id": 3}]}
+        Each operation gets a result with its own status. Pass ?atomic=true
+        to apply nothing if any operation fails.
+        """
+        operations = request.data
+        if isinstance(operations, dict):
+            operations = operations.get("operations")
+        if not isinstance(operations, list):
+            return Response({"detail": "Expected a list of operations."}, status=status.HTTP_400_BAD_REQUEST)
+
+        atomic = request.query_params.get("atomic", "").lower() in ("1", "true", "yes")
+        try:
+            results = batch.apply_operations(request.user, operations, atomic=atomic)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        applied = sum(r["status"] < 300 for r in results)
+        return Response(
+            {"applied": applied, "results": results},
+            status=status.HTTP_200_OK if applied or not results else status.HTTP_400_BAD_REQUEST,
+        )
+
 
 # ---------------------------
 # Category CRUD
 # ---------------------------
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ETagMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
 
@@ -78,7 +256,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 # ---------------------------
 # Budget CRUD
 # ---------------------------
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(ETagMixin, viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -88,207 +266,354 @@ class BudgetViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["get"])
+    def status(self, request):
+        """
+        Spent, utilization and alert level of each budget in ?month=YYYY-MM
+        (default: this month), read from the budgets' own counters.
+        """
+        month = request.query_params.get("month")
+        try:
+            month = analytics.parse_month(month, "month") if month else date.today().replace(day=1)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        budgets = (
+            self.get_queryset()
+            .filter(month=month)
+            .select_related("category")
+            .order_by("category__name")
+        )
+        return Response(BudgetStatusSerializer(budgets, many=True).data)
+
+
+class BudgetAlertViewSet(ETagMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Alerts recorded as budgets reach the BUDGET_ALERT_THRESHOLDS, newest
+    first.
+    """
+    serializer_class = BudgetAlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NewestFirstPagination
+
+    def get_queryset(self):
+        return BudgetAlert.objects.filter(user=self.request.user).select_related("budget__category")
+
+
+# ---------------------------
+# Transaction flags (anomaly scan)
+# ---------------------------
+class TransactionFlagViewSet(
+    ETagMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Unusual transactions found by the scan_anomalies command, newest
+    first, optionally ?reason=outlier|duplicate. Deleting a flag dismisses
+    it: the row is kept with dismissed_at, so later scans (full rescans
+    included) do not raise it again.
+    """
+    serializer_class = TransactionFlagSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NewestFirstPagination
+
+    def get_queryset(self):
+        # The join also hides flags of deleted transactions
+        qs = TransactionFlag.objects.filter(
+            user=self.request.user, dismissed_at__isnull=True
+        ).select_related("transaction__category")
+        reason = self.request.query_params.get("reason")
+        if reason:
+            qs = qs.filter(reason=reason)
+        return qs
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.dismissed_at = timezone.now()
+            instance.save(update_fields=["dismissed_at"])
+            caching.bump_version(instance.user_id)
+
+
+# ---------------------------
+# Recurring rules
+# ---------------------------
+class RecurringRuleViewSet(viewsets.ModelViewSet):
+    """
+    Repeating transactions; occurrences are created by the
+    materialize_recurring command.
+    """
+    serializer_class = RecurringRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringRule.objects.filter(user=self.request.user).select_related("category")
+
+
+# ---------------------------
+# Delta sync
+# ---------------------------
+class SyncView(APIView):
+    """
+    Transactions, categories and budgets changed or deleted since
+    ?since=<token>, plus the token for the next sync. Without a token, or
+    with one too old to answer, every row is returned and `full` is true.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = sync.parse_token(request.query_params.get("since"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        context = {"request": request}
+        return Response(sync.changes(request.user, since, {
+            "transactions": lambda qs: self.transactions(request, qs),
+            "categories": lambda qs: CategorySerializer(qs, many=True, context=context).data,
+            "budgets": lambda qs: BudgetSerializer(
+                qs.select_related("category"), many=True, context=context
+            ).data,
+        }))
+
+    def transactions(self, request, queryset):
+        queryset = queryset.order_by("id")
+        if not TransactionRowSerializer.supported():
+            queryset = queryset.select_related("category")
+            return TransactionSerializer(queryset, many=True, context={"request": request}).data
+        rows = TransactionRowSerializer(request)
+        return rows.render(queryset.values(*rows.values()))
+
 
 # ---------------------------
 # Analytics: Monthly Summary
 # ---------------------------
-class MonthlySummaryView(APIView):
+class MonthlySummaryView(ETagMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
+    @cache_analytics("monthly-summary")
     def get(self, request):
         year = request.query_params.get("year")
         month = request.query_params.get("month")
 
-        qs = Transaction.objects.filter(user=request.user)
+        date_from = date_to = None
 
         # Filter by specific month
         if year and month:
             try:
-                start = datetime(year=int(year), month=int(month), day=1).date()
-                end = (start + relativedelta(months=1))
-                qs = qs.filter(date__gte=start, date__lt=end)
+                date_from = datetime(year=int(year), month=int(month), day=1).date()
+                date_to = date_from + relativedelta(months=1) - timedelta(days=1)
             except ValueError:
                 return Response({"detail": "Invalid year/month"}, status=400)
 
-        totals = qs.values("type").annotate(total=Sum("amount"))
-        income_total = sum(i["total"] for i in totals if i["type"] == "income") or 0
-        expense_total = sum(i["total"] for i in totals if i["type"] == "expense") or 0
-
-        expense_by_category = (
-            qs.filter(type="expense")
-            .values("category__name")
-            .annotate(total=Sum("amount"))
-            .order_by("-total")
-        )
+        rows = analytics.monthly_rows(request.user, date_from=date_from, date_to=date_to)
 
         # Monthly series only when not filtering by a specific month
-        monthly_series = {}
-        if not (year and month):
-            monthly = (
-                qs.annotate(month=TruncMonth("date"))
-                .values("month", "type")
-                .annotate(total=Sum("amount"))
-                .order_by("month")
-            )
+        return Response(analytics.summary(rows, with_series=not (year and month)))
 
-            for row in monthly:
-                mon = row["month"].strftime("%Y-%m")
-                typ = row["type"]
-                monthly_series.setdefault(mon, {"income": 0, "expense": 0})
-                monthly_series[mon][typ] = float(row["total"] or 0)
 
-        return Response({
-            "income_total": float(income_total),
-            "expense_total": float(expense_total),
-            "net": float(income_total - expense_total),
-            "expense_by_category": [
-                {"category": r["category__name"], "total": float(r["total"])}
-                for r in expense_by_category
-            ],
-            "monthly_series": monthly_series,
-        })
+def _analytics_filters(request):
+    ttype = request.query_params.get("type")
+    date_from = analytics.parse_date(request.query_params.get("date_from"), "date_from")
+    date_to = analytics.parse_date(request.query_params.get("date_to"), "date_to")
+    return ttype, date_from, date_to
 
 
 # ---------------------------
 # Analytics: Category Totals
 # ---------------------------
-class CategoryAnalyticsView(APIView):
+class CategoryAnalyticsView(ETagMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
+    @cache_analytics("category-totals")
     def get(self, request):
-        qs = Transaction.objects.filter(user=request.user)
-
-        ttype = request.query_params.get("type")
-        date_from = request.query_params.get("date_from")
-        date_to = request.query_params.get("date_to")
-
-        if ttype:
-            qs = qs.filter(type=ttype)
-        if date_from:
-            qs = qs.filter(date__gte=date_from)
-        if date_to:
-            qs = qs.filter(date__lte=date_to)
+        try:
+            ttype, date_from, date_to = _analytics_filters(request)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        data = (
-            qs.values("category__name")
-            .annotate(total=Sum("amount"))
-            .order_by("-total")
+        rows = ledger.monthly_rows(
+            request.user, caching.request_version(request), ttype, date_from, date_to
         )
 
-        formatted = [
-            {
-                "category": row["category__name"] or "Uncategorized",
-                "total": float(row["total"] or 0),
-            }
-            for row in data
-        ]
-
-        return Response({"results": formatted})
+        return Response(analytics.category_totals(rows))
 
 
 # ---------------------------
 # Analytics: Monthly by Category
 # ---------------------------
-class MonthlyCategoryAnalyticsView(APIView):
+class MonthlyCategoryAnalyticsView(ETagMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
 
+    @cache_analytics("monthly-category")
     def get(self, request):
-        qs = Transaction.objects.filter(user=request.user)
+        try:
+            ttype, date_from, date_to = _analytics_filters(request)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        ttype = request.query_params.get("type")
-        date_from = request.query_params.get("date_from")
-        date_to = request.query_params.get("date_to")
+        rows = ledger.monthly_rows(
+            request.user, caching.request_version(request), ttype, date_from, date_to
+        )
 
-        if ttype:
-            qs = qs.filter(type=ttype)
-        if date_from:
-            qs = qs.filter(date__gte=date_from)
-        if date_to:
-            qs = qs.filter(date__lte=date_to)
+        return Response(analytics.monthly_by_category(rows))
 
-        data = (
-            qs.annotate(month=TruncMonth("date"))
-            .values("month", "category__name")
-            .annotate(total=Sum("amount"))
-            .order_by("month")
-        )
 
-        grouped = defaultdict(lambda: defaultdict(float))
-        categories = set()
+# ---------------------------
+# Analytics: Spend Forecast
+# ---------------------------
+class ForecastView(ETagMixin, APIView):
+    """
+    Month-end and next ?months=N (default 3, at most 12) expense
+    projections per category from up to ten years of monthly history.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    etag_varies_on_date = True
 
-        for row in data:
-            month = row["month"].strftime("%Y-%m")
-            category = row["category__name"] or "Uncategorized"
-            grouped[month][category] += float(row["total"] or 0)
-            categories.add(category)
+    @cache_analytics("forecast", varies_on_date=True)
+    def get(self, request):
+        try:
+            horizon = forecast.parse_horizon(request.query_params.get("months"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        results = []
-        for month in sorted(grouped.keys()):
-            entry = {"month": month}
-            for cat in sorted(categories):
-                entry[cat] = grouped[month].get(cat, 0.0)
-            results.append(entry)
+        today = date.today()
+        # Whole months only, so this reads just the monthly rollups
+        rows = analytics.monthly_rows(request.user, "expense", forecast.history_start(today))
 
-        return Response({
-            "categories": sorted(categories),
-            "results": results,
-        })
+        return Response(forecast.forecast(rows, today, horizon))
 
 
 # ---------------------------
 # Budget vs Expense Analytics
 # ---------------------------
+MAX_BUDGET_MONTHS = 36
+
+
+@replica_reads
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def budget_vs_expense(request, year, month):
-    user = request.user
-    month_start = date(int(year), int(month), 1)
-    month_end = (month_start + relativedelta(months=1)) - timedelta(days=1)
-
-    categories = Category.objects.filter(user=user)
-    response = []
-
-    for cat in categories:
-        budget = Budget.objects.filter(
-            user=user, category=cat, month=month_start
-        ).first()
-
-        spent = Transaction.objects.filter(
-            user=user,
-            category=cat,
-            type="expense",
-            date__range=[month_start, month_end],
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        response.append({
-            "category": cat.name,
-            "budget": budget.amount if budget else 0,
-            "spent": spent,
-        })
+def budget_vs_expense(request, year=None, month=None):
+    """
+    /budget-vs-expense/<year>/<month>/ returns one month as a list.
+    /budget-vs-expense/?start=YYYY-MM&end=YYYY-MM returns every month in
+    the range (inclusive, at most MAX_BUDGET_MONTHS) in one response.
+    """
+    if year is not None and month is not None:
+        try:
+            month_start = date(int(year), int(month), 1)
+        except ValueError:
+            return Response({"detail": "Invalid year/month"}, status=400)
+        return Response(analytics.budget_vs_spent(request.user, [month_start])[month_start])
+
+    try:
+        first = analytics.parse_month(request.query_params.get("start"), "start")
+        last = analytics.parse_month(request.query_params.get("end"), "end")
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=400)
+
+    months = analytics.month_range(first, last)
+    if not months or len(months) > MAX_BUDGET_MONTHS:
+        return Response(
+            {"detail": f"start must not be after end and the range at most {MAX_BUDGET_MONTHS} months"},
+            status=400,
+        )
 
-    return Response(response)
+    by_month = analytics.budget_vs_spent(request.user, months)
+    return Response({
+        "results": [
+            {"month": m.strftime("%Y-%m"), "categories": by_month[m]}
+            for m in months
+        ]
+    })
 
 
 # ---------------------------
 # Analytics: Monthly Totals (Simple)
 # ---------------------------
-class MonthlyTotalsView(APIView):
+class MonthlyTotalsView(ETagMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    etag_varies_on_date = True
 
+    @cache_analytics("monthly", varies_on_date=True)
     def get(self, request):
-        today = date.today()
+        month_start = date.today().replace(day=1)
+        month_end = month_start + relativedelta(months=1) - timedelta(days=1)
+
+        rows = analytics.monthly_rows(request.user, date_from=month_start, date_to=month_end)
+
+        return Response(analytics.net_totals(rows))
 
-        qs = Transaction.objects.filter(
-            user=request.user,
-            date__year=today.year,
-            date__month=today.month
-        )
 
-        income_total = qs.filter(type="income").aggregate(total=Sum("amount"))["total"] or 0
-        expense_total = qs.filter(type="expense").aggregate(total=Sum("amount"))["total"] or 0
+# ---------------------------
+# Analytics: Dashboard (everything above in one response)
+# ---------------------------
+class DashboardView(ETagMixin, APIView):
+    """
+    The monthly, monthly-summary, category-totals and monthly-category
+    payloads plus this month's budget vs spent, folded in Python from a
+    single read of the user's monthly rollups.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    etag_varies_on_date = True
+
+    @cache_analytics("dashboard", varies_on_date=True)
+    def get(self, request):
+        this_month = date.today().replace(day=1)
+
+        rows = analytics.monthly_rows(request.user)
+        current = [r for r in rows if r["month"] == this_month]
 
         return Response({
-            "income_total": float(income_total),
-            "expense_total": float(expense_total),
-            "net": float(income_total - expense_total)
+            "monthly": analytics.net_totals(current),
+            "monthly_summary": analytics.summary(rows),
+            "category_totals": analytics.category_totals(rows),
+            "monthly_category": analytics.monthly_by_category(rows),
+            "budget_vs_expense": analytics.budget_vs_spent(
+                request.user, [this_month], rows=current
+            )[this_month],
         })
+
+
+# ---------------------------
+# Analytics cache statistics (staff only)
+# ---------------------------
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        backend = caching.get_cache()
+        return Response({
+            "backend": f"{type(backend).__module__}.{type(backend).__name__}",
+            **caching.stats.snapshot(),
+            "ledger": ledger.cache.snapshot(),
+            "auth": authentication.user_cache.snapshot(),
+        })
+
+
+class PerfStatsView(APIView):
+    """
+    Per-route latency percentiles and query counts for this process.
+    DELETE clears them.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "window": settings.PERF_STATS_WINDOW,
+            "slow_query_ms": settings.SLOW_QUERY_MS,
+            "routes": instrumentation.stats.snapshot(),
+            "replicas": db_routers.health.snapshot(),
+        })
+
+    def delete(self, request):
+        instrumentation.stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)